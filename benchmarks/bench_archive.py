@@ -0,0 +1,92 @@
+"""
+Page archive throughput for each compression: pages appended per second,
+compression ratio, records streamed back per second, random reads by url, and
+archived pages parsed and tokenized again per second.
+
+    python -m benchmarks.bench_archive --pages 2000
+    python -m benchmarks.bench_archive --corpus path/to/saved/pages
+"""
+import os
+import time
+import random
+import tempfile
+from argparse import ArgumentParser
+
+from page_analysis import summarize_page
+from utils.response import Response
+from utils.archive import PageArchive, ArchiveReader, CODECS
+from benchmarks.corpus import get_pages
+
+
+def make_response(url, content):
+    return Response({
+        "url": url, "status": 200,
+        "headers": {"Content-Type": "text/html; charset=utf-8",
+                    "ETag": f'"{hash(content) & 0xffffffff:x}"'},
+        "content": content})
+
+
+def directory_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory))
+
+
+def run(codec, pages, directory):
+    responses = [make_response(url, content) for url, content in pages]
+    raw_bytes = sum(len(content) for _, content in pages)
+
+    start = time.perf_counter()
+    archive = PageArchive(directory, codec, 3 if codec == "zstd" else 6)
+    for (url, _), resp in zip(pages, responses):
+        archive.append(url, resp, time.time())
+    archive.close()
+    write_time = time.perf_counter() - start
+
+    reader = ArchiveReader(directory)
+    start = time.perf_counter()
+    streamed = sum(len(page.content) for page in reader)
+    read_time = time.perf_counter() - start
+    assert streamed == raw_bytes
+
+    urls = [url for url, _ in pages]
+    random.Random(121).shuffle(urls)
+    reader.index()
+    start = time.perf_counter()
+    for url in urls:
+        reader.get(url)
+    get_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for page in reader:
+        summarize_page(page.url, page.content)
+    reprocess_time = time.perf_counter() - start
+
+    count = len(pages)
+    print(f"{codec:<8}{count / write_time:>10,.0f}"
+          f"{raw_bytes / directory_size(directory):>8.2f}x"
+          f"{raw_bytes / 1e6 / read_time:>12,.0f}"
+          f"{count / get_time:>10,.0f}{count / reprocess_time:>12,.0f}")
+
+
+def main(corpus, count, codecs):
+    pages = get_pages(corpus, count)
+    # Distinct urls, so every page can be read back by url.
+    pages = [(f"{url}/{i}", content) for i, (url, content) in enumerate(pages)]
+    raw_bytes = sum(len(content) for _, content in pages)
+    print(f"{len(pages)} pages, {raw_bytes / 1e6:.1f} MB")
+    print(f"{'codec':<8}{'append/s':>10}{'ratio':>9}{'stream MB/s':>12}"
+          f"{'get/s':>10}{'reparse/s':>12}")
+    for codec in codecs:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(codec, pages, tmp)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", default=None)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument(
+        "--codecs", nargs="+", default=["none", "gzip"], choices=CODECS)
+    args = parser.parse_args()
+    main(args.corpus, args.pages, args.codecs)
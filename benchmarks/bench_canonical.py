@@ -0,0 +1,102 @@
+"""
+Canonical url throughput in urls per second, against the trailing slash
+stripping the scraper used to do, and the duplicate rate each leaves: the
+share of urls that are another spelling of a url seen before.
+
+    python -m benchmarks.bench_canonical --urls 200000 --distinct 5000
+    python -m benchmarks.bench_canonical --save frontier.db
+
+With --save the duplicate rate is reported for the urls of a crawl's save file
+instead of synthetic links.
+"""
+import time
+import random
+from argparse import ArgumentParser
+from urllib.parse import urlparse, urlunparse
+
+from utils.canonical import Canonicalizer
+from crawler.persistence import SAVE_BACKENDS
+from benchmarks.corpus import HOSTS, WORDS
+
+
+def legacy_normalize(url):
+    # remove_trailing_slash() as the scraper had it.
+    parsed = urlparse(url)
+    return urlunparse((
+        parsed.scheme, parsed.netloc, parsed.path.rstrip("/"), parsed.params,
+        parsed.query, parsed.fragment))
+
+
+def spellings(rng, host, path, query):
+    ''' Ways the same page is linked to. '''
+    upper_host = host.upper() if rng.random() < 0.5 else host.capitalize()
+    reordered = "&".join(reversed(query.split("&")))
+    return (
+        f"https://{host}{path}?{query}",
+        f"https://{host}{path}/?{query}",
+        f"HTTPS://{upper_host}{path}?{query}",
+        f"https://{host}:443{path}?{query}",
+        f"https://{host}{path}?{reordered}",
+        f"https://{host}{path}?{query}&utm_source=newsletter",
+        f"https://{host}{path}?{query}#section-{rng.randrange(5)}",
+        f"https://{host}/x/..{path}/./?{query}",
+        f"https://{host}{path.replace('-', '%2D')}?{query}",
+    )
+
+
+def make_urls(count, distinct, seed=121):
+    ''' count links to distinct pages, each spelled in one of several
+    equivalent ways. '''
+    rng = random.Random(seed)
+    pages = [
+        (rng.choice(HOSTS), f"/{rng.choice(WORDS)}/{rng.choice(WORDS)}-{i}",
+         f"a={rng.randrange(10)}&b={rng.choice(WORDS)}")
+        for i in range(distinct)]
+    pages = [spellings(rng, *page) for page in pages]
+    return [rng.choice(rng.choice(pages)) for _ in range(count)]
+
+
+def throughput(normalize, urls):
+    start = time.perf_counter()
+    for url in urls:
+        normalize(url)
+    return len(urls) / (time.perf_counter() - start)
+
+
+def duplicate_report(urls, canonicalizer):
+    raw = set(urls)
+    legacy = {legacy_normalize(url) for url in raw}
+    canonical = {canonicalizer.canonicalize(url) for url in raw}
+    print(f"{len(raw)} distinct urls as written")
+    for name, unique in (("legacy", legacy), ("canonical", canonical)):
+        duplicates = len(raw) - len(unique)
+        print(f"{name:<24}{len(unique):>10} unique"
+              f"{duplicates / max(1, len(raw)):>10.1%} duplicates")
+
+
+def main(count, distinct, save_file, backend):
+    canonicalizer = Canonicalizer()
+    if save_file:
+        save = SAVE_BACKENDS[backend](save_file)
+        urls = [entry[0] for entry in save.values()]
+        save.close()
+        duplicate_report(urls, canonicalizer)
+        return
+
+    urls = make_urls(count, distinct)
+    print(f"{count} urls, {distinct} distinct pages")
+    print(f"{'legacy':<24}{throughput(legacy_normalize, urls):>14,.0f} urls/s")
+    print(f"{'canonical (no cache)':<24}{throughput(canonicalizer._canonicalize, urls):>14,.0f} urls/s")
+    print(f"{'canonical (cold)':<24}{throughput(canonicalizer.canonicalize, urls):>14,.0f} urls/s")
+    print(f"{'canonical (warm)':<24}{throughput(canonicalizer.canonicalize, urls):>14,.0f} urls/s")
+    duplicate_report(urls, canonicalizer)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=200000)
+    parser.add_argument("--distinct", type=int, default=5000)
+    parser.add_argument("--save", default=None)
+    parser.add_argument("--backend", default="sqlite", choices=SAVE_BACKENDS)
+    args = parser.parse_args()
+    main(args.urls, args.distinct, args.save, args.backend)
@@ -0,0 +1,168 @@
+"""
+End to end crawl benchmark. Runs launch.main in a scratch directory, against
+the stand-in cache server serving a synthetic site (default), or replaying a
+recording in process, and reports pages/s, time spent per stage and peak RSS.
+
+    python -m benchmarks.bench_crawl --pages_per_host 200 --threads 4
+    python -m benchmarks.bench_crawl --record crawl.recording
+    python -m benchmarks.bench_crawl --replay crawl.recording --latency 0.01
+
+Stage times are summed over all worker threads, so with several threads they
+add up to more than the wall clock time. With --processes the parse and
+tokenize stages run in other processes and are not timed.
+"""
+import os
+import sys
+import time
+import resource
+import tempfile
+from threading import Lock
+from collections import defaultdict
+from argparse import ArgumentParser
+from contextlib import redirect_stdout, redirect_stderr
+
+import launch
+import scraper
+import page_analysis
+import crawler.frontier
+import crawler.worker
+from crawler.pipeline import shutdown_parse_pool
+from utils.log_queue import get_log_writer
+from utils.stand_in_server import (
+    SyntheticSite, start_in_background, WIRE_FORMATS)
+
+CONFIG = """
+[IDENTIFICATION]
+USERAGENT = IR benchmark
+
+[CONNECTION]
+HOST = unused
+PORT = 0
+DOWNLOADER = pooled
+LOCALCACHE = {local_cache}
+RECORD = {record}
+REPLAY = {replay}
+REPLAYLATENCY = {latency}
+
+[CRAWLER]
+SEEDURL = {seeds}
+POLITENESS = {politeness}
+PARSER = {parser}
+
+[LOCAL PROPERTIES]
+SAVE = frontier.db
+SEEN = seen
+STATS = stats.checkpoint
+THREADCOUNT = {threads}
+PARSEPROCESSES = {processes}
+"""
+
+
+class StageTimer(object):
+    def __init__(self):
+        self.lock = Lock()
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.totals[stage] += elapsed
+                    self.calls[stage] += 1
+        return timed
+
+    def patch(self, owner, name, stage):
+        setattr(owner, name, self.wrap(stage, getattr(owner, name)))
+
+
+def instrument(timer):
+    for worker_class in (crawler.worker.Worker, crawler.worker.PooledWorker):
+        if "download" in vars(worker_class):
+            timer.patch(worker_class, "download", "download")
+    timer.patch(page_analysis, "analyze_page", "parse")
+    timer.patch(page_analysis, "tokenize", "tokenize")
+    timer.patch(scraper, "is_valid", "filter")
+    timer.patch(crawler.frontier.Frontier, "get_tbd_url", "frontier wait")
+    timer.patch(crawler.frontier.Frontier, "add_url", "frontier")
+    timer.patch(crawler.frontier.Frontier, "mark_url_complete", "frontier")
+
+
+def report(timer, elapsed):
+    pages = timer.calls["download"]
+    print(f"{pages} pages in {elapsed:.2f}s: {pages / elapsed:.1f} pages/s")
+    # analyze_page includes tokenizing, report them apart.
+    timer.totals["parse"] -= timer.totals["tokenize"]
+    print(f"{'stage':<16}{'calls':>10}{'total s':>10}{'ms/page':>10}")
+    for stage in ("download", "parse", "tokenize", "filter", "frontier",
+                  "frontier wait"):
+        total = timer.totals[stage]
+        print(f"{stage:<16}{timer.calls[stage]:>10}{total:>10.2f}"
+              f"{total * 1000 / max(pages, 1):>10.2f}")
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"peak RSS: {self_rss:.1f} MB"
+          + (f", largest child {children_rss:.1f} MB" if children_rss else ""))
+
+
+def main(args):
+    site = SyntheticSite(pages_per_host=args.pages_per_host, wire=args.wire)
+    server = None
+    if not args.replay:
+        server = start_in_background(site, latency=args.latency)
+    seeds = args.seeds or ",".join(site.seed_urls())
+    absolute = lambda path: os.path.abspath(path) if path else ""
+
+    timer = StageTimer()
+    instrument(timer)
+    with tempfile.TemporaryDirectory() as scratch:
+        config_file = os.path.join(scratch, "config.ini")
+        with open(config_file, "w") as file:
+            file.write(CONFIG.format(
+                local_cache="%s:%d" % server.cache_server if server else "",
+                record=absolute(args.record), replay=absolute(args.replay),
+                latency=args.latency if args.replay else 0, seeds=seeds,
+                politeness=args.politeness, parser=args.parser,
+                threads=args.threads, processes=args.processes))
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        start = time.perf_counter()
+        try:
+            with open(os.devnull, "w") as devnull, \
+                    redirect_stdout(devnull), redirect_stderr(devnull):
+                launch.main(config_file, True)
+                # os._exit skips the atexit handler, and the parse processes
+                # would keep the stdout pipe open.
+                shutdown_parse_pool()
+                # Writes out the last log records before devnull is closed.
+                get_log_writer().stop()
+        finally:
+            os.chdir(cwd)
+        elapsed = time.perf_counter() - start
+    if server:
+        server.shutdown()
+    report(timer, elapsed)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages_per_host", type=int, default=200)
+    parser.add_argument("--seeds", type=str, default=None)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=0)
+    parser.add_argument("--parser", type=str, default="html.parser")
+    parser.add_argument("--politeness", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds of latency per download")
+    parser.add_argument("--record", type=str, default=None)
+    parser.add_argument("--replay", type=str, default=None)
+    parser.add_argument("--wire", choices=WIRE_FORMATS, default="pickle",
+                        help="wire format of the stand-in cache server")
+    main(parser.parse_args())
+    sys.stdout.flush()
+    # The crawler's atexit handlers write into the deleted scratch directory.
+    os._exit(0)
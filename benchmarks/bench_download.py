@@ -0,0 +1,68 @@
+"""
+Download throughput against the local stand-in cache server: a fresh
+requests.get per url (utils.download.download) against one pooled keep-alive
+DownloadSession per thread.
+
+    python -m benchmarks.bench_download --threads 4 --urls 2000 --latency 0.005
+"""
+import time
+from threading import Thread
+from types import SimpleNamespace
+from argparse import ArgumentParser
+
+from utils.download import download, DownloadSession
+from utils.stand_in_server import SyntheticSite, start_in_background
+
+
+def make_config(cache_server, concurrency):
+    return SimpleNamespace(
+        cache_server=cache_server, user_agent="IR benchmark",
+        download_timeout=10.0, download_retries=3, download_backoff=0.1,
+        download_concurrency=concurrency, record_file="", replay_file="")
+
+
+def run(threads, urls, fetch_factory):
+    def work(chunk):
+        fetch, close = fetch_factory()
+        for url in chunk:
+            assert fetch(url).status == 200
+        close()
+
+    chunks = [urls[i::threads] for i in range(threads)]
+    workers = [Thread(target=work, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return len(urls) / (time.perf_counter() - start)
+
+
+def main(threads, count, latency):
+    site = SyntheticSite()
+    server = start_in_background(site, latency=latency)
+    config = make_config(server.cache_server, threads)
+    urls = [f"https://{site.hosts[i % len(site.hosts)]}/page/{i % site.pages_per_host}"
+            for i in range(count)]
+
+    def simple():
+        return (lambda url: download(url, config)), (lambda: None)
+
+    def pooled():
+        session = DownloadSession(config)
+        return session.download, session.close
+
+    print(f"{count} urls, {threads} threads, {latency * 1000:.1f} ms server latency")
+    for name, factory in (("requests.get per url", simple),
+                          ("pooled session", pooled)):
+        print(f"{name:<24}{run(threads, urls, factory):>10.0f} pages/s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--urls", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    main(args.threads, args.urls, args.latency)
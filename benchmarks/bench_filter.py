@@ -0,0 +1,85 @@
+"""
+Url filter throughput in urls per second: the original is_valid rules against
+the compiled UrlFilter, with a cold and a warm verdict cache.
+
+    python -m benchmarks.bench_filter --urls 200000
+"""
+import re
+import time
+import random
+from argparse import ArgumentParser
+from urllib.parse import urlparse, parse_qs
+
+from utils.url_filter import UrlFilter
+from benchmarks.corpus import HOSTS, WORDS
+
+
+def legacy_is_valid(url):
+    # is_valid() as it was before the filter engine, minus the unique url
+    # check which both paths still share.
+    parsed = urlparse(url)
+    if parsed.scheme not in set(["http", "https"]):
+        return False
+    if (parsed.hostname is None
+            or (parsed.hostname.endswith("cecs.uci.edu")
+                or parsed.hostname.endswith("eecs.uci.edu"))
+            or not (parsed.hostname.endswith("ics.uci.edu")
+                    or parsed.hostname.endswith("cs.uci.edu")
+                    or parsed.hostname.endswith("informatics.uci.edu")
+                    or parsed.hostname.endswith("stat.uci.edu"))):
+        return False
+    query_params = parse_qs(parsed.query)
+    if any("ical" in key.lower() for key in query_params):
+        return False
+    return not re.match(
+        r".*\.(css|js|bmp|gif|jpe?g|ico"
+        + r"|png|tiff?|mid|mp2|mp3|mp4"
+        + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+        + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+        + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+        + r"|epub|dll|cnf|tgz|sha1"
+        + r"|thmx|mso|arff|rtf|jar|csv"
+        + r"|rm|smil|wmv|swf|wma|zip|rar|gz|ics|ppsx)$", parsed.path.lower())
+
+
+def make_urls(count, distinct, seed=121):
+    ''' count urls drawn from distinct unique ones, the way a crawl sees the
+    same navigation links on many pages. '''
+    rng = random.Random(seed)
+    hosts = HOSTS + ("www.cecs.uci.edu", "www.google.com", "www.uci.edu")
+    suffixes = ("", "/", ".html", ".pdf", ".png", "?ical=1", "?page=2", ".php")
+    unique = [
+        f"https://{rng.choice(hosts)}/{rng.choice(WORDS)}/"
+        f"{rng.choice(WORDS)}-{i}{rng.choice(suffixes)}"
+        for i in range(distinct)]
+    return [rng.choice(unique) for _ in range(count)]
+
+
+def throughput(check, urls):
+    start = time.perf_counter()
+    for url in urls:
+        check(url)
+    return len(urls) / (time.perf_counter() - start)
+
+
+def main(count, distinct):
+    urls = make_urls(count, distinct)
+    url_filter = UrlFilter()
+    mismatches = sum(
+        legacy_is_valid(url) != url_filter.is_allowed(url) for url in set(urls))
+    url_filter = UrlFilter()
+
+    print(f"{count} urls, {distinct} distinct")
+    print(f"{'legacy is_valid':<24}{throughput(legacy_is_valid, urls):>14,.0f} urls/s")
+    print(f"{'UrlFilter (cold)':<24}{throughput(url_filter.is_allowed, urls):>14,.0f} urls/s")
+    print(f"{'UrlFilter (warm)':<24}{throughput(url_filter.is_allowed, urls):>14,.0f} urls/s")
+    print(f"{'UrlFilter (no cache)':<24}{throughput(url_filter._check, urls):>14,.0f} urls/s")
+    print(f"verdicts differing from legacy rules: {mismatches}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=200000)
+    parser.add_argument("--distinct", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.urls, args.distinct)
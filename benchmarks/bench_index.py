@@ -0,0 +1,68 @@
+"""
+Inverted index build rate and query latency. Pages are tokenized and
+counted up front, so only indexing is timed: adding every page, then the
+final merge of the partial runs. Queries of one to three random words from
+the corpus are then timed against the merged index.
+
+    python -m benchmarks.bench_index --pages 5000 --memory_mb 1 16
+"""
+import os
+import time
+import random
+import tempfile
+from argparse import ArgumentParser
+
+from page_analysis import summarize_page
+from utils.inverted_index import IndexWriter, InvertedIndex, INDEX_RUN
+from benchmarks.corpus import get_pages
+
+
+def build(pages, directory, memory_cap):
+    writer = IndexWriter(directory, restart=True, memory_cap=memory_cap)
+    start = time.perf_counter()
+    for page in pages:
+        writer.add_document(page.url, page.word_frequencies)
+    runs = len(writer.runs) + 1
+    added = time.perf_counter() - start
+    writer.close()
+    return added, time.perf_counter() - start - added, runs
+
+
+def query_latency(index, words, terms, count=1000, seed=121):
+    rng = random.Random(seed)
+    queries = [" ".join(rng.sample(words, terms)) for _ in range(count)]
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query)
+    return (time.perf_counter() - start) / count
+
+
+def main(corpus, count, memory_mbs):
+    pages = [summarize_page(url, content, "stream", fingerprint=False)
+             for url, content in get_pages(corpus, count)]
+    postings = sum(len(page.word_frequencies) for page in pages)
+    print(f"{len(pages)} pages, {postings} postings")
+    print(f"{'memory':>8}{'runs':>6}{'add':>9}{'merge':>9}{'pages/s':>10}"
+          f"{'index':>10}{'B/posting':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for memory_mb in memory_mbs:
+            added, merged, runs = build(pages, directory, memory_mb << 20)
+            size = os.path.getsize(os.path.join(directory, INDEX_RUN))
+            print(f"{memory_mb:>6}MB{runs:>6}{added:>8.2f}s{merged:>8.2f}s"
+                  f"{len(pages) / (added + merged):>10.0f}"
+                  f"{size / 1e6:>8.1f}MB{size / postings:>11.2f}")
+        index = InvertedIndex(directory)
+        words = sorted({word for page in pages for word in page.word_frequencies})
+        for terms in (1, 2, 3):
+            latency = query_latency(index, words, terms)
+            print(f"{terms} term queries: {latency * 1e3:.3f} ms")
+        index.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--memory_mb", type=int, nargs="+", default=[1, 16])
+    args = parser.parse_args()
+    main(args.corpus, args.pages, args.memory_mb)
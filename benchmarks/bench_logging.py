@@ -0,0 +1,145 @@
+"""
+Per page logging overhead: the messages one crawled page produces (a worker
+logger line, the scraper's output.log lines and its debug prints), from
+several threads, with the old synchronous handlers against the queued
+handlers of utils/log_queue.py.
+
+    python -m benchmarks.bench_logging --threads 4 --pages 5000
+
+"caller" is the time the worker threads spend logging, "flushed" also waits
+for the log writer to write everything out. The terminal is replaced by
+/dev/null, so the real cost of the old handlers is higher. "queued WARNING"
+is LOGLEVEL = WARNING, which skips the per page messages.
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+from threading import Thread
+from argparse import ArgumentParser
+from contextlib import redirect_stdout, redirect_stderr
+
+from utils.log_queue import LogWriter, QueueingHandler, FORMAT
+
+ROOT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+def legacy_get_logger(name, filename):
+    ''' utils.get_logger before the log writer. '''
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    fh = logging.FileHandler(filename)
+    fh.setLevel(logging.DEBUG)
+    ch = logging.StreamHandler()
+    ch.setLevel(logging.INFO)
+    formatter = logging.Formatter(FORMAT)
+    fh.setFormatter(formatter)
+    ch.setFormatter(formatter)
+    logger.addHandler(fh)
+    logger.addHandler(ch)
+    return logger
+
+
+def legacy_page(logger, root, url):
+    logger.info(f"Downloaded {url}, status <200>, using cache ('127.0.0.1', 9000).")
+    root.info(f"Scraped URL: {url}")
+    print(f"filesize:{4096}")
+    print(f"{url}, {0.42}")
+    print(f"url:{url}")
+
+
+def queued_page(logger, root, url):
+    logger.info(
+        "Downloaded %s, status <%s>, using cache %s.",
+        url, 200, ("127.0.0.1", 9000))
+    root.info("Scraped URL: %s", url)
+    root.debug("filesize:%d", 4096)
+    root.debug("%s, %s", url, 0.42)
+    root.debug("url:%s", url)
+
+
+def run(threads, pages, page_function, logger_factory, root):
+    def work(worker_id):
+        logger = logger_factory(worker_id)
+        for i in range(pages):
+            page_function(logger, root, f"https://www.ics.uci.edu/{worker_id}/{i}")
+
+    workers = [Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def run_queued(threads, pages, root, path, level):
+    writer = LogWriter()
+    writer.start()
+    root.setLevel(level)
+    root.addHandler(QueueingHandler(
+        writer, (writer.get_handler(path("output.log"), ROOT_FORMAT),)))
+    targets = (writer.get_handler(path("worker.log")),
+               writer.get_handler(None, level=logging.INFO))
+
+    def queued_logger(worker_id):
+        logger = logging.getLogger(f"queued-{worker_id}")
+        logger.setLevel(level)
+        logger.addHandler(QueueingHandler(writer, targets))
+        return logger
+
+    start = time.perf_counter()
+    elapsed = run(threads, pages, queued_page, queued_logger, root)
+    writer.stop()
+    return elapsed, time.perf_counter() - start
+
+
+def reset(root):
+    for name in list(logging.root.manager.loggerDict) + [None]:
+        logger = logging.getLogger(name)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+    root.setLevel(logging.INFO)
+
+
+def main(threads, pages):
+    root = logging.getLogger()
+    total = threads * pages
+    results = []
+    with tempfile.TemporaryDirectory() as scratch, \
+            open(os.devnull, "w") as devnull, \
+            redirect_stdout(devnull), redirect_stderr(devnull):
+        path = lambda name: os.path.join(scratch, name)
+
+        reset(root)
+        file_handler = logging.FileHandler(path("legacy-output.log"))
+        file_handler.setFormatter(logging.Formatter(ROOT_FORMAT))
+        root.addHandler(file_handler)
+        elapsed = run(
+            threads, pages, legacy_page,
+            lambda i: legacy_get_logger(f"legacy-{i}", path("legacy-worker.log")),
+            root)
+        results.append(("synchronous", elapsed, elapsed))
+
+        for level in ("INFO", "WARNING"):
+            reset(root)
+            results.append((f"queued {level}",) + run_queued(
+                threads, pages, root, path, logging.getLevelName(level)))
+        reset(root)
+
+    print(f"{threads} threads, {total} pages")
+    print(f"{'':<18}{'caller us/page':>16}{'flushed us/page':>17}")
+    for name, caller, flushed in results:
+        print(f"{name:<18}{caller * 1e6 / total:>16.1f}"
+              f"{flushed * 1e6 / total:>17.1f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=5000)
+    args = parser.parse_args()
+    main(args.threads, args.pages)
+    sys.stdout.flush()
@@ -0,0 +1,64 @@
+"""
+Micro-benchmark of HTML parsing per page: the old double parse (text in
+scraper(), links again in extract_next_links()) against a single
+analyze_page() call with each available backend.
+
+    python -m benchmarks.bench_parse --corpus path/to/saved/pages
+"""
+import time
+from argparse import ArgumentParser
+
+from bs4 import BeautifulSoup
+
+from page_analysis import BACKENDS, analyze_page
+from tokenize_functions import tokenize
+from benchmarks.corpus import get_pages
+
+
+def double_parse(url, content):
+    soup = BeautifulSoup(content, "html.parser")
+    tokenize(soup.get_text())
+    soup = BeautifulSoup(content, "html.parser")
+    return [a["href"] for a in soup.find_all('a', href=True)]
+
+
+def time_pages(pages, parse, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for url, content in pages:
+            parse(url, content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(corpus, count, repeat):
+    pages = get_pages(corpus, count)
+    total_bytes = sum(len(content) for _, content in pages)
+    print(f"{len(pages)} pages, {total_bytes / 1024 / 1024:.1f} MB")
+
+    results = [("double parse (html.parser)", time_pages(pages, double_parse, repeat))]
+    for backend in BACKENDS:
+        try:
+            elapsed = time_pages(
+                pages, lambda url, content: analyze_page(url, content, backend),
+                repeat)
+        except Exception as e:  # lxml is optional
+            print(f"skipping {backend}: {e}")
+            continue
+        results.append((f"single parse ({backend})", elapsed))
+
+    baseline = results[0][1]
+    for name, elapsed in results:
+        print(f"{name:<30}{elapsed * 1000 / len(pages):>10.2f} ms/page"
+              f"{baseline / elapsed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None,
+                        help="directory of saved pages, synthetic if omitted")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.corpus, args.pages, args.repeat)
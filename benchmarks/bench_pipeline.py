@@ -0,0 +1,52 @@
+"""
+Parse stage scaling: summarize_page (parse, tokenize, checksum, fingerprint)
+over a page corpus in worker threads, as the crawler does by default, against
+a process pool of increasing size, as PipelineWorker does.
+
+    python -m benchmarks.bench_pipeline --corpus path/to/saved/pages --processes 1 2 4
+"""
+import os
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from page_analysis import summarize_page
+from benchmarks.corpus import get_pages
+
+
+def _summarize(page):
+    url, content = page
+    return summarize_page(url, content)
+
+
+def run(executor, pages):
+    start = time.perf_counter()
+    summaries = list(executor.map(_summarize, pages, chunksize=1))
+    elapsed = time.perf_counter() - start
+    assert len(summaries) == len(pages)
+    return len(pages) / elapsed
+
+
+def main(corpus, count, process_counts, threads):
+    pages = get_pages(corpus, count)
+    print(f"{len(pages)} pages, {os.cpu_count()} cpus")
+    with ThreadPoolExecutor(threads) as executor:
+        baseline = run(executor, pages)
+    print(f"{f'{threads} threads':<16}{baseline:>10.1f} pages/s{1:>8.2f}x")
+    for processes in process_counts:
+        with ProcessPoolExecutor(processes) as executor:
+            # Warm up the processes so start up is not timed.
+            list(executor.map(_summarize, pages[:processes]))
+            rate = run(executor, pages)
+        print(f"{f'{processes} processes':<16}{rate:>10.1f} pages/s"
+              f"{rate / baseline:>8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    main(args.corpus, args.pages, args.processes, args.threads)
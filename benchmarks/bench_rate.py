@@ -0,0 +1,157 @@
+"""
+Per host rate control in a simulated crawl: worker threads take urls from the
+frontier and download them from the stand-in cache server, whose hosts answer
+at different speeds and send 503 once asked more often than their capacity
+allows. Compares a fixed delay between downloads from a host, as POLITENESS
+alone gave, against the adaptive delay and concurrency of
+utils/rate_control.py, over the same time: pages downloaded, 503 answers and
+the final rate of every host.
+
+    python -m benchmarks.bench_rate --seconds 20 --threads 8
+"""
+import os
+import time
+import tempfile
+from collections import deque, defaultdict
+from threading import Thread, Lock
+from types import SimpleNamespace
+from argparse import ArgumentParser
+from urllib.parse import urlparse
+
+from crawler.frontier import Frontier
+from utils.download import DownloadSession
+from utils.stand_in_server import (
+    SyntheticSite, start_in_background, encode_response)
+from utils.rate_control import RateController, set_rate_controller
+
+# host: (seconds per answer, answers per second before it sends 503)
+HOSTS = {
+    "www.ics.uci.edu": (0.005, 40),
+    "www.cs.uci.edu": (0.02, 20),
+    "www.informatics.uci.edu": (0.08, 8),
+    "www.stat.uci.edu": (0.25, 2),
+}
+
+
+class CongestedSite(SyntheticSite):
+    ''' SyntheticSite whose hosts answer 503 to any request beyond their
+    capacity in the last second. '''
+    def __init__(self, capacity, **kwargs):
+        super().__init__(hosts=capacity, **kwargs)
+        self.capacity = capacity
+        self.recent = defaultdict(deque)
+        self.lock = Lock()
+
+    def get_payload(self, url, if_none_match=None):
+        host = urlparse(url).hostname
+        now = time.monotonic()
+        with self.lock:
+            recent = self.recent[host]
+            while recent and recent[0] < now - 1:
+                recent.popleft()
+            overloaded = len(recent) >= self.capacity[host]
+            recent.append(now)
+        if overloaded:
+            return encode_response(
+                url, 503, {"Retry-After": "1"}, b"Service Unavailable")
+        return super().get_payload(url, if_none_match)
+
+
+def crawl(controller, server, site, threads, seconds, directory):
+    set_rate_controller(controller)
+    config = SimpleNamespace(
+        save_file=os.path.join(directory, "frontier.db"),
+        save_backend="sqlite", save_batch_size=1000, save_flush_interval=5.0,
+        seed_urls=[], time_delay=controller.min_delay,
+        cache_server=server.cache_server, user_agent="IR benchmark",
+        download_timeout=10.0, download_retries=0, download_backoff=0.0,
+        download_concurrency=threads, replay_file="", record_file="")
+    frontier = Frontier(config, restart=True)
+    for host in site.hosts:
+        for page in range(site.pages_per_host):
+            frontier.add_url(f"https://{host}/page/{page}")
+    statuses = defaultdict(lambda: defaultdict(int))
+    lock = Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker():
+        # Worker.run without the scraping.
+        session = DownloadSession(config)
+        while time.monotonic() < deadline:
+            url = frontier.get_tbd_url()
+            if url is None:
+                break
+            host = urlparse(url).hostname
+            start = time.perf_counter()
+            resp = session.download(url)
+            controller.record(host, resp, time.perf_counter() - start)
+            with lock:
+                statuses[host][resp.status] += 1
+            frontier.mark_url_complete(url)
+        session.close()
+
+    workers = [Thread(target=worker, daemon=True) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    frontier.save.close()
+    return statuses, elapsed
+
+
+def report(name, controller, statuses, elapsed):
+    ok = sum(counts[200] for counts in statuses.values())
+    failed = sum(counts[503] for counts in statuses.values())
+    print(f"{name}: {ok} pages in {elapsed:.1f}s, {ok / elapsed:.1f} pages/s, "
+          f"{failed} answered 503")
+    print(f"  {'host':<26}{'pages':>7}{'503':>6}{'latency':>9}"
+          f"{'delay':>8}{'in flight':>11}")
+    rates = {
+        rate["host"]: rate
+        for rate in controller.summary(top=len(HOSTS))["slowest_hosts"]}
+    for host in HOSTS:
+        rate = rates.get(host, {})
+        print(f"  {host:<26}{statuses[host][200]:>7}{statuses[host][503]:>6}"
+              f"{rate.get('latency', 0):>9.3f}{rate.get('delay', 0):>8.3f}"
+              f"{rate.get('concurrency', 1):>11}")
+
+
+def main(args):
+    site = CongestedSite(
+        {host: capacity for host, (_, capacity) in HOSTS.items()},
+        pages_per_host=args.pages_per_host, wire="raw")
+    server = start_in_background(
+        site, host_latency={
+            host: latency for host, (latency, _) in HOSTS.items()})
+    controllers = {
+        # A constant delay: no step, no backoff, one download per host.
+        f"fixed {args.politeness}s": RateController(
+            args.politeness, args.politeness, step=0.0, backoff=1.0,
+            latency_factor=0.0, max_concurrency=1),
+        "adaptive": RateController(
+            args.min_delay, args.max_delay, step=args.step,
+            max_concurrency=args.max_concurrency, streak=args.streak),
+    }
+    print(f"{args.threads} threads, {args.seconds:.0f}s per run")
+    for name, controller in controllers.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            statuses, elapsed = crawl(
+                controller, server, site, args.threads, args.seconds, tmp)
+        report(name, controller, statuses, elapsed)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--pages_per_host", type=int, default=5000)
+    parser.add_argument("--politeness", type=float, default=0.1)
+    parser.add_argument("--min_delay", type=float, default=0.0)
+    parser.add_argument("--max_delay", type=float, default=10.0)
+    parser.add_argument("--step", type=float, default=0.01)
+    parser.add_argument("--max_concurrency", type=int, default=4)
+    parser.add_argument("--streak", type=int, default=10)
+    main(parser.parse_args())
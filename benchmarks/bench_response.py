@@ -0,0 +1,102 @@
+"""
+Per response decode cost and peak memory: the eager Response that unpickled
+every page as soon as it arrived, against the lazy one, for the pickled pages
+of the cache server and the raw wire format of the stand-in server. A share
+of the answers are errors, which the scraper drops on their status alone.
+
+    python -m benchmarks.bench_response --responses 2000 --errors 0.3
+"""
+import time
+import pickle
+import random
+import tracemalloc
+from argparse import ArgumentParser
+
+import cbor
+
+from utils.response import Response
+from utils.stand_in_server import encode_response
+from benchmarks.corpus import get_pages
+
+
+class EagerResponse(object):
+    # utils.response.Response as it was, unpickling in __init__.
+    def __init__(self, resp_dict):
+        self.url = resp_dict["url"]
+        self.status = resp_dict["status"]
+        self.error = resp_dict["error"] if "error" in resp_dict else None
+        try:
+            self.raw_response = (
+                pickle.loads(resp_dict["response"])
+                if "response" in resp_dict else
+                None)
+        except TypeError:
+            self.raw_response = None
+
+
+def eager(payload):
+    resp = EagerResponse(cbor.loads(payload))
+    if resp.status == 200:
+        return len(resp.raw_response.content)
+    return 0
+
+
+def lazy(payload):
+    resp = Response.from_payload(payload)
+    if resp.status == 200:
+        return len(resp.content)
+    return 0
+
+
+def make_payloads(pages, errors, wire, seed=121):
+    rng = random.Random(seed)
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+    payloads = []
+    for url, content in pages:
+        # Error pages come with a body too, like most servers send.
+        status = 404 if rng.random() < errors else 200
+        payloads.append(encode_response(url, status, headers, content, wire))
+    return payloads
+
+
+def measure(decode, payloads):
+    elapsed = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for payload in payloads:
+            decode(payload)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    # Peak of the decoding of one response on top of its payload.
+    tracemalloc.start()
+    peak = 0
+    for payload in payloads[:200]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        decode(payload)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return elapsed / len(payloads), peak
+
+
+def main(corpus, count, errors):
+    pages = get_pages(corpus, count)
+    average = sum(len(content) for _, content in pages) / len(pages)
+    print(f"{len(pages)} responses, {errors:.0%} errors, "
+          f"{average / 1e3:.1f} KB pages")
+    print(f"{'decoder':<20}{'us/response':>14}{'peak KB':>10}")
+    for name, decode, wire in (
+            ("eager, pickle", eager, "pickle"),
+            ("lazy, pickle", lazy, "pickle"),
+            ("lazy, raw", lazy, "raw")):
+        per_response, peak = measure(
+            decode, make_payloads(pages, errors, wire))
+        print(f"{name:<20}{per_response * 1e6:>14.1f}{peak / 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", default=None)
+    parser.add_argument("--responses", type=int, default=2000)
+    parser.add_argument("--errors", type=float, default=0.3)
+    args = parser.parse_args()
+    main(args.corpus, args.responses, args.errors)
@@ -0,0 +1,62 @@
+"""
+Compares the per-url shelve sync() the frontier used to do with the batched,
+journaled WriteBehindSave.
+
+    python -m benchmarks.bench_save --urls 20000 --batch 100
+"""
+import os
+import time
+import shelve
+import tempfile
+from argparse import ArgumentParser
+
+from utils import get_urlhash
+from crawler.persistence import WriteBehindSave
+
+
+def make_urls(count):
+    return [f"https://www.ics.uci.edu/page/{i}" for i in range(count)]
+
+
+def run(save, urls, sync):
+    # Same access pattern as the frontier: discover every url, then
+    # complete it.
+    start = time.perf_counter()
+    for url in urls:
+        urlhash = get_urlhash(url)
+        if urlhash not in save:
+            save[urlhash] = (url, False)
+            if sync:
+                save.sync()
+    for url in urls:
+        save[get_urlhash(url)] = (url, True)
+        if sync:
+            save.sync()
+    return time.perf_counter() - start
+
+
+def main(count, batch_size, flush_interval):
+    urls = make_urls(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        save = shelve.open(os.path.join(tmp, "sync.shelve"))
+        sync_time = run(save, urls, True)
+        save.close()
+
+        save = WriteBehindSave(
+            os.path.join(tmp, "batched.shelve"), batch_size, flush_interval)
+        batched_time = run(save, urls, False)
+        save.close()
+
+    ops = 2 * count
+    print(f"{'per-url sync':<20}{sync_time:>10.3f}s{ops / sync_time:>14.0f} ops/s")
+    print(f"{'write-behind':<20}{batched_time:>10.3f}s{ops / batched_time:>14.0f} ops/s")
+    print(f"speedup: {sync_time / batched_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=5.0)
+    args = parser.parse_args()
+    main(args.urls, args.batch, args.interval)
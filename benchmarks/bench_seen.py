@@ -0,0 +1,84 @@
+"""
+Memory and speed of the seen-url and checksum stores: python sets of url and
+md5 hex strings against DigestSet, in memory and memory-mapped.
+
+    python -m benchmarks.bench_seen --urls 500000
+"""
+import os
+import time
+import hashlib
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+
+from utils.seen_set import DigestSet
+
+
+def make_urls(count):
+    return [
+        f"https://www.ics.uci.edu/~faculty/{i % 997}/publications/paper-{i}.html"
+        for i in range(count)]
+
+
+def measure(name, make, keys):
+    ''' Bytes held by the store once it has every key, and add/lookup rate.
+    The keys themselves are allocated before tracing starts, and the timed
+    run is a separate one without tracemalloc. '''
+    tracemalloc.start()
+    store = make()
+    for key in keys:
+        store.add(key)
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if isinstance(store, DigestSet) and store.mmap is not None:
+        traced = store.nbytes()
+        name += " (mapped)"
+        store.close()
+        DigestSet.remove(store.path)
+
+    start = time.perf_counter()
+    store = make()
+    for key in keys:
+        store.add(key)
+    add_time = time.perf_counter() - start
+    start = time.perf_counter()
+    hits = sum(key in store for key in keys)
+    lookup_time = time.perf_counter() - start
+    assert hits == len(keys)
+    print(f"{name:<28}{traced / 1024 / 1024:>9.1f} MB"
+          f"{traced / len(keys):>8.1f} B/key"
+          f"{len(keys) / add_time:>12,.0f} add/s"
+          f"{len(keys) / lookup_time:>12,.0f} lookup/s")
+    return store
+
+
+def main(count):
+    urls = make_urls(count)
+    # Both sets hold their own strings, as in the crawler.
+    url_bytes = sum(len(url) + 49 for url in urls)
+    checksums = [hashlib.md5(url.encode()).hexdigest() for url in urls]
+    print(f"{count} urls")
+    store = measure("set of urls", set, urls)
+    print(f"{'  + the url strings':<28}{url_bytes / 1024 / 1024:>9.1f} MB")
+    del store
+    store = measure("set of md5 hex", set, checksums)
+    print(f"{'  + the hex strings':<28}{count * 81 / 1024 / 1024:>9.1f} MB")
+    del store
+    measure("DigestSet urls", DigestSet, urls)
+    measure("DigestSet + bloom(10)", lambda: DigestSet(bloom_bits_per_item=10), urls)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.urls")
+        store = measure("DigestSet urls", lambda: DigestSet(path), urls)
+        store.close()
+        start = time.perf_counter()
+        store = DigestSet(path)
+        print(f"reopen {len(store)} mapped urls: "
+              f"{(time.perf_counter() - start) * 1000:.2f} ms")
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=500000)
+    args = parser.parse_args()
+    main(args.urls)
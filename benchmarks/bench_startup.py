@@ -0,0 +1,70 @@
+"""
+Frontier start up time on resume, for each save file backend: from opening
+the save file to the first url handed to a worker, with many completed urls
+and a few still to download.
+
+    python -m benchmarks.bench_startup --completed 1000000 --pending 1000
+"""
+import os
+import time
+import tempfile
+from types import SimpleNamespace
+from argparse import ArgumentParser
+
+from utils import get_urlhash
+from utils.url_filter import get_url_filter
+from crawler.frontier import Frontier
+from crawler.persistence import SAVE_BACKENDS
+
+
+def make_save(backend, save_file, completed, pending):
+    save = SAVE_BACKENDS[backend](
+        save_file, batch_size=10000, url_filter=get_url_filter())
+    for i in range(completed + pending):
+        url = f"https://www.ics.uci.edu/page/{i}"
+        save[get_urlhash(url)] = (url, i < completed, float(i % 97), 1)
+    save.close()
+
+
+def resume(backend, save_file):
+    config = SimpleNamespace(
+        save_file=save_file, save_backend=backend, save_batch_size=100,
+        save_flush_interval=5.0, seed_urls=[], time_delay=0.0)
+    start = time.perf_counter()
+    frontier = Frontier(config, restart=False)
+    url = frontier.get_tbd_url()
+    first_url = time.perf_counter() - start
+    # Until every pending url is queued.
+    while True:
+        with frontier.lock:
+            if not frontier.loading:
+                break
+        time.sleep(0.001)
+    all_queued = time.perf_counter() - start
+    frontier.save.close()
+    assert url is not None
+    return first_url, all_queued
+
+
+def main(completed, pending, backends):
+    print(f"{completed} completed urls, {pending} pending")
+    print(f"{'backend':<10}{'build s':>10}{'first url s':>14}{'all queued s':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            save_file = os.path.join(tmp, f"frontier.{backend}")
+            start = time.perf_counter()
+            make_save(backend, save_file, completed, pending)
+            build = time.perf_counter() - start
+            first_url, all_queued = resume(backend, save_file)
+            print(f"{backend:<10}{build:>10.2f}{first_url:>14.3f}{all_queued:>14.3f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--completed", type=int, default=200000)
+    parser.add_argument("--pending", type=int, default=1000)
+    parser.add_argument(
+        "--backends", nargs="+", default=list(SAVE_BACKENDS),
+        choices=SAVE_BACKENDS)
+    args = parser.parse_args()
+    main(args.completed, args.pending, args.backends)
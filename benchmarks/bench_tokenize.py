@@ -0,0 +1,71 @@
+"""
+Tokenizing and word counting: the functions the scraper used to call (a
+regex, then lowercasing and filtering every token in Python, a dict loop to
+count and a stopword lookup per word) against tokenize_functions as it is
+now. Both must give the same counts.
+
+    python -m benchmarks.bench_tokenize --pages 5000
+"""
+import re
+import time
+from argparse import ArgumentParser
+
+from page_analysis import analyze_page
+from tokenize_functions import (
+    tokenize, compute_word_frequencies, remove_stopwords, stopwords)
+from benchmarks.corpus import get_pages
+
+
+def legacy_tokenize(content):
+    tokens = re.findall(r'[a-zA-Z0-9]+', content, flags=re.ASCII)
+    return [token.lower() for token in tokens if len(token) > 1]
+
+
+def legacy_count(texts):
+    total = dict()
+    for text in texts:
+        freq = dict()
+        for token in legacy_tokenize(text):
+            freq[token] = freq.get(token, 0) + 1
+        for key, value in freq.items():
+            if key not in stopwords:
+                total[key] = total.get(key, 0) + value
+    return total
+
+
+def single_count(texts):
+    total = dict()
+    for text in texts:
+        frequencies = remove_stopwords(compute_word_frequencies(tokenize(text)))
+        for key, value in frequencies.items():
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def main(corpus, count, repeat):
+    texts = [analyze_page(url, content, "stream").text
+             for url, content in get_pages(corpus, count)]
+    size = sum(len(text) for text in texts)
+    print(f"{len(texts)} pages, {size / 1e6:.1f} MB of text")
+    expected = None
+    for name, count_words in (
+            ("legacy", legacy_count),
+            ("per page", single_count)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            counts = count_words(texts)
+            best = min(best, time.perf_counter() - start)
+        if expected is None:
+            expected = counts
+        assert counts == expected, f"{name} counts differ"
+        print(f"{name:<16}{best:>8.3f}s{size / best / 1e6:>8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.corpus, args.pages, args.repeat)
@@ -0,0 +1,93 @@
+"""
+Exactness and memory of the top 50 words: the unbounded dict the statistics
+used to keep against SpaceSaving counters of several capacities. Every page
+also gets some number and id tokens, which is what makes the crawl's
+vocabulary grow without bound.
+
+    python -m benchmarks.bench_top_words --pages 2000
+"""
+import time
+import random
+import tracemalloc
+from argparse import ArgumentParser
+
+from page_analysis import analyze_page
+from tokenize_functions import compute_word_frequencies, stopwords
+from utils.heavy_hitters import SpaceSaving
+from benchmarks.corpus import get_pages
+
+TOP = 50
+
+
+def page_frequencies(corpus, count, seed=121):
+    rng = random.Random(seed)
+    frequencies = []
+    for url, content in get_pages(corpus, count):
+        tokens = analyze_page(url, content, "stream").tokens
+        tokens += [f"{rng.getrandbits(40):x}" for _ in range(50)]
+        frequencies.append(compute_word_frequencies(tokens))
+    return frequencies
+
+
+def count_dict(frequencies):
+    counts = dict()
+    for word_frequencies in frequencies:
+        for key, value in word_frequencies.items():
+            if key not in stopwords:
+                counts[key] = counts.get(key, 0) + value
+    return counts
+
+
+def count_space_saving(frequencies, capacity):
+    counter = SpaceSaving(capacity)
+    for word_frequencies in frequencies:
+        for key, value in word_frequencies.items():
+            if key not in stopwords:
+                counter.update(key, value)
+    return counter
+
+
+def measure(count):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = count()
+    elapsed = time.perf_counter() - start
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, traced
+
+
+def main(corpus, count, capacities):
+    frequencies = page_frequencies(corpus, count)
+    exact, elapsed, traced = measure(lambda: count_dict(frequencies))
+    start = time.perf_counter()
+    exact_top = sorted(exact, key=lambda k: exact[k], reverse=True)[:TOP]
+    query = time.perf_counter() - start
+    total = sum(exact.values())
+    print(f"{len(frequencies)} pages, {total} words, {len(exact)} distinct")
+    print(f"{'counter':<20}{'memory':>10}{'build':>10}{'top 50':>12}"
+          f"{'recall':>8}{'max err':>9}{'bound':>8}")
+    print(f"{'dict':<20}{traced / 1024:>8.0f}KB{elapsed:>9.2f}s"
+          f"{query * 1e6:>10.0f}us{1:>8.2f}{0:>9}{0:>8}")
+
+    for capacity in capacities:
+        counter, elapsed, traced = measure(
+            lambda: count_space_saving(frequencies, capacity))
+        start = time.perf_counter()
+        top = counter.top(TOP)
+        query = time.perf_counter() - start
+        recall = len(set(top) & set(exact_top)) / len(exact_top)
+        max_error = max(counter.get(word)[0] - exact[word] for word in top)
+        print(f"{f'SpaceSaving({capacity})':<20}{traced / 1024:>8.0f}KB"
+              f"{elapsed:>9.2f}s{query * 1e6:>10.0f}us{recall:>8.2f}"
+              f"{max_error:>9}{total // capacity:>8}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--capacities", type=int, nargs="+",
+                        default=[500, 2000, 10000])
+    args = parser.parse_args()
+    main(args.corpus, args.pages, args.capacities)
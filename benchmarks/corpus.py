@@ -0,0 +1,82 @@
+"""
+Page corpus shared by the benchmarks. A corpus is a directory of saved pages
+(*.html / *.htm, searched recursively); without one, synthetic pages that look
+roughly like the ics.uci.edu sites are generated instead.
+"""
+import os
+import random
+
+WORDS = (
+    "computer science informatics statistics research faculty student course "
+    "graduate undergraduate seminar lecture machine learning data systems "
+    "software engineering algorithms theory networks security database "
+    "professor department school university irvine california lab project "
+    "paper publication conference award news event calendar 2019 2020 2021"
+).split()
+
+SYLLABLES = "ka lo mi nu re sa ti vo ze pa gu be di fo ha ji".split()
+
+HOSTS = (
+    "www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu",
+    "www.stat.uci.edu", "vision.ics.uci.edu", "wics.ics.uci.edu")
+
+
+def load_pages(path):
+    ''' Returns [(url, content bytes)] for every saved page under path. '''
+    pages = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.endswith((".html", ".htm")):
+                file_path = os.path.join(root, name)
+                with open(file_path, "rb") as page:
+                    relative = os.path.relpath(file_path, path)
+                    pages.append(
+                        (f"https://www.ics.uci.edu/{relative}", page.read()))
+    return pages
+
+
+def make_vocabulary(rng, size=5000):
+    vocabulary = list(WORDS)
+    while len(vocabulary) < size:
+        vocabulary.append("".join(
+            rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return vocabulary
+
+
+def synthetic_page(rng, vocabulary, num_words=600, num_links=60):
+    host = rng.choice(HOSTS)
+    paragraphs = []
+    for _ in range(max(1, num_words // 60)):
+        # Zipf-like: common words come up far more often than rare ones.
+        paragraphs.append("<p>" + " ".join(
+            vocabulary[min(int(rng.paretovariate(1.0)) - 1, len(vocabulary) - 1)]
+            if rng.random() < 0.5 else rng.choice(vocabulary)
+            for _ in range(60)) + "</p>")
+    links = []
+    for _ in range(num_links):
+        target = rng.choice(HOSTS)
+        links.append(
+            f'<li><a href="https://{target}/{rng.choice(WORDS)}/'
+            f'{rng.randrange(10000)}">{rng.choice(WORDS)}</a></li>')
+        links.append(f'<li><a href="/{rng.choice(WORDS)}/#top">rel</a></li>')
+    html = (
+        "<!DOCTYPE html><html><head><title>"
+        + " ".join(rng.choice(WORDS) for _ in range(4))
+        + "</title><style>body { font-family: sans-serif; }</style>"
+        "<script>var analytics = {id: 'UA-000000'};</script></head><body>"
+        "<nav><ul>" + "".join(links) + "</ul></nav><main>"
+        + "".join(paragraphs) + "</main></body></html>")
+    url = f"https://{host}/{rng.choice(WORDS)}/{rng.randrange(100000)}"
+    return url, html.encode("utf-8")
+
+
+def synthetic_pages(count, seed=121):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    return [synthetic_page(rng, vocabulary) for _ in range(count)]
+
+
+def get_pages(path=None, count=200):
+    if path:
+        return load_pages(path)
+    return synthetic_pages(count)
@@ -1,15 +1,114 @@
-from utils import get_logger
+import atexit
+
+from utils import get_logger, set_log_level
+from utils.url_filter import UrlFilter, get_url_filter, set_url_filter
+from utils.canonical import (
+    Canonicalizer, get_canonicalizer, set_canonicalizer)
+from utils.metrics import (
+    MetricsRegistry, SnapshotWriter, set_metrics, start_metrics_server)
+from utils.simhash import SimHashIndex, set_near_duplicate_index
+from utils.traps import TrapDetector, set_trap_detector
+from utils.priority import UrlPriority, set_url_priority
+from utils.content_policy import ContentPolicy, set_content_policy
+from utils.inverted_index import IndexWriter, set_index_writer
+from utils.archive import PageArchive, set_page_archive
+from utils.revisit import RevisitStore, set_revisit_store
+from utils.rate_control import (
+    RateController, get_rate_controller, set_rate_controller)
+from utils.checkpoint import Checkpointer, read_checkpoint, remove_checkpoint
 from crawler.frontier import Frontier
-from crawler.worker import Worker
+from crawler.worker import Worker, check_scraper
+import page_analysis
+import scraper
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
+        set_log_level(config.log_level)
         self.logger = get_logger("CRAWLER")
+        # Once for all the workers, getsource reads the whole scraper.
+        check_scraper()
+        if config.metrics_enabled:
+            # Before anything that looks up its metrics.
+            self._start_metrics()
+        page_analysis.set_default_backend(config.parser_backend)
+        # Built once, before the frontier filters its save file with them.
+        set_canonicalizer(Canonicalizer.from_config(config))
+        set_url_filter(UrlFilter.from_config(config))
+        set_near_duplicate_index(SimHashIndex.from_config(config))
+        set_trap_detector(TrapDetector.from_config(config))
+        set_content_policy(ContentPolicy.from_config(config))
+        # Before the frontier, which scores its seeds with it.
+        set_url_priority(UrlPriority.from_config(config))
+        # Before the frontier, which schedules the hosts with it.
+        set_rate_controller(RateController.from_config(config))
+        if config.seen_file:
+            scraper.open_seen_sets(
+                config.seen_file, restart, config.seen_bloom_bits)
+        scraper.url_stats.set_word_capacity(config.top_words_capacity)
+        if config.index_dir:
+            index_writer = IndexWriter(
+                config.index_dir, restart, config.index_memory_mb << 20)
+            set_index_writer(index_writer)
+            # Merges the partial runs into the final index.
+            atexit.register(index_writer.close)
+        if config.archive_dir:
+            page_archive = PageArchive.from_config(config)
+            set_page_archive(page_archive)
+            atexit.register(page_archive.close)
+        if config.stats_file:
+            scraper.resume_statistics(
+                config.stats_file, restart, config.stats_interval)
+        if config.recrawl_file:
+            # Before the frontier, which queues the pages due for a revisit.
+            self._resume_revisits(restart)
         self.frontier = frontier_factory(config, restart)
         self.workers = list()
         self.worker_factory = worker_factory
 
+    def _resume_revisits(self, restart):
+        path = self.config.recrawl_file
+        revisits = RevisitStore.from_config(self.config)
+        if restart:
+            remove_checkpoint(path)
+        state = read_checkpoint(path)
+        if state is not None:
+            revisits.restore(state)
+            self.logger.info(f"Resumed {len(state)} pages to revisit from {path}")
+        set_revisit_store(revisits)
+        checkpointer = Checkpointer(
+            path, revisits.snapshot, self.config.stats_interval)
+        checkpointer.start()
+        atexit.register(checkpointer.stop)
+
+    def _start_metrics(self):
+        registry = MetricsRegistry()
+        set_metrics(registry)
+        registry.register_collector(self._collect_metrics)
+        if self.config.metrics_port:
+            server = start_metrics_server(registry, self.config.metrics_port)
+            self.logger.info(
+                "Serving metrics on http://%s:%d/metrics" % server.server_address)
+        if self.config.metrics_snapshot_file:
+            writer = SnapshotWriter(
+                registry, self.config.metrics_snapshot_file,
+                self.config.metrics_snapshot_interval)
+            writer.start()
+            atexit.register(writer.stop)
+
+    @staticmethod
+    def _collect_metrics():
+        filter_cache = get_url_filter().cache_info()
+        canonical_cache = get_canonicalizer().cache_info()
+        return [
+            ("crawler_filter_cache_total", {"outcome": "hit"}, filter_cache.hits),
+            ("crawler_filter_cache_total", {"outcome": "miss"}, filter_cache.misses),
+            ("crawler_canonical_cache_total", {"outcome": "hit"}, canonical_cache.hits),
+            ("crawler_canonical_cache_total", {"outcome": "miss"}, canonical_cache.misses),
+            ("crawler_unique_urls", {}, len(scraper.url_stats.unique_urls)),
+            ("crawler_unique_checksums", {}, len(scraper.CHECKSUMS)),
+        ]
+
     def start_async(self):
         self.workers = [
             self.worker_factory(worker_id, self.config, self.frontier)
@@ -24,3 +123,6 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
+        self.frontier.finish_crawl()
+        self.logger.info(
+            f"Host rates at exit: {get_rate_controller().summary()}")
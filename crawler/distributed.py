@@ -0,0 +1,295 @@
+import json
+import atexit
+from threading import Thread, Event, Lock, Condition
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from utils import get_logger, get_urlhash
+from utils.canonical import canonicalize
+from utils.priority import ParentPage
+from utils.shards import shard_of, set_local_shard
+from crawler.frontier import Frontier
+import scraper
+
+"""
+Multi-node crawling. The url space is split between the shards listed in the
+PEERS option of [DISTRIBUTED] by a hash of the host, so every host belongs to
+exactly one shard and its politeness delay is kept by that shard alone. Each
+shard is a crawler process with its own ShardedFrontier and save file. The
+trap and content checks of a link (scraper.is_trap) run on the shard that
+owns it, when the link is received, so the budgets of a host are all kept in
+one place.
+
+Links found for a host of another shard are buffered and sent to it in
+batches, over HTTP to the address the shard has in PEERS:
+
+    POST /links       [[url, parent depth, parent unique word ratio], ...]
+    GET  /status      {"idle": ..., "sent": ..., "received": ...}
+    POST /finish      the crawl is over
+    POST /statistics  {"shard": ..., "statistics": ...}, to shard 0
+
+A shard with nothing queued, in flight or left to send asks every shard for
+its status. Once all of them are idle and the links sent add up to the links
+received, twice in a row with the same totals, no link can still be on its
+way: the crawl is over and every shard is told so.
+
+Once its workers stopped, every shard sends its crawl statistics to shard 0,
+which merges them with its own and logs the statistics of the whole crawl.
+"""
+
+# Seconds shard 0 waits for the statistics of the other shards.
+MERGE_TIMEOUT = 60.0
+
+
+class LinkForwarder(Thread):
+    ''' Sends buffered links to their shards, every flush_interval seconds
+    or as soon as a shard has batch_size of them. Links that could not be
+    sent are kept and sent again on the next flush. '''
+    def __init__(self, peers, batch_size=100, flush_interval=1.0, timeout=10.0):
+        self.logger = get_logger("FORWARDER", "FRONTIER")
+        self.peers = peers
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.buffers = {shard: list() for shard in range(len(peers))}
+        # Links forwarded but not yet acknowledged by their shard.
+        self.pending = 0
+        self.sent = 0
+        self.lock = Lock()
+        self.full = Event()
+        self.stopped = Event()
+        self.session = requests.Session()
+        super().__init__(daemon=True)
+
+    def forward(self, shard, url, parent):
+        with self.lock:
+            buffer = self.buffers[shard]
+            buffer.append((url, parent.depth, parent.information))
+            self.pending += 1
+            if len(buffer) >= self.batch_size:
+                self.full.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.full.wait(self.flush_interval)
+            self.full.clear()
+            self.flush()
+
+    def flush(self):
+        for shard in self.buffers:
+            with self.lock:
+                batch, self.buffers[shard] = self.buffers[shard], list()
+            if not batch:
+                continue
+            try:
+                self.session.post(
+                    f"http://{self.peers[shard]}/links", json=batch,
+                    timeout=self.timeout).raise_for_status()
+            except requests.RequestException as e:
+                self.logger.error(
+                    f"Could not send {len(batch)} links to shard {shard}: {e}")
+                with self.lock:
+                    self.buffers[shard][:0] = batch
+                continue
+            with self.lock:
+                self.pending -= len(batch)
+                self.sent += len(batch)
+
+    def stop(self):
+        self.stopped.set()
+        self.full.set()
+        self.join()
+        self.flush()
+        self.session.close()
+
+
+class _ShardHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/status":
+            self.send_error(404)
+            return
+        self._send_json(self.server.frontier.status())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/links":
+            self.server.frontier.receive(json.loads(body))
+        elif self.path == "/finish":
+            self.server.frontier.finish(broadcast=False)
+        elif self.path == "/statistics":
+            message = json.loads(body)
+            self.server.frontier.receive_statistics(
+                message["shard"], message["statistics"])
+        else:
+            self.send_error(404)
+            return
+        self._send_json({})
+
+    def _send_json(self, value):
+        body = json.dumps(value).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ShardedFrontier(Frontier):
+    '''
+    Frontier of one shard (config.shard_index) of a multi-node crawl. It only
+    queues urls of its own hosts; links to other hosts are forwarded to the
+    shard that owns them, and seeds of other hosts are left to their shard.
+    '''
+    def __init__(self, config, restart):
+        self.peers = config.shard_peers
+        self.shard = config.shard_index
+        self.forwarder = LinkForwarder(
+            self.peers, config.shard_batch_size, config.shard_flush_interval)
+        self.poll_interval = config.shard_poll_interval
+        self.received = 0
+        self.finished = Event()
+        # shard -> statistics sent by the other shards, on shard 0.
+        self.shard_statistics = dict()
+        self.statistics_received = Condition()
+        # Links of other shards are left to them by the scraper's checks.
+        set_local_shard(self.shard, len(self.peers))
+        super().__init__(config, restart)
+
+        host, port = self.peers[self.shard].rsplit(":", 1)
+        self.server = ThreadingHTTPServer((host, int(port)), _ShardHandler)
+        self.server.daemon_threads = True
+        self.server.frontier = self
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.forwarder.start()
+        Thread(target=self._watch_termination, daemon=True).start()
+        atexit.register(self.close)
+        self.logger.info(
+            f"Shard {self.shard} of {len(self.peers)}, listening on "
+            f"{self.peers[self.shard]}.")
+
+    def add_url(self, url, parent_url=None):
+        url = canonicalize(url)
+        shard = shard_of(url, len(self.peers))
+        if shard == self.shard:
+            self.add_url_from(url, self.parent_page(parent_url))
+        elif parent_url is not None:
+            self.forwarder.forward(shard, url, self.parent_page(parent_url))
+
+    def receive(self, links):
+        for url, depth, information in links:
+            with self.lock:
+                seen = get_urlhash(url) in self.save
+            # Checked against the trap budgets here, where the host is crawled.
+            if not seen and not scraper.is_trap(url):
+                self.add_url_from(url, ParentPage(depth, information))
+        with self.lock:
+            self.received += len(links)
+
+    def receive_statistics(self, shard, statistics):
+        with self.statistics_received:
+            self.shard_statistics[shard] = statistics
+            self.statistics_received.notify_all()
+
+    def finish_crawl(self):
+        ''' Sends the statistics of this shard to shard 0, or on shard 0,
+        merges those of every shard and logs them. '''
+        if self.shard != 0:
+            try:
+                requests.post(
+                    f"http://{self.peers[0]}/statistics",
+                    json={"shard": self.shard,
+                          "statistics": scraper.url_stats.to_state()},
+                    timeout=MERGE_TIMEOUT).raise_for_status()
+            except requests.RequestException as e:
+                self.logger.error(f"Could not send statistics to shard 0: {e}")
+            return
+        with self.statistics_received:
+            self.statistics_received.wait_for(
+                lambda: len(self.shard_statistics) == len(self.peers) - 1,
+                MERGE_TIMEOUT)
+            statistics = dict(self.shard_statistics)
+        missing = [
+            shard for shard in range(1, len(self.peers))
+            if shard not in statistics]
+        if missing:
+            self.logger.error(f"No statistics from shards {missing}.")
+        merged = scraper.Statistics()
+        merged.set_word_capacity(self.config.top_words_capacity)
+        merged.merge(scraper.url_stats.to_state())
+        for shard in sorted(statistics):
+            merged.merge(statistics[shard])
+        self.logger.info(
+            f"Statistics of all shards: {merged.get_final_statistics()}")
+
+    def is_idle(self):
+        with self.lock:
+            if self.to_be_downloaded_count or self.in_flight or self.loading:
+                return False
+        with self.forwarder.lock:
+            return not self.forwarder.pending
+
+    def status(self):
+        idle = self.is_idle()
+        with self.lock:
+            received = self.received
+        with self.forwarder.lock:
+            sent = self.forwarder.sent
+        return {"idle": idle, "sent": sent, "received": received}
+
+    def _wait_for_urls(self):
+        # Workers wait here, not stop, until every shard is done.
+        if self.finished.is_set():
+            return False
+        self.has_work.wait(self.poll_interval)
+        return True
+
+    def _global_totals(self):
+        ''' (links sent, links received) over all shards if they are all
+        idle, else None. '''
+        sent = received = 0
+        for shard, peer in enumerate(self.peers):
+            if shard == self.shard:
+                status = self.status()
+            else:
+                try:
+                    status = requests.get(
+                        f"http://{peer}/status", timeout=10).json()
+                except (requests.RequestException, ValueError):
+                    return None
+            if not status["idle"]:
+                return None
+            sent += status["sent"]
+            received += status["received"]
+        return (sent, received) if sent == received else None
+
+    def _watch_termination(self):
+        previous = None
+        while not self.finished.wait(self.poll_interval):
+            totals = self._global_totals() if self.is_idle() else None
+            if totals is not None and totals == previous:
+                self.finish()
+            previous = totals
+
+    def finish(self, broadcast=True):
+        if self.finished.is_set():
+            return
+        self.logger.info(f"All shards are idle, shard {self.shard} stops.")
+        self.finished.set()
+        with self.lock:
+            self.has_work.notify_all()
+        if not broadcast:
+            return
+        for shard, peer in enumerate(self.peers):
+            if shard != self.shard:
+                try:
+                    requests.post(f"http://{peer}/finish", timeout=10)
+                except requests.RequestException:
+                    pass
+
+    def close(self):
+        self.forwarder.stop()
+        self.server.shutdown()
@@ -1,18 +1,65 @@
 import os
-import shelve
+import time
+import heapq
+import atexit
 
-from threading import Thread, RLock
-from queue import Queue, Empty
+from itertools import count
+from threading import Thread, RLock, Condition
+from urllib.parse import urlparse
 
-from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
+from utils import get_logger, get_urlhash
+from utils.canonical import canonicalize
+from utils.metrics import get_metrics
+from utils.priority import get_url_priority, SEED
+from utils.rate_control import get_rate_controller
+from utils.revisit import get_revisit_store
+from utils.url_filter import get_url_filter
+from crawler.persistence import SAVE_BACKENDS
 
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
-        
+        # Politeness scheduler state. Every host has its own heap of
+        # (cost, order added, url, depth), cheapest url first (see
+        # utils/priority.py). A host is in the ready heap (keyed on the
+        # earliest time it may be contacted again) only while it has queued
+        # urls and fewer downloads in flight than the rate controller allows
+        # (see utils/rate_control.py). Once that time has passed it moves to
+        # the eligible heap, keyed on the cost of its cheapest url, so the
+        # cheapest url of any host that may be contacted goes first. All of
+        # it is guarded by self.lock.
+        self.lock = RLock()
+        self.has_work = Condition(self.lock)
+        self.host_queues = dict()
+        self.ready_hosts = list()
+        self.eligible_hosts = list()
+        self.next_allowed = dict()
+        # Hosts in the ready or eligible heap.
+        self.scheduled = set()
+        # host -> downloads in flight, hosts without any left out.
+        self.in_flight = dict()
+        self.rate_controller = get_rate_controller()
+        # Depth of the urls being downloaded, for the links found on them.
+        self.depths = dict()
+        self.order = count()
+        self.priority = get_url_priority()
+        self.to_be_downloaded_count = 0
+        # (due at, url) of the completed pages to download again, earliest
+        # first, see utils/revisit.py.
+        self.revisits = get_revisit_store()
+        self.revisit_times = list()
+        # Urls queued again for a revisit while _load_pending runs, which
+        # finds them pending in the save file too.
+        self.revisiting = set()
+        # Pending urls of the save file are still being read, see
+        # _load_pending.
+        self.loading = False
+        # Set by stop(), workers get None from then on.
+        self.stopped = False
+        get_metrics().register_collector(self._collect_metrics)
+
+        save_backend = SAVE_BACKENDS[self.config.save_backend]
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
@@ -22,51 +69,252 @@ class Frontier(object):
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
-        # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
         if restart:
+            save_backend.remove(self.config.save_file)
+        # Load existing save file, or create one if it does not exist.
+        # Writes are batched; see crawler/persistence.py.
+        self.save = save_backend(
+            self.config.save_file, self.config.save_batch_size,
+            self.config.save_flush_interval, get_url_filter())
+        atexit.register(self.save.close)
+        if restart or not self.save:
             for url in self.config.seed_urls:
                 self.add_url(url)
         else:
             # Set the frontier state with contents of save file.
             self._parse_save_file()
-            if not self.save:
-                for url in self.config.seed_urls:
-                    self.add_url(url)
 
     def _parse_save_file(self):
-        ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
+        ''' This function can be overridden for alternate saving techniques.
+        Queues the completed urls due for a revisit, then reads the pending
+        ones in the background, so workers can start on the first of them
+        right away. '''
+        with self.lock:
+            self.loading = True
+            if self.revisits is not None:
+                now = time.time()
+                for due_at, url in self.revisits.revisit_times():
+                    if due_at <= now:
+                        self._revisit(url)
+                    else:
+                        self.revisit_times.append((due_at, url))
+                heapq.heapify(self.revisit_times)
+            due = len(self.revisiting)
+        Thread(target=self._load_pending, args=(due,), daemon=True).start()
+
+    def _load_pending(self, due):
         tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
+        try:
+            batch = list()
+            for entry in self.save.pending_urls():
+                batch.append(entry)
+                if len(batch) == 1000:
+                    tbd_count += self._enqueue_all(batch)
+                    batch = list()
+            tbd_count += self._enqueue_all(batch)
+        finally:
+            with self.lock:
+                self.loading = False
+                self.revisiting.clear()
+                self.has_work.notify_all()
         self.logger.info(
-            f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
+            f"Found {tbd_count} urls to be downloaded and {due} to revisit.")
+
+    def _enqueue_all(self, entries):
+        # The revisits, already queued, are pending in the save file too.
+        queued = 0
+        with self.lock:
+            for url, cost, depth in entries:
+                if url not in self.revisiting:
+                    self._enqueue(url, cost, depth)
+                    queued += 1
+        return queued
+
+    def _revisit(self, url):
+        # Caller holds self.lock. Queues the completed url again, with the
+        # cost and depth it had.
+        urlhash = get_urlhash(url)
+        if urlhash not in self.save or not get_url_filter().is_allowed(url):
+            return
+        _, completed, *priority = self.save[urlhash]
+        if completed:
+            cost, depth = priority or (0, 0)
+            self.save[urlhash] = (url, False, cost, depth)
+            if self.loading:
+                self.revisiting.add(url)
+            self._enqueue(url, cost, depth)
+
+    def _queue_revisits(self):
+        # Caller holds self.lock. Queues the pages whose revisit is due.
+        now = time.time()
+        while self.revisit_times and self.revisit_times[0][0] <= now:
+            _, url = heapq.heappop(self.revisit_times)
+            # Skips an entry left behind by a later fetch of url.
+            if self.revisits.is_due(url, now):
+                self._revisit(url)
+
+    def _collect_metrics(self):
+        with self.lock:
+            samples = [
+                ("crawler_frontier_depth", {"host": host}, len(queue))
+                for host, queue in self.host_queues.items()]
+            samples.append(
+                ("crawler_frontier_queued", {}, self.to_be_downloaded_count))
+            samples.append((
+                "crawler_frontier_in_flight", {},
+                sum(self.in_flight.values())))
+        return samples
+
+    @staticmethod
+    def _get_host(url):
+        return urlparse(url).hostname or ""
+
+    def _enqueue(self, url, cost, depth):
+        host = self._get_host(url)
+        with self.lock:
+            queue = self.host_queues.get(host)
+            if queue is None:
+                queue = self.host_queues[host] = list()
+            heapq.heappush(queue, (cost, next(self.order), url, depth))
+            self.to_be_downloaded_count += 1
+            self._maybe_schedule(host)
+
+    def _maybe_schedule(self, host):
+        # Caller holds self.lock. Returns whether host is scheduled now.
+        if host in self.scheduled:
+            return True
+        if (host not in self.host_queues
+                or self.in_flight.get(host, 0)
+                >= self.rate_controller.concurrency(host)):
+            return False
+        self.scheduled.add(host)
+        heapq.heappush(
+            self.ready_hosts, (self.next_allowed.get(host, 0), host))
+        self.has_work.notify()
+        return True
 
     def get_tbd_url(self):
-        try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
+        ''' Blocks until some host's delay has elapsed and returns
+        the cheapest url of such a host, or returns None once there is nothing queued and no
+        download in flight that could still discover new urls. Pages whose
+        revisit is due are queued on the way; those due after the crawl ended
+        wait for it to be resumed. '''
+        with self.lock:
+            while True:
+                if self.stopped:
+                    return None
+                self._queue_revisits()
+                now = time.monotonic()
+                while self.ready_hosts and self.ready_hosts[0][0] <= now:
+                    _, host = heapq.heappop(self.ready_hosts)
+                    allowed = self.next_allowed.get(host, 0)
+                    if allowed > now:
+                        # Pushed back by a download that finished since.
+                        heapq.heappush(self.ready_hosts, (allowed, host))
+                        continue
+                    heapq.heappush(
+                        self.eligible_hosts,
+                        (self.host_queues[host][0][0], host))
+                if self.eligible_hosts:
+                    _, host = heapq.heappop(self.eligible_hosts)
+                    self.scheduled.discard(host)
+                    _, _, url, depth = heapq.heappop(self.host_queues[host])
+                    if not self.host_queues[host]:
+                        del self.host_queues[host]
+                    self.to_be_downloaded_count -= 1
+                    self.in_flight[host] = self.in_flight.get(host, 0) + 1
+                    self.depths[url] = depth
+                    # Downloads from a host start at least its delay apart.
+                    self.next_allowed[host] = (
+                        now + self.rate_controller.delay(host))
+                    self._maybe_schedule(host)
+                    return url
+                if self.ready_hosts:
+                    self.has_work.wait(self.ready_hosts[0][0] - now)
+                elif self.in_flight:
+                    self.has_work.wait()
+                elif self._wait_for_urls():
+                    continue
+                else:
+                    # Wake up any other worker so it can stop as well.
+                    self.has_work.notify_all()
+                    return None
+
+    def stop(self):
+        ''' Makes get_tbd_url return None to every worker, whatever is still
+        queued or in flight. '''
+        with self.lock:
+            self.stopped = True
+            self.has_work.notify_all()
 
-    def add_url(self, url):
-        url = normalize(url)
+    def finish_crawl(self):
+        ''' Called once every worker stopped. Nothing to do for a single
+        crawler. '''
+
+    def _wait_for_urls(self):
+        ''' Called with self.lock held once nothing is queued or in flight.
+        Returns whether urls may still arrive from elsewhere, after waiting
+        for them a while. '''
+        if self.loading:
+            self.has_work.wait()
+            return True
+        return False
+
+    def parent_page(self, parent_url):
+        ''' The ParentPage (see utils/priority.py) of the links found on
+        parent_url, SEED for None. '''
+        with self.lock:
+            if parent_url in self.depths:
+                return self.priority.parent_page(
+                    parent_url, self.depths[parent_url])
+        return SEED
+
+    def add_url(self, url, parent_url=None):
+        ''' Adds url, found on parent_url (None for a seed), if it was not
+        seen before. Its cost is kept in the save file, so the order survives
+        a restart. '''
+        self.add_url_from(canonicalize(url), self.parent_page(parent_url))
+
+    def add_url_from(self, url, parent):
+        ''' Adds the canonical url, found on a page described by parent. '''
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
-    
+        with self.lock:
+            if urlhash not in self.save:
+                cost = self.priority.score(url, parent)
+                self.save[urlhash] = (url, False, cost, parent.depth + 1)
+                self._enqueue(url, cost, parent.depth + 1)
+
     def mark_url_complete(self, url):
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
+        host = self._get_host(url)
+        with self.lock:
+            if urlhash not in self.save:
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but have not seen it before.")
+                self.save[urlhash] = (url, True)
+            else:
+                # Keep the cost and depth, for a revisit.
+                _, _, *priority = self.save[urlhash]
+                self.save[urlhash] = (url, True, *priority)
 
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+            self.depths.pop(url, None)
+            self.priority.forget(url)
+            if self.revisits is not None:
+                # A failed revisit keeps its old time, it waits for a resume
+                # rather than being downloaded again right away.
+                due_at = self.revisits.due_at(url)
+                if due_at is not None and due_at > time.time():
+                    heapq.heappush(self.revisit_times, (due_at, url))
+            in_flight = self.in_flight.get(host, 0) - 1
+            if in_flight > 0:
+                self.in_flight[host] = in_flight
+            else:
+                # The host may be contacted again one delay after its last
+                # download finished.
+                self.in_flight.pop(host, None)
+                self.next_allowed[host] = max(
+                    self.next_allowed.get(host, 0),
+                    time.monotonic() + self.rate_controller.delay(host))
+            if not self._maybe_schedule(host):
+                self.has_work.notify_all()
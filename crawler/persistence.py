@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import shelve
+import sqlite3
+from threading import Lock
+
+from utils import get_logger
+
+
+class Journal(object):
+    ''' Append only file of the save file writes not flushed yet, one JSON
+    [urlhash, value] per line, replayed on open after a crash. '''
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def replay(self):
+        ''' Yields the (urlhash, value) entries left by a crash. '''
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    urlhash, value = json.loads(line)
+                except ValueError:
+                    # Torn last line from a crash mid-write; nothing after it.
+                    break
+                yield urlhash, tuple(value)
+
+    def open(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, urlhash, value):
+        self.file.write(json.dumps([urlhash, value]) + "\n")
+        self.file.flush()
+
+    def clear(self):
+        ''' Empties the journal, once the save file has its entries. '''
+        if self.file is None:
+            os.truncate(self.path, 0)
+            return
+        self.file.truncate(0)
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class WriteBehindSave(object):
+    ''' Dict-like wrapper around the frontier shelve that batches writes.
+
+    Every write is appended to a journal file next to the save file and kept
+    in memory until the batch is full or the flush interval has elapsed. Only
+    then are the entries written to the shelve and synced, after which the
+    journal is truncated. On open, any journal left over by a crash is
+    replayed into the shelve, so at most the last unflushed batch is redone.
+    '''
+    def __init__(self, save_file, batch_size=100, flush_interval=5.0,
+                 url_filter=None):
+        self.logger = get_logger("SAVE", "FRONTIER")
+        self.save_file = save_file
+        self.url_filter = url_filter
+        self.journal = Journal(f"{save_file}.journal")
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.save = shelve.open(save_file)
+        self.pending = dict()
+        self._replay_journal()
+        self.journal.open()
+        self.last_flush = time.monotonic()
+
+    @staticmethod
+    def remove(save_file):
+        ''' Deletes save_file and its journal, if any. '''
+        for path in (save_file, f"{save_file}.journal"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal.path):
+            return
+        replayed = 0
+        for urlhash, value in self.journal.replay():
+            self.save[urlhash] = value
+            replayed += 1
+        self.save.sync()
+        self.journal.clear()
+        if replayed:
+            self.logger.info(
+                f"Replayed {replayed} unflushed entries from "
+                f"{self.journal.path}.")
+
+    def __contains__(self, urlhash):
+        return urlhash in self.pending or urlhash in self.save
+
+    def __getitem__(self, urlhash):
+        if urlhash in self.pending:
+            return self.pending[urlhash]
+        return self.save[urlhash]
+
+    def __setitem__(self, urlhash, value):
+        self.pending[urlhash] = value
+        self.journal.append(urlhash, value)
+        if (len(self.pending) >= self.batch_size
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def __len__(self):
+        self.flush()
+        return len(self.save)
+
+    def __bool__(self):
+        return bool(self.pending) or bool(self.save)
+
+    def values(self):
+        self.flush()
+        return self.save.values()
+
+    def pending_urls(self):
+        ''' [(url, cost, depth)] of the urls not completed yet that the url
+        filter allows. Reads every entry of the shelve. '''
+        pending = list()
+        for url, completed, *priority in self.values():
+            if completed or (
+                    self.url_filter and not self.url_filter.is_allowed(url)):
+                continue
+            # Entries from before the priority frontier have no cost.
+            cost, depth = priority or (0, 0)
+            pending.append((url, cost, depth))
+        return pending
+
+    def sync(self):
+        self.flush()
+
+    def flush(self):
+        if self.pending:
+            for urlhash, value in self.pending.items():
+                self.save[urlhash] = value
+            self.save.sync()
+            self.pending.clear()
+            # The shelve now has everything the journal had.
+            self.journal.clear()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.journal.file.closed:
+            return
+        self.flush()
+        self.save.close()
+        self.journal.close()
+
+
+class SqliteSave(object):
+    ''' The frontier save file as an indexed SQLite table, in WAL mode, with
+    the same dict-like interface as WriteBehindSave.
+
+    Writes are appended to a journal, as in WriteBehindSave, and written in
+    one transaction per batch of batch_size, or after flush_interval seconds.
+    A url is journaled as soon as the frontier adds it, so one the scraper
+    marked seen is not lost by a crash before its batch was written: the
+    journal is replayed into the table on open. Every url is stored with the verdict of the url
+    filter, and a partial index covers the allowed urls not completed yet,
+    so a resumed crawl reads only those (see pending_urls()), without checking
+    them again. The verdicts are worked out again when the rules changed.
+    '''
+    def __init__(self, save_file, batch_size=100, flush_interval=5.0,
+                 url_filter=None):
+        self.logger = get_logger("SAVE", "FRONTIER")
+        self.save_file = save_file
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.url_filter = url_filter
+        self.db = sqlite3.connect(save_file, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS urls (urlhash TEXT PRIMARY KEY, "
+                "url TEXT NOT NULL, completed INTEGER NOT NULL, "
+                "cost REAL NOT NULL, depth INTEGER NOT NULL, "
+                "allowed INTEGER NOT NULL) WITHOUT ROWID")
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS pending_urls ON urls (cost) "
+                "WHERE completed = 0 AND allowed = 1")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS meta "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.lock = Lock()
+        self.pending_writes = dict()
+        self.last_flush = time.monotonic()
+        self.closed = False
+        self.journal = Journal(f"{save_file}.journal")
+        self._replay_journal()
+        self.journal.open()
+        if url_filter is not None:
+            self._check_rules()
+
+    @staticmethod
+    def remove(save_file):
+        ''' Deletes save_file, its WAL files and its journal, if any. '''
+        for path in (save_file, f"{save_file}-wal", f"{save_file}-shm",
+                     f"{save_file}.journal"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal.path):
+            return
+        self.pending_writes.update(self.journal.replay())
+        replayed = len(self.pending_writes)
+        self.flush()
+        if replayed:
+            self.logger.info(
+                f"Replayed {replayed} unflushed entries from "
+                f"{self.journal.path}.")
+
+    def _verdict(self, url):
+        return self.url_filter is None or self.url_filter.is_allowed(url)
+
+    def _check_rules(self):
+        fingerprint = self.url_filter.fingerprint
+        row = self.db.execute(
+            "SELECT value FROM meta WHERE key = 'rules'").fetchone()
+        if row is not None and row[0] == fingerprint:
+            return
+        # New rules: check the urls still to download against them.
+        rows = self.db.execute(
+            "SELECT urlhash, url FROM urls WHERE completed = 0").fetchall()
+        with self.db:
+            self.db.executemany(
+                "UPDATE urls SET allowed = ? WHERE urlhash = ?",
+                ((self._verdict(url), urlhash) for urlhash, url in rows))
+            self.db.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('rules', ?)",
+                (fingerprint,))
+        if rows:
+            self.logger.info(
+                f"Url filter rules changed, checked {len(rows)} queued urls "
+                f"again.")
+
+    def __contains__(self, urlhash):
+        with self.lock:
+            if urlhash in self.pending_writes:
+                return True
+            return self.db.execute(
+                "SELECT 1 FROM urls WHERE urlhash = ?", (urlhash,)
+            ).fetchone() is not None
+
+    def __getitem__(self, urlhash):
+        with self.lock:
+            if urlhash in self.pending_writes:
+                return self.pending_writes[urlhash]
+            row = self.db.execute(
+                "SELECT url, completed, cost, depth FROM urls "
+                "WHERE urlhash = ?", (urlhash,)).fetchone()
+        if row is None:
+            raise KeyError(urlhash)
+        url, completed, cost, depth = row
+        return (url, bool(completed), cost, depth)
+
+    def __setitem__(self, urlhash, value):
+        with self.lock:
+            self.pending_writes[urlhash] = value
+            self.journal.append(urlhash, value)
+            elapsed = time.monotonic() - self.last_flush
+            if (len(self.pending_writes) < self.batch_size
+                    and elapsed < self.flush_interval):
+                return
+        self.flush()
+
+    def __len__(self):
+        self.flush()
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def __bool__(self):
+        with self.lock:
+            return bool(self.pending_writes) or self.db.execute(
+                "SELECT 1 FROM urls LIMIT 1").fetchone() is not None
+
+    def values(self):
+        self.flush()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT url, completed, cost, depth FROM urls").fetchall()
+        return [(url, bool(completed), cost, depth)
+                for url, completed, cost, depth in rows]
+
+    def pending_urls(self):
+        ''' Yields (url, cost, depth) of the urls not completed yet that the
+        url filter allows, cheapest first, from the index. They are read on
+        a connection of their own, so this can run in another thread, and
+        from one snapshot: urls written while it runs are not included. '''
+        self.flush()
+        db = sqlite3.connect(self.save_file)
+        try:
+            cursor = db.execute(
+                "SELECT url, cost, depth FROM urls INDEXED BY pending_urls "
+                "WHERE completed = 0 AND allowed = 1 ORDER BY cost")
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            db.close()
+
+    def sync(self):
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.pending_writes:
+                rows = list()
+                for urlhash, (url, completed, *priority) in (
+                        self.pending_writes.items()):
+                    cost, depth = priority or (0, 0)
+                    rows.append((
+                        urlhash, url, int(completed), cost, depth,
+                        self._verdict(url)))
+                with self.db:
+                    self.db.executemany(
+                        "INSERT OR REPLACE INTO urls "
+                        "VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self.pending_writes.clear()
+                # The table now has everything the journal had.
+                self.journal.clear()
+            self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        with self.lock:
+            self.closed = True
+            self.db.close()
+            self.journal.close()
+
+
+# Save file formats, for the SAVEBACKEND option.
+SAVE_BACKENDS = {"shelve": WriteBehindSave, "sqlite": SqliteSave}
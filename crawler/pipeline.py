@@ -0,0 +1,64 @@
+import atexit
+
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor
+
+import page_analysis
+import scraper
+from utils.metrics import get_metrics
+from crawler.worker import PooledWorker
+
+_pool_lock = Lock()
+_pool = None
+
+
+def _init_parse_process(backend):
+    page_analysis.set_default_backend(backend)
+
+
+def get_parse_pool(config):
+    ''' The process pool shared by every PipelineWorker of this crawler. '''
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=config.parse_processes,
+                initializer=_init_parse_process,
+                initargs=(config.parser_backend,))
+            atexit.register(shutdown_parse_pool)
+        return _pool
+
+
+def shutdown_parse_pool():
+    ''' Stops the processes of the parse pool, if it was started. The next
+    get_parse_pool starts a new one. '''
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+class PipelineWorker(PooledWorker):
+    '''
+    Worker that only downloads and merges. The parsing, tokenizing,
+    checksum and fingerprint of each page (page_analysis.summarize_page) run
+    in a process pool, so they are not serialized on the GIL. The small
+    PageSummary that comes back is merged into the statistics and the
+    frontier on this thread. The thread waits for its page without holding
+    the GIL, so up to PARSEPROCESSES pages are parsed at the same time.
+    '''
+    def __init__(self, worker_id, config, frontier):
+        super().__init__(worker_id, config, frontier)
+        self.pool = get_parse_pool(config)
+
+    def scrape(self, url, resp):
+        if not scraper.check_response(url, resp):
+            return list()
+        with get_metrics().histogram(
+                "crawler_stage_seconds", stage="parse").time():
+            page = self.pool.submit(
+                page_analysis.summarize_page, resp.url,
+                resp.content, None,
+                scraper.get_near_duplicate_index() is not None).result()
+        return scraper.scrape_page(url, resp, page)
@@ -1,10 +1,21 @@
+import time
 from threading import Thread
+from urllib.parse import urlparse
 
 from inspect import getsource
-from utils.download import download
+from utils.download import download, DownloadSession
 from utils import get_logger
+from utils.metrics import get_metrics
+from utils.archive import get_page_archive
+from utils.rate_control import get_rate_controller
 import scraper
-import time
+
+
+def check_scraper():
+    ''' basic check for requests in scraper, done once per Crawler '''
+    source = getsource(scraper)
+    assert {source.find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests in scraper.py"
+    assert {source.find(req) for req in {"from urllib.request import", "import urllib.request"}} == {-1}, "Do not use urllib.request in scraper.py"
 
 
 class Worker(Thread):
@@ -12,23 +23,94 @@ class Worker(Thread):
         self.logger = get_logger(f"Worker-{worker_id}", "Worker")
         self.config = config
         self.frontier = frontier
-        # basic check for requests in scraper
-        assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests in scraper.py"
-        assert {getsource(scraper).find(req) for req in {"from urllib.request import", "import urllib.request"}} == {-1}, "Do not use urllib.request in scraper.py"
+        metrics = get_metrics()
+        self.stage_timers = {
+            stage: metrics.histogram("crawler_stage_seconds", stage=stage)
+            for stage in ("frontier_wait", "download", "archive", "scrape",
+                          "add_url", "mark_complete")}
+        self.bytes_fetched = metrics.counter("crawler_bytes_fetched_total")
+        self.links_added = metrics.counter("crawler_links_added_total")
         super().__init__(daemon=True)
         
     def run(self):
-        while True:
-            tbd_url = self.frontier.get_tbd_url()
-            if not tbd_url:
-                self.logger.info("Frontier is empty. Stopping Crawler.")
-                break
-            resp = download(tbd_url, self.config, self.logger)
-            self.logger.info(
-                f"Downloaded {tbd_url}, status <{resp.status}>, "
-                f"using cache {self.config.cache_server}.")
-            scraped_urls = scraper.scraper(tbd_url, resp)
+        timers = self.stage_timers
+        try:
+            while True:
+                with timers["frontier_wait"].time():
+                    tbd_url = self.frontier.get_tbd_url()
+                if not tbd_url:
+                    self.logger.info("Frontier is empty. Stopping Crawler.")
+                    break
+                try:
+                    self.process(tbd_url)
+                except Exception:
+                    self.logger.exception(f"Failed to process {tbd_url}.")
+                finally:
+                    # Releases the host, even if the page failed.
+                    with timers["mark_complete"].time():
+                        self.frontier.mark_url_complete(tbd_url)
+        except BaseException:
+            # The other workers would wait for this one's downloads forever.
+            self.logger.exception("Worker failed. Stopping Crawler.")
+            self.frontier.stop()
+            raise
+        finally:
+            self.close()
+
+    def process(self, tbd_url):
+        ''' Downloads, archives and scrapes tbd_url, and adds its links to
+        the frontier. '''
+        timers = self.stage_timers
+        start = time.perf_counter()
+        with timers["download"].time():
+            resp = self.download(tbd_url)
+        # Adapts the delay and downloads in flight of the host.
+        get_rate_controller().record(
+            urlparse(tbd_url).hostname or "", resp,
+            time.perf_counter() - start)
+        self.logger.info(
+            "Downloaded %s, status <%s>, using cache %s.",
+            tbd_url, resp.status, self.config.cache_server)
+        self.count_response(resp)
+        with timers["archive"].time():
+            self.archive(tbd_url, resp)
+        with timers["scrape"].time():
+            scraped_urls = self.scrape(tbd_url, resp)
+        with timers["add_url"].time():
             for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
-            self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
+                self.frontier.add_url(scraped_url, tbd_url)
+        self.links_added.inc(len(scraped_urls))
+
+    def count_response(self, resp):
+        get_metrics().counter(
+            "crawler_responses_total", status=f"{resp.status // 100}xx").inc()
+        # Counted from the payload, without decoding the page.
+        self.bytes_fetched.inc(resp.size)
+
+    def download(self, url):
+        return download(url, self.config, self.logger)
+
+    def archive(self, url, resp):
+        page_archive = get_page_archive()
+        if page_archive is not None and resp.has_raw_response:
+            page_archive.append(url, resp, time.time())
+
+    def scrape(self, url, resp):
+        return scraper.scraper(url, resp)
+
+    def close(self):
+        pass
+
+
+class PooledWorker(Worker):
+    ''' Worker that keeps a pooled, keep-alive session to the cache server,
+    with timeouts and retries (see utils.download.DownloadSession). '''
+    def __init__(self, worker_id, config, frontier):
+        super().__init__(worker_id, config, frontier)
+        self.session = DownloadSession(config, self.logger)
+
+    def download(self, url):
+        return self.session.download(url)
+
+    def close(self):
+        self.session.close()
@@ -1,23 +1,82 @@
+import os
+import sys
+import subprocess
 from configparser import ConfigParser
 from argparse import ArgumentParser
 
 from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
+from crawler.frontier import Frontier
+from crawler.distributed import ShardedFrontier
+from crawler.worker import Worker, PooledWorker
+from crawler.pipeline import PipelineWorker
 
+WORKERS = {
+    "simple": Worker,
+    "pooled": PooledWorker
+}
 
-def main(config_file, restart):
+
+def main(config_file, restart, shard=None):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
-    config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
+    frontier_factory = Frontier
+    if config.shard_peers:
+        assert shard is not None, "Set --shard to crawl with PEERS"
+        config.set_shard(shard)
+        frontier_factory = ShardedFrontier
+    if config.replay_file:
+        # Downloads never leave the process.
+        config.cache_server = ("replay", 0)
+    elif config.local_cache_server:
+        host, port = config.local_cache_server.rsplit(":", 1)
+        config.cache_server = (host, int(port))
+    else:
+        config.cache_server = get_cache_server(config, restart)
+    if config.parse_processes > 0:
+        worker_factory = PipelineWorker
+    else:
+        worker_factory = WORKERS[config.downloader]
+    crawler = Crawler(
+        config, restart, frontier_factory=frontier_factory,
+        worker_factory=worker_factory)
     crawler.start()
 
 
+def launch_local_shards(config_file, restart):
+    ''' Runs every shard of PEERS as a process on this machine, each in its
+    own directory shards/<n> for its logs and save files. '''
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    shards = len(Config(cparser).shard_peers)
+    assert shards, "Set PEERS in [DISTRIBUTED] to launch local shards"
+    processes = list()
+    for shard in range(shards):
+        directory = os.path.join("shards", str(shard))
+        os.makedirs(directory, exist_ok=True)
+        command = [
+            sys.executable, os.path.abspath(__file__),
+            "--config_file", os.path.abspath(config_file),
+            "--shard", str(shard)]
+        if restart:
+            command.append("--restart")
+        processes.append(subprocess.Popen(command, cwd=directory))
+    for process in processes:
+        process.wait()
+
+
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--shard", type=int, default=None,
+                        help="index of this crawler in PEERS")
+    parser.add_argument("--local_shards", action="store_true", default=False,
+                        help="run every shard in PEERS on this machine")
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    if args.local_shards:
+        launch_local_shards(args.config_file, args.restart)
+    else:
+        main(args.config_file, args.restart, args.shard)
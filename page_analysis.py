@@ -0,0 +1,174 @@
+import hashlib  # Checksum
+from html.parser import HTMLParser
+from urllib.parse import urldefrag, urljoin, urlparse
+
+from bs4 import BeautifulSoup  # Parse HTML
+
+from tokenize_functions import tokenize, compute_word_frequencies
+from utils.simhash import simhash
+
+"""
+Single-parse page analysis shared by scraper() and extract_next_links().
+A page is parsed once and everything the scraper needs from it (text, tokens,
+outlinks and some metadata) is returned together.
+
+Backends:
+    html.parser  BeautifulSoup with python's parser. Text is soup.get_text(),
+                 which is what the scraper has always used.
+    lxml         BeautifulSoup with lxml. Faster, needs lxml installed.
+    stream       A streaming tokenizer over html.parser.HTMLParser that never
+                 builds a tree. Only visible text is kept (no script/style).
+"""
+
+BACKENDS = ("html.parser", "lxml", "stream")
+_default_backend = "html.parser"
+
+
+class PageAnalysis(object):
+    def __init__(self, url, text, hrefs, title, content_length):
+        self.url = url
+        self.text = text
+        self.tokens = tokenize(text)
+        self.outlinks = resolve_links(url, hrefs)
+        self.title = title
+        self.content_length = content_length
+
+    @property
+    def num_words(self):
+        return len(self.tokens)
+
+    def get_metadata(self):
+        return {
+            "url": self.url,
+            "title": self.title,
+            "content_length": self.content_length,
+            "num_words": self.num_words,
+            "num_links": len(self.outlinks)
+        }
+
+
+def set_default_backend(backend):
+    global _default_backend
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown parser backend {backend}, expected one of {BACKENDS}.")
+    if backend == "lxml":
+        import lxml  # noqa: F401 Fail at startup rather than on first page.
+    _default_backend = backend
+
+
+def get_default_backend():
+    return _default_backend
+
+
+def resolve_links(base_url, hrefs):
+    ''' Absolute, defragmented http(s) urls for every href on the page. '''
+    links = []
+    for href in hrefs:
+        absolute_url = urljoin(base_url, href)
+        # De-frag the url
+        defragmented_url, fragment = urldefrag(absolute_url)
+        # Add only urls, not triggers
+        if urlparse(defragmented_url).scheme in {"http", "https"}:
+            links.append(defragmented_url)
+    return links
+
+
+def _analyze_soup(url, content, features):
+    soup = BeautifulSoup(content, features)
+    hrefs = [a["href"] for a in soup.find_all('a', href=True)]
+    title = soup.title.get_text().strip() if soup.title else ""
+    return PageAnalysis(url, soup.get_text(), hrefs, title, len(content))
+
+
+class _StreamingParser(HTMLParser):
+    SKIP_TAGS = {"script", "style", "noscript", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.text_parts = []
+        self.title_parts = []
+        self.hrefs = []
+        self.skip_depth = 0
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            for name, value in attrs:
+                if name == "href" and value is not None:
+                    self.hrefs.append(value)
+        elif tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == "title":
+            self.in_title = True
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag == "title":
+            self.in_title = False
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title_parts.append(data)
+        if not self.skip_depth:
+            self.text_parts.append(data)
+
+
+def _analyze_stream(url, content):
+    parser = _StreamingParser()
+    if isinstance(content, bytes):
+        content_length = len(content)
+        content = content.decode("utf-8", errors="replace")
+    else:
+        content_length = len(content)
+    parser.feed(content)
+    parser.close()
+    return PageAnalysis(
+        url, "".join(parser.text_parts), parser.hrefs,
+        "".join(parser.title_parts).strip(), content_length)
+
+
+def analyze_page(url, content, backend=None):
+    '''
+    Parses content once and returns a PageAnalysis.
+    :param url: the url of the page, used to resolve relative links.
+    :param content: the raw page, bytes or str.
+    :param backend: one of BACKENDS, defaults to the configured backend.
+    '''
+    backend = backend or _default_backend
+    if backend == "stream":
+        return _analyze_stream(url, content)
+    if backend in ("html.parser", "lxml"):
+        return _analyze_soup(url, content, backend)
+    raise ValueError(
+        f"Unknown parser backend {backend}, expected one of {BACKENDS}.")
+
+
+def get_md5_checksum(text: str):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class PageSummary(object):
+    '''
+    Everything the scraper needs from a page, without the page itself: small
+    and picklable, so it can be computed in another process.
+    '''
+    def __init__(self, analysis, fingerprint=True):
+        tokens = analysis.tokens
+        self.url = analysis.url
+        self.title = analysis.title
+        self.content_length = analysis.content_length
+        self.outlinks = analysis.outlinks
+        self.checksum = get_md5_checksum(analysis.text)
+        self.num_words = len(tokens)
+        self.word_frequencies = compute_word_frequencies(tokens)
+        self.unique_word_ratio = (
+            len(self.word_frequencies) / self.num_words if self.num_words else 0)
+        self.fingerprint = simhash(tokens) if fingerprint and tokens else None
+
+
+def summarize_page(url, content, backend=None, fingerprint=True):
+    ''' Parses content once and returns its PageSummary. This is the CPU
+    heavy part of scraping a page, see crawler/pipeline.py. '''
+    return PageSummary(analyze_page(url, content, backend), fingerprint)
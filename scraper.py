@@ -1,12 +1,27 @@
 import re
-from urllib.parse import urlparse, urldefrag, urlunparse, parse_qs, urljoin
-import hashlib  # Checksum
+import base64
+from urllib.parse import urlparse
 import logging
-from bs4 import BeautifulSoup  # Parse HTML
+from page_analysis import analyze_page, summarize_page
+from utils.url_filter import get_url_filter
+from utils.canonical import canonicalize
+from utils.simhash import get_near_duplicate_index
+from utils.traps import get_trap_detector
+from utils.priority import get_url_priority
+from utils.content_policy import get_content_policy
+from utils.inverted_index import get_index_writer
+from utils.revisit import get_revisit_store, NOT_MODIFIED_STATUS
+from utils.seen_set import DigestSet
+from utils.shards import is_local
+from utils.checkpoint import Checkpointer, read_checkpoint, remove_checkpoint
+from utils.heavy_hitters import SpaceSaving
+from utils.metrics import get_metrics
+from utils import get_log_handler
 
 import atexit
-from tokenize_functions import tokenize, compute_word_frequencies, stopwords
+from tokenize_functions import compute_word_frequencies, stopwords
 from collections import defaultdict
+from threading import RLock
 
 """
 1. checksum for detecting duplicate pages - JEREMY
@@ -27,13 +42,20 @@ from collections import defaultdict
 
 class Statistics:
     def __init__(self):
-        self.unique_urls = set()
+        # Compact set of url digests, see utils/seen_set.py
+        self.unique_urls = DigestSet()
         self.longest_page = {
             "words": 0,
             "url": ""
         }
         self.ics_subdomains = defaultdict(int)
-        self.frequent_50_words = dict()
+        # Bounded heavy hitters counter, see utils/heavy_hitters.py
+        self.frequent_50_words = SpaceSaving()
+        # Guards the counters against the checkpoint thread, and counts
+        # updates so unchanged statistics are not written again.
+        self.lock = RLock()
+        self.version = 0
+        self.checkpointed_version = 0
 
     def get_num_unique_urls(self):
         return len(self.unique_urls)
@@ -42,9 +64,11 @@ class Statistics:
         return self.unique_urls
 
     def update_longest_page(self, num_words, url):
-        if num_words > self.longest_page["words"]:
-            self.longest_page["words"] = num_words
-            self.longest_page["url"] = url
+        with self.lock:
+            if num_words > self.longest_page["words"]:
+                self.longest_page["words"] = num_words
+                self.longest_page["url"] = url
+                self.version += 1
 
     def update_unique_urls(self, url):
         self.unique_urls.add(url)
@@ -52,20 +76,30 @@ class Statistics:
     def check_and_update_ics_domain(self, url):
         parsed = urlparse(url)
         if parsed.netloc.endswith("ics.uci.edu"):
-            self.ics_subdomains[parsed.netloc] += 1
+            with self.lock:
+                self.ics_subdomains[parsed.netloc] += 1
+                self.version += 1
 
     def update_frequent_words(self, tokens):
-        word_frequencies = compute_word_frequencies(tokens)
-        for key, value in word_frequencies.items():
-            if key not in stopwords:
-                self.frequent_50_words[key] = self.frequent_50_words.get(key, 0) + value
+        self.update_word_frequencies(compute_word_frequencies(tokens))
+
+    def update_word_frequencies(self, word_frequencies):
+        with self.lock:
+            # One set difference instead of a stopword lookup per key
+            for key in word_frequencies.keys() - stopwords:
+                self.frequent_50_words.update(key, word_frequencies[key])
+            self.version += 1
+
+    def set_word_capacity(self, capacity):
+        # Number of distinct words counted; counts are at most
+        # total words / capacity too high.
+        with self.lock:
+            self.frequent_50_words = SpaceSaving.from_state(
+                self.frequent_50_words.to_state(), capacity)
 
     def get_top_50_frequent_words(self):
-        sorted_words = sorted(self.frequent_50_words, key=lambda k: self.frequent_50_words[k], reverse=True)
-        if len(sorted_words) >= 50:
-            return sorted_words[:50]
-        else:
-            return sorted_words
+        with self.lock:
+            return self.frequent_50_words.top(50)
 
     def get_final_statistics(self):
         return {
@@ -75,32 +109,116 @@ class Statistics:
             "top_50_words": self.get_top_50_frequent_words()
         }
 
+    def snapshot(self):
+        # A copy of the counters for the checkpoint, None if nothing changed.
+        # The unique urls are not included, they live in their own
+        # memory-mapped file (see open_seen_sets).
+        with self.lock:
+            if self.version == self.checkpointed_version:
+                return None
+            self.checkpointed_version = self.version
+            return {
+                "longest_page": dict(self.longest_page),
+                "ics_subdomains": dict(self.ics_subdomains),
+                "frequent_words": self.frequent_50_words.to_state()
+            }
+
+    def to_state(self):
+        # All the statistics, unique url digests included, for merging the
+        # statistics of the shards of a multi-node crawl.
+        with self.lock:
+            state = {
+                "longest_page": dict(self.longest_page),
+                "ics_subdomains": dict(self.ics_subdomains),
+                "frequent_words": self.frequent_50_words.to_state()
+            }
+        state["unique_urls"] = base64.b64encode(
+            b"".join(self.unique_urls.digests())).decode("ascii")
+        return state
+
+    def merge(self, state):
+        # Adds the statistics of another shard, from its to_state(). Shards
+        # own disjoint hosts, but may have found the same links.
+        with self.lock:
+            if state["longest_page"]["words"] > self.longest_page["words"]:
+                self.longest_page = dict(state["longest_page"])
+            for subdomain, count in state["ics_subdomains"].items():
+                self.ics_subdomains[subdomain] += count
+            for word, count, _ in state["frequent_words"]["items"]:
+                self.frequent_50_words.update(word, count)
+            self.version += 1
+        digests = base64.b64decode(state["unique_urls"])
+        size = self.unique_urls.digest_size
+        for offset in range(0, len(digests), size):
+            self.unique_urls.add_digest(digests[offset:offset + size])
+
+    def restore(self, state):
+        with self.lock:
+            self.longest_page = state["longest_page"]
+            self.ics_subdomains = defaultdict(int, state["ics_subdomains"])
+            frequent_words = state["frequent_words"]
+            if "items" not in frequent_words:
+                # Checkpoint from before the counter was bounded.
+                frequent_words = {
+                    "capacity": len(frequent_words),
+                    "total": sum(frequent_words.values()),
+                    "items": [[word, count, 0]
+                              for word, count in frequent_words.items()]
+                }
+            self.frequent_50_words = SpaceSaving.from_state(
+                frequent_words, self.frequent_50_words.capacity)
+
 
 # URL stats to answer all questions
 url_stats = Statistics()
 
-# Configure logging to write to a file
-logging.basicConfig(filename="output.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Configure logging to write to a file, from the log writer thread
+logging.basicConfig(level=logging.INFO, handlers=[get_log_handler(
+    "output.log", "%(asctime)s - %(levelname)s - %(message)s")])
 
-CHECKSUMS = set()
+CHECKSUMS = DigestSet()
 
 
-def on_exit():
-    logging.info(url_stats.get_final_statistics())
-    logging.info("PROGRAM END")
+def open_seen_sets(path_prefix, restart, bloom_bits_per_item=0):
+    # Back the unique urls and checksums with memory-mapped files so they
+    # survive a restart without being rebuilt.
+    global CHECKSUMS
+    for suffix in ("urls", "checksums"):
+        if restart:
+            DigestSet.remove(f"{path_prefix}.{suffix}")
+    url_stats.unique_urls = DigestSet(
+        f"{path_prefix}.urls", bloom_bits_per_item=bloom_bits_per_item)
+    CHECKSUMS = DigestSet(
+        f"{path_prefix}.checksums", bloom_bits_per_item=bloom_bits_per_item)
 
 
-atexit.register(on_exit)
+def resume_statistics(path, restart, interval):
+    # Reload the statistics of the previous run, if any, and checkpoint them
+    # every interval seconds from a background thread.
+    global stats_checkpointer
+    if restart:
+        remove_checkpoint(path)
+    state = read_checkpoint(path)
+    if state is not None:
+        url_stats.restore(state)
+        logging.info(f"Resumed statistics from {path}")
+    stats_checkpointer = Checkpointer(path, url_stats.snapshot, interval)
+    stats_checkpointer.start()
 
 
-def remove_trailing_slash(url: str) -> str:
-    parsed = urlparse(url)
-    new_parsed = (parsed.scheme, parsed.netloc, parsed.path.rstrip('/'), parsed.params, parsed.query, parsed.fragment)
-    return urlunparse(new_parsed)
+stats_checkpointer = None
+
+
+def on_exit():
+    if stats_checkpointer is not None:
+        stats_checkpointer.stop()
+    logging.info(url_stats.get_final_statistics())
+    logging.info(get_trap_detector().summary())
+    logging.info(get_content_policy().summary())
+    logging.info("PROGRAM END")
 
 
-def get_md5_checksum(text: str):
-    return hashlib.md5(text.encode()).hexdigest()
+atexit.register(on_exit)
 
 
 # https://wics.ics.uci.edu/events/category/social-gathering/2020-09/
@@ -115,44 +233,86 @@ def is_close_path(url: str) -> bool:
     if match:
         base_url = url.replace(match.group(0), "DATE")  # Normalize by replacing the date
         if base_url in url_stats.get_unique_urls():
-            logging.info(f"SIMILAR URL: {url}")
+            logging.info("SIMILAR URL: %s", url)
             return True
         url_stats.update_unique_urls(base_url)
+
+    # Links to hosts of another shard are checked there, see utils/shards.py
+    return is_local(url) and is_trap(url)
+
+
+def is_trap(url: str) -> bool:
+    # Repeated segments, trap query keys and url templates that stopped
+    # yielding new links and words, see utils/traps.py
+    reason = get_trap_detector().admit(url)
+    if reason is not None:
+        logging.info("TRAP URL (%s): %s", reason, url)
+        get_metrics().counter("crawler_trap_urls_total", reason=reason).inc()
+        return True
+
+    # Templates that only gave oversized or non html pages
+    if get_content_policy().rejects(url):
+        logging.info("TRAP URL (content): %s", url)
+        get_metrics().counter("crawler_trap_urls_total", reason="content").inc()
+        return True
     return False
 
 
 # Don't scrape large files and files with low information value
-def low_information_or_large_file(resp, text, tokens) -> bool:
-    threshold = 1 * 1024 * 1024  # 1MB page is big
-    num_words = len(tokens)
-    unique_word_ratio = len(set(tokens)) / num_words if num_words > 0 else 0
-    print(f"filesize:{len(resp.raw_response.content)}")
-    print(f"{resp.url}, {unique_word_ratio}")
+def low_information_or_large_file(page) -> bool:
+    # page: the PageSummary of the page
+    threshold = get_content_policy().max_bytes  # 1MB page is big
+    num_words = page.num_words
+    unique_word_ratio = page.unique_word_ratio
+    # Debug output, only formatted when the log level is DEBUG
+    logging.debug("filesize:%d", page.content_length)
+    logging.debug("%s, %s", page.url, unique_word_ratio)
 
     # large page
-    if len(resp.raw_response.content) > threshold:
-        print(f"here: threshold{len(resp.raw_response.content)}")
+    if page.content_length > threshold:
+        logging.debug("here: threshold%d", page.content_length)
         return True
 
     # low information
     if num_words < 50 or unique_word_ratio < 0.1:
-        print(f"second condition")
+        logging.debug("second condition")
         return True
 
     return False
 
 
 def scraper(url: str, resp) -> list:
+    if not check_response(url, resp):
+        return list()
 
-    logging.info(f"Scraped URL: {url}")
+    # Parse html once: text, tokens, links, checksum and fingerprint
+    with get_metrics().histogram("crawler_stage_seconds", stage="parse").time():
+        page = summarize_page(
+            resp.url, resp.content,
+            fingerprint=get_near_duplicate_index() is not None)
+    return scrape_page(url, resp, page)
 
-    if resp is None or resp.raw_response is None:
-        logging.info(f"RESPONSE IS NONE, URL: {url}")
-        return list()
+
+def check_response(url: str, resp) -> bool:
+    # Whether the response holds a page worth parsing.
+
+    logging.info("Scraped URL: %s", url)
+
+    # Pages not modified since they were last crawled
+    revisits = get_revisit_store()
+    if resp is not None and resp.status == NOT_MODIFIED_STATUS:
+        logging.info("NOT MODIFIED, URL: %s", url)
+        if revisits is not None:
+            revisits.record_fetch(url, resp)
+        return False
+
+    if resp is None or not resp.has_raw_response:
+        logging.info("RESPONSE IS NONE, URL: %s", url)
+        return False
 
     # Redirects
     if 300 <= resp.status <= 399:
-        logging.info(f"REDIRECT, Status: {resp.status}, URL: {url}")
+        logging.info("REDIRECT, Status: %d, URL: %s", resp.status, url)
         # new_url = resp.raw_response.headers.get("Location")
         # if not new_url:
         #     logging.info(f"REDIRECT WITHOUT LOCATION HEADER, Status: {resp.status}, URL: {url}")
@@ -169,48 +329,103 @@ def scraper(url: str, resp) -> list:
 
     # Errors
     if not 200 <= resp.status <= 299:
-        logging.info(f"ERROR, Status: {resp.status} URL:{url}")
-        return list()
-
-    # Parse html, get text, and calculate checksum
-    soup = BeautifulSoup(resp.raw_response.content, "html.parser")
-    text = soup.get_text()
-    checksum = get_md5_checksum(text)
-    tokens = tokenize(text)
+        logging.info("ERROR, Status: %d URL:%s", resp.status, url)
+        get_trap_detector().record_yield(url, 0)
+        return False
+
+    # Don't parse pages that are not html
+    policy = get_content_policy()
+    content_type = resp.headers.get("Content-Type")
+    if not policy.is_html(content_type):
+        logging.info("NOT HTML, Content-Type: %s, URL: %s", content_type, url)
+        get_metrics().counter("crawler_pages_total", outcome="not_html").inc()
+        policy.record(url, "not_html")
+        get_trap_detector().record_yield(url, 0)
+        return False
+    policy.record(url)
+
+    # Revisited pages whose content did not change are not parsed again
+    if revisits is not None and not revisits.record_fetch(url, resp):
+        logging.info("UNCHANGED PAGE, URL: %s", url)
+        get_metrics().counter("crawler_pages_total", outcome="unchanged").inc()
+        return False
+
+    return True
+
+
+def scrape_page(url: str, resp, page) -> list:
+    # Merges the PageSummary of a downloaded page into the statistics and
+    # returns the links to add to the frontier.
+    checksum = page.checksum
+    metrics = get_metrics()
+    traps = get_trap_detector()
+    # A revisited page whose content changed was counted on its first visit
+    revisits = get_revisit_store()
+    revisit = revisits is not None and revisits.pop_changed(url)
 
     # Don't scrape pages with duplicate checksum
     if checksum in CHECKSUMS:
-        logging.info(f"DUPLICATE PAGE, Checksum: {checksum}, URL: {url}")
+        logging.info("DUPLICATE PAGE, Checksum: %s, URL: %s", checksum, url)
+        metrics.counter("crawler_pages_total", outcome="duplicate").inc()
+        traps.record_yield(url, 0)
         return list()
     CHECKSUMS.add(checksum)
 
     # Don't scrape large or small files, and files with low information value
-    if low_information_or_large_file(resp, text, tokens):
-        print(f"low info or large file: {url}")
-        logging.info(f"low info or large file: {url}")
+    if low_information_or_large_file(page):
+        logging.info("low info or large file: %s", url)
+        metrics.counter("crawler_pages_total", outcome="low_information").inc()
+        traps.record_yield(url, 0)
         return []
 
+    # Don't scrape pages that are near duplicates of a page already seen,
+    # e.g. calendar or wiki pages that only differ by a date or a nav item.
+    # Checked after the low information pages, which are not remembered.
+    near_duplicates = get_near_duplicate_index()
+    if near_duplicates is not None and page.fingerprint is not None:
+        if near_duplicates.check_and_add(page.fingerprint) is not None:
+            logging.info("NEAR DUPLICATE PAGE, URL: %s", url)
+            metrics.counter("crawler_pages_total", outcome="near_duplicate").inc()
+            traps.record_yield(url, 0)
+            return list()
+
+    # Links from pages with more information are crawled first
+    get_url_priority().record_page(url, page.unique_word_ratio)
+
     # COMPUTING STATISTICS TO ANSWER THE QUESTIONS
-    url_stats.update_unique_urls(url)
-    url_stats.update_longest_page(len(tokens), url)
-    url_stats.update_frequent_words(tokens)
-    url_stats.check_and_update_ics_domain(url)
+    if not revisit:
+        url_stats.update_unique_urls(url)
+        url_stats.update_longest_page(page.num_words, url)
+        url_stats.update_word_frequencies(page.word_frequencies)
+        url_stats.check_and_update_ics_domain(url)
 
-    print(f"url:{url}")
+    # Searchable output, see utils/inverted_index.py. A revisited page
+    # replaces its earlier document.
+    index_writer = get_index_writer()
+    if index_writer is not None:
+        index_writer.add_document(url, page.word_frequencies)
 
-    links = extract_next_links(url, resp)
+    logging.debug("url:%s", url)
+
+    metrics.counter("crawler_pages_total", outcome="scraped").inc()
+    links = extract_next_links(url, resp, page)
 
     valid_links = []
-    for link in links:
-        if is_valid(link) and not is_close_path(link) and link not in url_stats.get_unique_urls():
-            url_stats.update_unique_urls(link)
-            valid_links.append(link)
-            # logging.info(f"Valid link: {link}")
+    with metrics.histogram("crawler_stage_seconds", stage="filter").time():
+        for link in links:
+            if is_valid(link) and not is_close_path(link) and link not in url_stats.get_unique_urls():
+                url_stats.update_unique_urls(link)
+                valid_links.append(link)
+                # logging.info(f"Valid link: {link}")
+    metrics.counter("crawler_links_total", outcome="extracted").inc(len(links))
+    metrics.counter("crawler_links_total", outcome="valid").inc(len(valid_links))
+    traps.record_yield(
+        url, len(valid_links), traps.new_words(page.word_frequencies))
 
     return valid_links
 
 
-def extract_next_links(url: str, resp) -> list:
+def extract_next_links(url: str, resp, analysis=None) -> list:
     # Implementation required.
     # url: the URL that was used to get the page
     # resp.url: the actual url of the page
@@ -220,70 +435,37 @@ def extract_next_links(url: str, resp) -> list:
     #         resp.raw_response.url: the url, again
     #         resp.raw_response.content: the content of the page!
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
+    # analysis: the PageAnalysis or PageSummary of the page if scraper()
+    #         already parsed it.
     
     if resp.status != 200:
         return list()
 
-    # Parse the response content
-    soup = BeautifulSoup(resp.raw_response.content, "html.parser")
-
-    # Extract all hyperlinks
-    hyperlinks = []
-    for a in soup.find_all('a', href=True):
-        hyperlink_url = a["href"]
-        absolute_url = urljoin(resp.url, hyperlink_url)
-        # De-frag the url
-        defragmented_url, fragment = urldefrag(absolute_url)
-        parsed_url = urlparse(defragmented_url)
-        # Add only urls, not triggers
-        if parsed_url.scheme in {"http", "https"}:
-            hyperlinks.append(remove_trailing_slash(defragmented_url))
+    # Parse the response content, unless the scraper already did
+    if analysis is None:
+        analysis = analyze_page(resp.url, resp.content)
 
-    return hyperlinks
+    # Absolute http(s) hyperlinks, in canonical form (see utils/canonical.py)
+    return [canonicalize(link) for link in analysis.outlinks]
 
 
 def is_valid(url: str) -> bool:
     # Decide whether to crawl this url or not. 
     # If you decide to crawl it, return True; otherwise return False.
-    # There are already some conditions that return False.
+    # The static rules (scheme, domains, query keys, extensions) live in the
+    # url filter engine, configured from the [FILTER] section of config.ini.
 
     try:
-        parsed = urlparse(url)
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-        # Check for correct hostname
-
-        # url must be in uci domain
-        if (parsed.hostname is None
-                or (parsed.hostname.endswith("cecs.uci.edu")
-                    or parsed.hostname.endswith("eecs.uci.edu"))
-                or not (parsed.hostname.endswith("ics.uci.edu")
-                        or parsed.hostname.endswith("cs.uci.edu")
-                        or parsed.hostname.endswith("informatics.uci.edu")
-                        or parsed.hostname.endswith("stat.uci.edu"))):
-            return False
-
-        # Skip ical download links
-        query_params = parse_qs(parsed.query)
-        if any("ical" in key.lower() for key in query_params):
+        if not get_url_filter().is_allowed(url):
             return False
 
         # No duplicate urls
-        if remove_trailing_slash(url) in url_stats.get_unique_urls():
+        if canonicalize(url) in url_stats.get_unique_urls():
             return False
 
-        return not re.match(
-
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz|ics|ppsx)$", parsed.path.lower())
+        return True
 
     except TypeError:
-        print("TypeError for ", url)
+        logging.error("TypeError for %s", url)
         raise
 
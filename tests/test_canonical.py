@@ -0,0 +1,27 @@
+from utils.canonical import Canonicalizer
+
+
+def canonicalize(url):
+    return Canonicalizer().canonicalize(url)
+
+
+def test_drops_index_page():
+    assert canonicalize("https://www.ics.uci.edu/~a/index.html") == (
+        "https://www.ics.uci.edu/~a")
+    assert canonicalize("https://www.ics.uci.edu/index.html") == (
+        "https://www.ics.uci.edu")
+    assert canonicalize("https://www.ics.uci.edu/index.htm") == (
+        "https://www.ics.uci.edu")
+
+
+def test_keeps_pages_ending_like_an_index_page():
+    assert canonicalize("https://www.ics.uci.edu/~a/myindex.html") == (
+        "https://www.ics.uci.edu/~a/myindex.html")
+    assert canonicalize("https://www.ics.uci.edu/~a/foo_default.htm") == (
+        "https://www.ics.uci.edu/~a/foo_default.htm")
+
+
+def test_example_of_the_module_docstring():
+    assert canonicalize(
+        "HTTP://WWW.ICS.UCI.EDU:80/a/./b/../index.html"
+        "?b=2&utm_source=x&a=1#top") == "http://www.ics.uci.edu/a?a=1&b=2"
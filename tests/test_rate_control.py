@@ -0,0 +1,29 @@
+from utils.response import Response
+from utils.rate_control import RateController, is_failure
+
+HOST = "www.ics.uci.edu"
+
+
+def response(status):
+    return Response({"url": f"https://{HOST}/", "status": status})
+
+
+def test_cache_errors_are_failures():
+    for status in range(600, 607):
+        assert is_failure(response(status))
+    assert is_failure(response(0))
+    assert is_failure(response(429))
+    assert is_failure(response(503))
+
+
+def test_successes_and_too_large_pages_are_not_failures():
+    for status in (200, 304, 404, 607):
+        assert not is_failure(response(status))
+
+
+def test_cache_error_backs_the_host_off():
+    controller = RateController(min_delay=0.5, backoff=2.0)
+    controller.record(HOST, response(200), 0.0)
+    delay = controller.delay(HOST)
+    controller.record(HOST, response(603), 0.0)
+    assert controller.delay(HOST) == delay * 2
@@ -0,0 +1,77 @@
+import time
+from types import SimpleNamespace
+
+import utils.revisit
+import utils.simhash
+import utils.rate_control
+import utils.inverted_index
+from crawler.frontier import Frontier
+from utils.response import Response
+from utils.revisit import RevisitStore
+from utils.rate_control import RateController
+from utils.inverted_index import IndexWriter, InvertedIndex
+
+URL = "https://vision.ics.uci.edu/revisited"
+OTHER_URL = "https://www.ics.uci.edu/other"
+
+
+def make_page(prefix):
+    # Enough distinct words to not be a low information page.
+    words = " ".join(f"{prefix}{i}" for i in range(80))
+    content = (f"<html><body><p>sharedterm {words}</p></body></html>").encode()
+    return Response({
+        "url": URL, "status": 200,
+        "headers": {"Content-Type": "text/html", "ETag": f'"{prefix}"'},
+        "content": content})
+
+
+def test_changed_revisit_counts_once_and_replaces_its_document(
+        tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import scraper
+    monkeypatch.setattr(scraper, "url_stats", scraper.Statistics())
+    monkeypatch.setattr(utils.revisit, "_revisit_store", RevisitStore())
+    monkeypatch.setattr(utils.simhash, "_near_duplicate_index", None)
+    index_writer = IndexWriter(str(tmp_path / "index"))
+    monkeypatch.setattr(utils.inverted_index, "_index_writer", index_writer)
+
+    scraper.scraper(URL, make_page("first"))
+    stats = scraper.url_stats.get_final_statistics()
+    scraper.scraper(URL, make_page("second"))
+
+    assert scraper.url_stats.get_final_statistics() == stats
+    assert scraper.url_stats.ics_subdomains["vision.ics.uci.edu"] == 1
+    assert scraper.url_stats.frequent_50_words.get("sharedterm")[0] == 1
+
+    index_writer.close()
+    index = InvertedIndex(str(tmp_path / "index"))
+    assert len(index) == 1
+    assert index.postings("sharedterm") == [(1, 1)]
+    assert index.document_frequency("first0") == 0
+    assert index.document_frequency("second0") == 1
+    assert index.search("sharedterm")[0][0] == URL
+
+
+def test_frontier_queues_a_due_revisit_while_crawling(tmp_path, monkeypatch):
+    revisits = RevisitStore(min_interval=0.2)
+    monkeypatch.setattr(utils.revisit, "_revisit_store", revisits)
+    monkeypatch.setattr(
+        utils.rate_control, "_rate_controller", RateController(0.0, 0.0))
+    config = SimpleNamespace(
+        save_file=str(tmp_path / "frontier.db"), save_backend="sqlite",
+        save_batch_size=1000, save_flush_interval=5.0,
+        seed_urls=[URL, OTHER_URL])
+    frontier = Frontier(config, restart=True)
+    assert {frontier.get_tbd_url(), frontier.get_tbd_url()} == {URL, OTHER_URL}
+
+    # OTHER_URL stays in flight, so the crawl goes on.
+    revisits.record_fetch(URL, make_page("first"))
+    frontier.mark_url_complete(URL)
+    time.sleep(0.3)
+    assert frontier.get_tbd_url() == URL
+
+    # A revisit that failed is left for a resumed crawl.
+    frontier.mark_url_complete(URL)
+    frontier.mark_url_complete(OTHER_URL)
+    assert frontier.get_tbd_url() is None
+    frontier.save.close()
@@ -0,0 +1,29 @@
+from utils.traps import TrapDetector
+
+LISTING = "https://www.ics.uci.edu/events/listing"
+
+
+def event(number):
+    return f"https://www.ics.uci.edu/events/{number}"
+
+
+def test_links_found_before_any_fetch_are_not_capped():
+    traps = TrapDetector(budget=5)
+    assert all(traps.admit(event(number)) is None for number in range(100))
+
+
+def test_high_yield_template_is_not_capped():
+    traps = TrapDetector(budget=5, min_yield=5.0)
+    for number in range(100):
+        assert traps.admit(event(number)) is None
+        traps.record_yield(event(number), 3, 10)
+    assert traps.admit(event(100)) is None
+
+
+def test_low_yield_template_is_capped_once_its_budget_is_fetched():
+    traps = TrapDetector(budget=5, min_yield=5.0, min_samples=100)
+    for number in range(5):
+        assert traps.admit(event(number)) is None
+        traps.record_yield(event(number), 0)
+    assert traps.admit(event(5)) == "budget"
+    assert traps.admit(LISTING) is None
@@ -1,6 +1,7 @@
 import re
 import sys
 import os
+from collections import Counter
 
 stopwords = {
     'a', 'able', 'about', 'above', 'abst', 'accordance', 'according', 'accordingly', 'across',
@@ -80,34 +81,51 @@ stopwords = {
 }
 
 
+# Runs of two or more letters and digits. Matching only maximal runs of at
+# least two is the same as keeping the runs longer than one character.
+TOKEN_PATTERN = re.compile(r'[a-z0-9]{2,}', flags=re.ASCII)
+
+
+def lower_ascii(content: str):
+    """
+    Lowercases only A-Z, in one pass over the utf-8 bytes. str.lower() would
+    also turn some non-ASCII characters (like the Kelvin sign) into ASCII
+    letters, which are not in a token otherwise.
+    """
+    return content.encode("utf-8", errors="surrogatepass").lower().decode(
+        "utf-8", errors="surrogatepass")
+
+
 def tokenize(content: str):
     """
     Finds tokens and normalizes them.
-    Time Complexity: O(n). re.findall is finding a simple pattern
-    of characters and numbers taking linear time to find tokens.
-    We also convert all tokens to lowercase so that is linear time as well.
+    Time Complexity: O(n). The content is lowercased once, and re.findall
+    then finds the lowercase runs of characters and numbers in linear time.
     :param content:
     :return: a list
     """
-
-    pattern = r'[a-zA-Z0-9]+'
-    tokens = re.findall(pattern, content, flags=re.ASCII)
-    tokens = [token.lower() for token in tokens if len(token) > 1]
-    return tokens
+    return TOKEN_PATTERN.findall(lower_ascii(content))
 
 
 def compute_word_frequencies(tokens: list):
     """
     :param tokens: A list of tokens from file
     :return: a dictionary with keys = token, value = frequency of token
-    Time Complexity = O(n). We process the list one at a time, and each time
-    we find the corresponding key in dict - O(1) time due to hashing - and update
-    frequency. Linear processing.
+    Time Complexity = O(n). Counter counts the list in C, one O(1) hash
+    lookup per token.
+    """
+    return Counter(tokens)
+
+
+def remove_stopwords(frequencies: dict):
+    """
+    Deletes the stopwords from frequencies in place and returns it.
+    Time Complexity = O(distinct stopwords on the page). The stopwords to
+    delete are found with one set intersection, not one lookup per token.
     """
-    freq = dict()
-    for token in tokens:
-        freq[token] = freq.get(token, 0) + 1
-    return freq
+    for word in stopwords.intersection(frequencies.keys()):
+        del frequencies[word]
+    return frequencies
 
 
 if __name__ == '__main__':
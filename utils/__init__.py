@@ -1,35 +1,55 @@
 import os
 import logging
 from hashlib import sha256
-from urllib.parse import urlparse
+from threading import Lock
+
+from utils.log_queue import QueueingHandler, get_log_writer
+from utils.canonical import canonicalize
+
+_loggers_lock = Lock()
+_loggers = set()
+_log_level = logging.INFO
+
 
 def get_logger(name, filename=None):
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+    logger.setLevel(_log_level)
+    with _loggers_lock:
+        # Handlers are only added the first time, so calling this again for
+        # the same name does not duplicate every line.
+        if name in _loggers:
+            return logger
+        _loggers.add(name)
     if not os.path.exists("Logs"):
-        os.makedirs("Logs")
-    fh = logging.FileHandler(f"Logs/{filename if filename else name}.log")
-    fh.setLevel(logging.DEBUG)
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.INFO)
-    formatter = logging.Formatter(
-       "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    fh.setFormatter(formatter)
-    ch.setFormatter(formatter)
-    # add the handlers to the logger
-    logger.addHandler(fh)
-    logger.addHandler(ch)
+        os.makedirs("Logs", exist_ok=True)
+    # Records are written by the log writer thread, see utils/log_queue.py.
+    # Loggers with the same filename share one file handler.
+    writer = get_log_writer()
+    logger.addHandler(QueueingHandler(writer, (
+        writer.get_handler(
+            f"Logs/{filename if filename else name}.log", level=logging.DEBUG),
+        writer.get_handler(None, level=logging.INFO))))
     return logger
 
 
+def get_log_handler(filename, format):
+    ''' A handler writing to filename from the log writer thread. '''
+    writer = get_log_writer()
+    return QueueingHandler(writer, (writer.get_handler(filename, format),))
+
+
+def set_log_level(level):
+    ''' Sets the level of the root logger and of every logger from
+    get_logger, e.g. to "WARNING" to skip the per page messages. '''
+    global _log_level
+    _log_level = logging.getLevelName(level) if isinstance(level, str) else level
+    logging.getLogger().setLevel(_log_level)
+    with _loggers_lock:
+        for name in _loggers:
+            logging.getLogger(name).setLevel(_log_level)
+
+
 def get_urlhash(url):
-    parsed = urlparse(url)
-    # everything other than scheme.
+    # everything other than scheme, of the canonical url.
     return sha256(
-        f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
-        f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
-
-def normalize(url):
-    if url.endswith("/"):
-        return url.rstrip("/")
-    return url
+        canonicalize(url).split("://", 1)[-1].encode("utf-8")).hexdigest()
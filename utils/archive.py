@@ -0,0 +1,314 @@
+import os
+import sys
+import json
+import mmap
+import zlib
+import struct
+import threading
+from threading import Lock
+
+from utils.response import Response
+
+"""
+Archive of the downloaded pages, so they can be analyzed again offline
+without crawling again. Pages are appended to segment files (segment-<n>),
+each record being
+
+    header: codec, status, fetched at, url, headers and content lengths
+    url, response headers as JSON, compressed content
+
+with the content compressed on its own (gzip, or zstd with the zstandard
+package), so any record can be read without the ones before it. Next to each
+segment, segment-<n>.idx has one "offset length url" line per record, for
+random access by url. A segment is closed once it grows past segment_bytes.
+
+ArchiveReader streams the records back in order, with large sequential
+reads, or gets the latest record of a url. `python -m utils.archive` runs the
+archived pages through the scraper again.
+"""
+
+SEGMENT_PREFIX = "segment-"
+INDEX_SUFFIX = ".idx"
+
+# codec, status, fetched at, url length, headers length, content length
+RECORD_HEADER = struct.Struct("<BHdIII")
+
+CODECS = {"none": 0, "gzip": 1, "zstd": 2}
+
+_zstd = threading.local()
+
+
+def _zstandard():
+    # Only needed for zstd archives.
+    import zstandard
+    return zstandard
+
+
+def compress(content, codec, level):
+    if codec == CODECS["gzip"]:
+        return zlib.compress(content, level, wbits=31)
+    if codec == CODECS["zstd"]:
+        # Compressors are not thread safe, one per thread.
+        compressors = getattr(_zstd, "compressors", None)
+        if compressors is None:
+            compressors = _zstd.compressors = dict()
+        if level not in compressors:
+            compressors[level] = _zstandard().ZstdCompressor(level=level)
+        return compressors[level].compress(content)
+    return content
+
+
+def decompress(data, codec):
+    if codec == CODECS["gzip"]:
+        return zlib.decompress(data, wbits=31)
+    if codec == CODECS["zstd"]:
+        decompressor = getattr(_zstd, "decompressor", None)
+        if decompressor is None:
+            decompressor = _zstd.decompressor = (
+                _zstandard().ZstdDecompressor())
+        return decompressor.decompress(data)
+    return bytes(data)
+
+
+class ArchivedPage(object):
+    def __init__(self, url, status, fetched_at, headers, content):
+        self.url = url
+        self.status = status
+        self.fetched_at = fetched_at
+        self.headers = headers
+        self.content = content
+
+    def to_response(self):
+        ''' The page as the utils.response.Response a download returns. '''
+        return Response({
+            "url": self.url, "status": self.status, "headers": self.headers,
+            "content": self.content})
+
+
+def _segment_path(directory, number):
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{number:05d}")
+
+
+def _segment_numbers(directory):
+    return sorted(
+        int(name[len(SEGMENT_PREFIX):]) for name in os.listdir(directory)
+        if name.startswith(SEGMENT_PREFIX)
+        and name[len(SEGMENT_PREFIX):].isdigit())
+
+
+def _map(path):
+    ''' The file at path memory-mapped, b"" if it is empty. '''
+    if not os.path.getsize(path):
+        return b""
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _read_record(data, offset):
+    ''' (ArchivedPage, offset after it) of the record at offset in data, or
+    None if data ends within it. '''
+    end = offset + RECORD_HEADER.size
+    if end > len(data):
+        return None
+    codec, status, fetched_at, url_length, headers_length, content_length = (
+        RECORD_HEADER.unpack_from(data, offset))
+    url_end = end + url_length
+    headers_end = url_end + headers_length
+    content_end = headers_end + content_length
+    if content_end > len(data):
+        return None
+    page = ArchivedPage(
+        bytes(data[end:url_end]).decode("utf-8"), status, fetched_at,
+        json.loads(bytes(data[url_end:headers_end])),
+        decompress(data[headers_end:content_end], codec))
+    return page, content_end
+
+
+def _read_index(path):
+    ''' [(offset, length, url)] of a segment index. '''
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.endswith("\n"):
+                # Torn last line.
+                break
+            offset, length, url = line[:-1].split(" ", 2)
+            entries.append((int(offset), int(length), url))
+    return entries
+
+
+class PageArchive(object):
+    '''
+    Appends downloaded pages to the segments in directory. Thread safe: the
+    content is compressed by the calling thread, only the write is locked.
+    Pages archived by an earlier crawl are kept, a later record of the same
+    url takes precedence in ArchiveReader.get().
+    '''
+    def __init__(self, directory, compression="gzip", level=6,
+                 segment_bytes=256 << 20):
+        if compression not in CODECS:
+            raise ValueError(f"Unknown archive compression {compression}")
+        self.directory = directory
+        self.codec = CODECS[compression]
+        self.level = level
+        self.segment_bytes = segment_bytes
+        if self.codec == CODECS["zstd"]:
+            _zstandard()
+        os.makedirs(directory, exist_ok=True)
+        numbers = _segment_numbers(directory)
+        self.segment = numbers[-1] if numbers else 0
+        self.lock = Lock()
+        self.records = 0
+        self.closed = False
+        self._open_segment()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.archive_dir, config.archive_compression,
+                   config.archive_level, config.archive_segment_mb << 20)
+
+    def _open_segment(self):
+        path = _segment_path(self.directory, self.segment)
+        self.file = open(path, "ab")
+        self.index_file = open(path + INDEX_SUFFIX, "a", encoding="utf-8")
+        self._recover(path)
+        self.size = self.file.tell()
+
+    def _recover(self, path):
+        # Index the records written after the last index line, and cut off
+        # a record or index line torn by a crash.
+        with open(path + INDEX_SUFFIX, "rb") as file:
+            index = file.read()
+        if not index.endswith(b"\n"):
+            self.index_file.truncate(index.rfind(b"\n") + 1)
+            self.index_file.seek(0, os.SEEK_END)
+        entries = _read_index(path + INDEX_SUFFIX)
+        offset = entries[-1][0] + entries[-1][1] if entries else 0
+        data = _map(path)
+        while offset < len(data):
+            record = _read_record(data, offset)
+            if record is None:
+                break
+            page, end = record
+            self._write_index(offset, end - offset, page.url)
+            offset = end
+        if offset < len(data):
+            self.file.truncate(offset)
+        self.file.seek(0, os.SEEK_END)
+
+    def _write_index(self, offset, length, url):
+        url = url.replace("\n", " ")
+        self.index_file.write(f"{offset} {length} {url}\n")
+        self.index_file.flush()
+
+    def append(self, url, resp, fetched_at):
+        ''' Archives the raw response of resp, downloaded for url. '''
+        encoded_url = url.encode("utf-8")
+        headers = json.dumps(dict(resp.headers)).encode("utf-8")
+        content = compress(resp.content, self.codec, self.level)
+        record = b"".join((
+            RECORD_HEADER.pack(
+                self.codec, resp.status, fetched_at, len(encoded_url),
+                len(headers), len(content)),
+            encoded_url, headers, content))
+        with self.lock:
+            if self.closed:
+                return
+            if self.size and self.size + len(record) > self.segment_bytes:
+                self._close_segment()
+                self.segment += 1
+                self._open_segment()
+            self.file.write(record)
+            self.file.flush()
+            self._write_index(self.size, len(record), url)
+            self.size += len(record)
+            self.records += 1
+
+    def _close_segment(self):
+        self.file.close()
+        self.index_file.close()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._close_segment()
+
+
+class ArchiveReader(object):
+    ''' Reads the pages archived in directory. '''
+    def __init__(self, directory):
+        self.directory = directory
+        self.segments = [
+            _segment_path(directory, number)
+            for number in _segment_numbers(directory)]
+        self._index = None
+
+    def __iter__(self):
+        ''' Yields every ArchivedPage, in the order they were archived. '''
+        for path in self.segments:
+            data = _map(path)
+            offset = 0
+            while offset < len(data):
+                record = _read_record(data, offset)
+                if record is None:
+                    break
+                page, offset = record
+                yield page
+
+    def index(self):
+        ''' url -> (segment path, offset, length) of its latest record. '''
+        if self._index is None:
+            self._index = dict()
+            for path in self.segments:
+                for offset, length, url in _read_index(path + INDEX_SUFFIX):
+                    self._index[url] = (path, offset, length)
+        return self._index
+
+    def __len__(self):
+        return sum(
+            len(_read_index(path + INDEX_SUFFIX)) for path in self.segments)
+
+    def get(self, url):
+        ''' The latest ArchivedPage of url, or None. '''
+        entry = self.index().get(url)
+        if entry is None:
+            return None
+        path, offset, length = entry
+        with open(path, "rb") as file:
+            file.seek(offset)
+            data = file.read(length)
+        return _read_record(data, 0)[0]
+
+
+_page_archive = None
+
+
+def get_page_archive():
+    return _page_archive
+
+
+def set_page_archive(page_archive):
+    ''' page_archive can be None to turn archiving off. '''
+    global _page_archive
+    _page_archive = page_archive
+
+
+if __name__ == "__main__":
+    # python -m utils.archive <archive directory>
+    # Runs every archived page through the scraper again and prints the
+    # statistics, as a crawl of the same pages would have.
+    import time
+    import scraper
+    start = time.perf_counter()
+    pages = size = 0
+    for page in ArchiveReader(sys.argv[1]):
+        scraper.scraper(page.url, page.to_response())
+        pages += 1
+        size += len(page.content)
+    elapsed = time.perf_counter() - start
+    print(scraper.url_stats.get_final_statistics())
+    print(f"{pages} pages, {size / 1e6:.1f} MB in {elapsed:.1f}s")
@@ -0,0 +1,119 @@
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+"""
+Canonical form of a url, so equivalent urls get one frontier entry, one
+hash and one download:
+
+    HTTP://WWW.ICS.UCI.EDU:80/a/./b/../index.html?b=2&utm_source=x&a=1#top
+    http://www.ics.uci.edu/a?a=1&b=2
+
+The scheme and host are lowercased, the default port, the fragment and a
+trailing slash or index.html are dropped, dot segments are resolved,
+percent-escapes of unreserved characters are decoded (and the others
+uppercased), denied query parameters are removed and the rest are sorted.
+Optionally www. is dropped from the host too. Results are memoized, since
+the same links come up on page after page.
+"""
+
+DEFAULT_DENIED_PARAMS = (
+    "utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content",
+    "fbclid", "gclid", "phpsessid", "jsessionid")
+DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+INDEX_PAGES = ("index.html", "index.htm")
+
+_ESCAPE = re.compile(r"%[0-9a-fA-F]{2}")
+_UNRESERVED = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+
+
+def _normalize_escape(match):
+    character = chr(int(match.group(0)[1:], 16))
+    if character in _UNRESERVED:
+        return character
+    return match.group(0).upper()
+
+
+def normalize_escapes(text):
+    if "%" not in text:
+        return text
+    return _ESCAPE.sub(_normalize_escape, text)
+
+
+def remove_dot_segments(path):
+    if "." not in path:
+        return path
+    segments = []
+    for segment in path.split("/"):
+        if segment == "..":
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != ".":
+            segments.append(segment)
+    if path.endswith(("/.", "/..")):
+        segments.append("")
+    return "/".join(segments)
+
+
+class Canonicalizer(object):
+    def __init__(self, denied_params=DEFAULT_DENIED_PARAMS, strip_www=False,
+                 cache_size=1 << 16):
+        self.denied_params = frozenset(
+            param.strip().lower() for param in denied_params)
+        self.strip_www = strip_www
+        self.canonicalize = lru_cache(maxsize=cache_size)(self._canonicalize)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.canonical_denied_params, config.canonical_strip_www,
+                   config.canonical_cache_size)
+
+    def cache_info(self):
+        return self.canonicalize.cache_info()
+
+    def _canonicalize(self, url):
+        scheme, netloc, path, query, _ = urlsplit(url.strip())
+        scheme = scheme.lower()
+        netloc = netloc.lower()
+        default_port = DEFAULT_PORTS.get(scheme)
+        if default_port and netloc.endswith(default_port):
+            netloc = netloc[:-len(default_port)]
+        netloc = netloc.rstrip(".")
+        if self.strip_www and netloc.startswith("www."):
+            netloc = netloc[4:]
+
+        path = remove_dot_segments(normalize_escapes(path))
+        if path.rsplit("/", 1)[-1] in INDEX_PAGES:
+            # Only a last segment that is the index page itself, not
+            # myindex.html.
+            path = path[:path.rfind("/") + 1]
+        path = path.rstrip("/")
+
+        if query:
+            params = [
+                normalize_escapes(param) for param in query.split("&")
+                if param and param.split("=", 1)[0].lower()
+                not in self.denied_params]
+            params.sort()
+            query = "&".join(params)
+
+        url = f"{scheme}://{netloc}{path}" if scheme else f"{netloc}{path}"
+        return f"{url}?{query}" if query else url
+
+
+_canonicalizer = Canonicalizer()
+
+
+def canonicalize(url):
+    ''' The canonical form of url, see Canonicalizer. '''
+    return _canonicalizer.canonicalize(url)
+
+
+def get_canonicalizer():
+    return _canonicalizer
+
+
+def set_canonicalizer(canonicalizer):
+    global _canonicalizer
+    _canonicalizer = canonicalizer
@@ -0,0 +1,65 @@
+import os
+import json
+import zlib
+from threading import Thread, Event
+
+from utils import get_logger
+
+
+def write_checkpoint(path, state):
+    ''' Writes state (json serialisable) compressed, replacing path atomically
+    so a crash mid-write leaves the previous checkpoint intact. '''
+    data = zlib.compress(json.dumps(state, separators=(",", ":")).encode())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_checkpoint(path):
+    ''' Returns the state written by write_checkpoint, or None. '''
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        return json.loads(zlib.decompress(file.read()))
+
+
+def remove_checkpoint(path):
+    for file_path in (path, f"{path}.tmp"):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+class Checkpointer(Thread):
+    '''
+    Background thread that writes a checkpoint every interval seconds.
+    snapshot() is called on this thread and must return a json serialisable
+    copy of the state, or None when nothing changed since the last call.
+    '''
+    def __init__(self, path, snapshot, interval):
+        self.logger = get_logger("CHECKPOINT")
+        self.path = path
+        self.snapshot = snapshot
+        self.interval = interval
+        self.stopped = Event()
+        super().__init__(daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.checkpoint()
+
+    def checkpoint(self):
+        state = self.snapshot()
+        if state is None:
+            return
+        try:
+            write_checkpoint(self.path, state)
+        except OSError as e:
+            self.logger.error(f"Could not write checkpoint {self.path}: {e}")
+
+    def stop(self):
+        ''' Stops the thread and writes a last checkpoint. '''
+        self.stopped.set()
+        self.checkpoint()
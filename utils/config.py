@@ -1,5 +1,7 @@
 import re
 
+from utils import url_filter, canonical, traps, priority, content_policy
+
 
 class Config(object):
     def __init__(self, config):
@@ -8,12 +10,168 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        self.parse_processes = config.getint(
+            "LOCAL PROPERTIES", "PARSEPROCESSES", fallback=0)
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.save_backend = config.get(
+            "LOCAL PROPERTIES", "SAVEBACKEND", fallback="sqlite")
+        self.save_batch_size = config.getint(
+            "LOCAL PROPERTIES", "SAVEBATCH", fallback=100)
+        self.save_flush_interval = config.getfloat(
+            "LOCAL PROPERTIES", "SAVEINTERVAL", fallback=5.0)
+        self.seen_file = config.get("LOCAL PROPERTIES", "SEEN", fallback="")
+        self.seen_bloom_bits = config.getint(
+            "LOCAL PROPERTIES", "SEENBLOOMBITS", fallback=0)
+        self.stats_file = config.get("LOCAL PROPERTIES", "STATS", fallback="")
+        self.stats_interval = config.getfloat(
+            "LOCAL PROPERTIES", "STATSINTERVAL", fallback=30.0)
+        self.log_level = config.get(
+            "LOCAL PROPERTIES", "LOGLEVEL", fallback="INFO")
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.downloader = config.get(
+            "CONNECTION", "DOWNLOADER", fallback="simple")
+        self.download_timeout = config.getfloat(
+            "CONNECTION", "TIMEOUT", fallback=30.0)
+        self.download_retries = config.getint(
+            "CONNECTION", "RETRIES", fallback=3)
+        self.download_backoff = config.getfloat(
+            "CONNECTION", "BACKOFF", fallback=0.5)
+        self.download_concurrency = config.getint(
+            "CONNECTION", "CONCURRENCY", fallback=8)
+        # Offline runs, see utils/replay.py and utils/stand_in_server.py.
+        self.record_file = config.get("CONNECTION", "RECORD", fallback="")
+        self.replay_file = config.get("CONNECTION", "REPLAY", fallback="")
+        self.replay_latency = config.getfloat(
+            "CONNECTION", "REPLAYLATENCY", fallback=0.0)
+        self.local_cache_server = config.get(
+            "CONNECTION", "LOCALCACHE", fallback="")
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.parser_backend = config.get(
+            "CRAWLER", "PARSER", fallback="html.parser")
+        self.top_words_capacity = config.getint(
+            "CRAWLER", "TOPWORDSCAPACITY", fallback=10000)
+        self.near_duplicate_similarity = config.getfloat(
+            "CRAWLER", "NEARDUPLICATESIMILARITY", fallback=0.9)
+
+        # Url filter rules, see utils/url_filter.py for the defaults.
+        self.allowed_domains = self._get_list(
+            config, "ALLOWEDDOMAINS", url_filter.DEFAULT_ALLOWED_DOMAINS)
+        self.denied_domains = self._get_list(
+            config, "DENIEDDOMAINS", url_filter.DEFAULT_DENIED_DOMAINS)
+        self.denied_extensions = self._get_list(
+            config, "EXTENSIONS", url_filter.DEFAULT_EXTENSIONS)
+        self.denied_query_keys = self._get_list(
+            config, "DENIEDQUERYKEYS", url_filter.DEFAULT_DENIED_QUERY_KEYS)
+        self.filter_cache_size = config.getint(
+            "FILTER", "CACHESIZE", fallback=1 << 16)
+
+        # Canonical urls, see utils/canonical.py.
+        self.canonical_denied_params = self._get_list(
+            config, "DENIEDPARAMS", canonical.DEFAULT_DENIED_PARAMS, "CANONICAL")
+        self.canonical_strip_www = config.getboolean(
+            "CANONICAL", "STRIPWWW", fallback=False)
+        self.canonical_cache_size = config.getint(
+            "CANONICAL", "CACHESIZE", fallback=1 << 16)
+
+        # Trap detection, see utils/traps.py.
+        self.trap_budget = config.getint("TRAPS", "BUDGET", fallback=50)
+        self.trap_min_yield = config.getfloat("TRAPS", "MINYIELD", fallback=5.0)
+        self.trap_min_samples = config.getint(
+            "TRAPS", "MINSAMPLES", fallback=10)
+        self.trap_max_repeats = config.getint(
+            "TRAPS", "MAXREPEATS", fallback=2)
+        self.trap_max_depth = config.getint("TRAPS", "MAXDEPTH", fallback=12)
+        self.trap_query_keys = self._get_list(
+            config, "QUERYKEYS", traps.DEFAULT_TRAP_QUERY_KEYS, "TRAPS")
+
+        # Size and type of the pages parsed, see utils/content_policy.py.
+        self.content_max_bytes = config.getint(
+            "CONTENT", "MAXBYTES", fallback=1024 * 1024)
+        self.content_html_types = self._get_list(
+            config, "HTMLTYPES", content_policy.DEFAULT_HTML_TYPES, "CONTENT")
+        self.content_strikes = config.getint("CONTENT", "STRIKES", fallback=3)
+
+        # Re-crawl, see utils/revisit.py.
+        self.recrawl_file = config.get("RECRAWL", "FILE", fallback="")
+        self.recrawl_min_interval = config.getfloat(
+            "RECRAWL", "MININTERVAL", fallback=3600.0)
+        self.recrawl_max_interval = config.getfloat(
+            "RECRAWL", "MAXINTERVAL", fallback=7 * 86400.0)
+
+        # Inverted index of the crawled pages, see utils/inverted_index.py.
+        self.index_dir = config.get("INDEX", "DIRECTORY", fallback="")
+        self.index_memory_mb = config.getint("INDEX", "MEMORYMB", fallback=64)
+
+        # Page archive, see utils/archive.py.
+        self.archive_dir = config.get("ARCHIVE", "DIRECTORY", fallback="")
+        self.archive_compression = config.get(
+            "ARCHIVE", "COMPRESSION", fallback="gzip")
+        self.archive_level = config.getint("ARCHIVE", "LEVEL", fallback=6)
+        self.archive_segment_mb = config.getint(
+            "ARCHIVE", "SEGMENTMB", fallback=256)
+
+        # Adaptive per host rate, see utils/rate_control.py. POLITENESS is
+        # the lowest delay unless MINDELAY is set.
+        self.rate_min_delay = config.getfloat(
+            "RATE", "MINDELAY", fallback=self.time_delay)
+        self.rate_max_delay = config.getfloat("RATE", "MAXDELAY", fallback=30.0)
+        self.rate_step = config.getfloat("RATE", "STEP", fallback=0.05)
+        self.rate_backoff = config.getfloat("RATE", "BACKOFF", fallback=2.0)
+        self.rate_latency_factor = config.getfloat(
+            "RATE", "LATENCYFACTOR", fallback=2.0)
+        self.rate_max_concurrency = config.getint(
+            "RATE", "MAXCONCURRENCY", fallback=1)
+        self.rate_streak = config.getint("RATE", "STREAK", fallback=10)
+
+        # Frontier order, see utils/priority.py.
+        self.priority_weights = self._get_list(
+            config, "SCORERS", priority.DEFAULT_WEIGHTS, "PRIORITY")
+
+        # Multi-node crawl, see crawler/distributed.py. One host:port per
+        # shard; no peers is a single node crawl.
+        self.shard_peers = self._get_list(config, "PEERS", (), "DISTRIBUTED")
+        self.shard_index = 0
+        self.shard_batch_size = config.getint(
+            "DISTRIBUTED", "BATCHSIZE", fallback=100)
+        self.shard_flush_interval = config.getfloat(
+            "DISTRIBUTED", "FLUSHINTERVAL", fallback=1.0)
+        self.shard_poll_interval = config.getfloat(
+            "DISTRIBUTED", "POLLINTERVAL", fallback=2.0)
+
+        # Metrics, see utils/metrics.py.
+        self.metrics_enabled = config.getboolean(
+            "METRICS", "ENABLED", fallback=False)
+        self.metrics_port = config.getint("METRICS", "PORT", fallback=0)
+        self.metrics_snapshot_file = config.get(
+            "METRICS", "SNAPSHOT", fallback="")
+        self.metrics_snapshot_interval = config.getfloat(
+            "METRICS", "SNAPSHOTINTERVAL", fallback=10.0)
+
+        self.cache_server = None
+
+    def set_shard(self, index):
+        ''' Makes this the config of shard index, with its own save files. '''
+        assert 0 <= index < len(self.shard_peers), f"No peer for shard {index}"
+        self.shard_index = index
+        self.save_file = f"{self.save_file}.shard{index}"
+        if self.seen_file:
+            self.seen_file = f"{self.seen_file}.shard{index}"
+        if self.stats_file:
+            self.stats_file = f"{self.stats_file}.shard{index}"
+        if self.index_dir:
+            self.index_dir = f"{self.index_dir}.shard{index}"
+        if self.archive_dir:
+            self.archive_dir = f"{self.archive_dir}.shard{index}"
+        if self.recrawl_file:
+            self.recrawl_file = f"{self.recrawl_file}.shard{index}"
 
-        self.cache_server = None
\ No newline at end of file
+    @staticmethod
+    def _get_list(config, option, default, section="FILTER"):
+        value = config.get(section, option, fallback=None)
+        if value is None:
+            return tuple(default)
+        return tuple(item.strip() for item in value.split(",") if item.strip())
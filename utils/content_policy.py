@@ -0,0 +1,120 @@
+from threading import Lock
+
+from utils.response import Response
+from utils.traps import url_template
+
+"""
+Early rejection of pages that are too large or are not html. The downloader
+streams the cache server's answer and stops reading once it is larger than
+the page limit (plus room for the headers it carries), and the scraper checks
+the Content-Type of the page before parsing it. Both report their verdict
+here, by url template (see utils/traps.py), and a template that has been
+rejected STRIKES times without ever giving an html page of the right size is
+not downloaded any more.
+"""
+
+# Status of a Response whose download was stopped because it was too large,
+# the cache server's own status for content that is too big.
+TOO_LARGE_STATUS = 607
+
+# Bytes of the cache server's answer that are not the page itself: the cbor
+# envelope and the pickled response with its headers.
+PAYLOAD_OVERHEAD = 64 * 1024
+
+DEFAULT_HTML_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+
+class TemplateVerdicts(object):
+    __slots__ = ("accepted", "rejected", "reasons")
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.reasons = dict()
+
+
+class ContentPolicy(object):
+    def __init__(self, max_bytes=1024 * 1024, html_types=DEFAULT_HTML_TYPES,
+                 strikes=3):
+        self.max_bytes = max_bytes
+        self.html_types = frozenset(
+            content_type.strip().lower() for content_type in html_types)
+        # 0 never skips a template.
+        self.strikes = strikes
+        self.templates = dict()
+        self.lock = Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(max_bytes=config.content_max_bytes,
+                   html_types=config.content_html_types,
+                   strikes=config.content_strikes)
+
+    @property
+    def max_payload_bytes(self):
+        ''' Largest answer of the cache server read to the end. '''
+        return self.max_bytes + PAYLOAD_OVERHEAD
+
+    def is_html(self, content_type):
+        ''' Whether a page with this Content-Type header is parsed. Pages
+        without one are. '''
+        if not content_type:
+            return True
+        return content_type.split(";", 1)[0].strip().lower() in self.html_types
+
+    def record(self, url, reason=None):
+        ''' Records that url was rejected for reason, or accepted for None. '''
+        template = url_template(url)
+        with self.lock:
+            verdicts = self.templates.get(template)
+            if verdicts is None:
+                verdicts = self.templates[template] = TemplateVerdicts()
+            if reason is None:
+                verdicts.accepted += 1
+            else:
+                verdicts.rejected += 1
+                verdicts.reasons[reason] = verdicts.reasons.get(reason, 0) + 1
+
+    def rejects(self, url):
+        ''' Whether urls like url only ever gave pages that were rejected. '''
+        if not self.strikes:
+            return False
+        with self.lock:
+            verdicts = self.templates.get(url_template(url))
+            return (verdicts is not None and not verdicts.accepted
+                    and verdicts.rejected >= self.strikes)
+
+    def summary(self, top=20):
+        with self.lock:
+            rejected = sorted(
+                ((template, verdicts.reasons)
+                 for template, verdicts in self.templates.items()
+                 if verdicts.rejected),
+                key=lambda item: -sum(item[1].values()))
+        return {
+            "rejected_templates": len(rejected),
+            "top_rejected_templates": rejected[:top]
+        }
+
+
+_content_policy = ContentPolicy()
+
+
+def too_large_response(url, logger=None):
+    ''' The Response of a download stopped because it was too large. '''
+    get_content_policy().record(url, "too_large")
+    if logger:
+        logger.info(f"Stopped download of {url}, it is too large.")
+    return Response({
+        "error": f"Download of {url} stopped, it is too large.",
+        "status": TOO_LARGE_STATUS,
+        "url": url})
+
+
+def get_content_policy():
+    return _content_policy
+
+
+def set_content_policy(content_policy):
+    global _content_policy
+    _content_policy = content_policy
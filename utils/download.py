@@ -1,21 +1,129 @@
 import requests
-import cbor
-import time
+
+from threading import Lock, BoundedSemaphore
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from utils.response import Response
+from utils.replay import get_recording, replay_download
+from utils.content_policy import get_content_policy, too_large_response
+from utils.revisit import get_revisit_store
+
+# Status of a Response when the cache server could not be reached at all.
+NO_RESPONSE_STATUS = 0
 
 def download(url, config, logger=None):
+    if config.replay_file:
+        return replay_download(url, config, logger)
     host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    with requests.get(
+            f"http://{host}:{port}/",
+            params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+            headers=_validators(url), stream=True) as resp:
+        payload = _read_payload(resp)
+    return _to_response(resp, payload, url, config, logger)
+
+
+def _validators(url):
+    ''' Conditional request headers for a page fetched before, see
+    utils/revisit.py. '''
+    revisits = get_revisit_store()
+    return revisits.validators(url) if revisits is not None else None
+
+
+def _read_payload(resp):
+    ''' The body of the streamed resp, or None as soon as it is known to be
+    larger than the content policy allows. The rest is never read. '''
+    limit = get_content_policy().max_payload_bytes
+    length = resp.headers.get("Content-Length", "")
+    if length.isdigit() and int(length) > limit:
+        return None
+    chunks = list()
+    size = 0
+    for chunk in resp.iter_content(64 * 1024):
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _to_response(resp, payload, url, config, logger):
+    if payload is None:
+        return too_large_response(url, logger)
     try:
-        if resp and resp.content:
-            return Response(cbor.loads(resp.content))
-    except (EOFError, ValueError) as e:
+        if resp and payload:
+            response = Response.from_payload(payload)
+            if config.record_file:
+                get_recording(config.record_file).record(url, payload)
+            return response
+    except (EOFError, ValueError):
         pass
-    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    if logger:
+        logger.error(f"Spacetime Response error {resp} with url {url}.")
     return Response({
         "error": f"Spacetime Response error {resp} with url {url}.",
         "status": resp.status_code,
         "url": url})
+
+
+_limits_lock = Lock()
+_limits = dict()
+
+
+def _get_limit(cache_server, concurrency):
+    # One semaphore per cache server, shared by every session using it.
+    with _limits_lock:
+        if cache_server not in _limits:
+            _limits[cache_server] = BoundedSemaphore(concurrency)
+        return _limits[cache_server]
+
+
+class DownloadSession(object):
+    '''
+    Downloads through a requests.Session that keeps its connections to the
+    cache server alive, with connect/read timeouts, bounded retries with
+    exponential backoff, and at most config.download_concurrency requests in
+    flight to the cache server across all sessions. A session is not thread
+    safe; give each worker its own.
+    '''
+    def __init__(self, config, logger=None):
+        self.config = config
+        self.logger = logger
+        self.session = requests.Session()
+        retries = Retry(
+            total=config.download_retries,
+            backoff_factor=config.download_backoff,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=1, max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.timeout = config.download_timeout
+        self.limit = _get_limit(
+            tuple(config.cache_server), config.download_concurrency)
+
+    def download(self, url):
+        if self.config.replay_file:
+            return replay_download(url, self.config, self.logger)
+        host, port = self.config.cache_server
+        try:
+            # Streamed, so oversized answers are dropped unread.
+            with self.limit, self.session.get(
+                    f"http://{host}:{port}/",
+                    params=[("q", f"{url}"), ("u", f"{self.config.user_agent}")],
+                    headers=_validators(url), timeout=self.timeout,
+                    stream=True) as resp:
+                payload = _read_payload(resp)
+        except requests.RequestException as e:
+            if self.logger:
+                self.logger.error(f"Download of {url} failed: {e}")
+            return Response({
+                "error": f"Download of {url} failed: {e}",
+                "status": NO_RESPONSE_STATUS,
+                "url": url})
+        return _to_response(resp, payload, url, self.config, self.logger)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,113 @@
+from bisect import bisect_left, insort
+
+
+class SpaceSaving(object):
+    '''
+    Space-Saving heavy hitters (Metwally et al.) with a stream summary.
+    At most capacity items are counted. When a new item arrives and the
+    table is full, the item with the smallest count is replaced, and the
+    newcomer inherits that count as its possible overestimate. Any
+    item with a true count above total / capacity is guaranteed to be kept,
+    and every count is at most total / capacity too high.
+
+    Items are grouped in buckets by count and the distinct counts are kept
+    sorted, so the minimum is found in O(1) and top(k) walks the buckets from
+    the largest count down, stopping as soon as it has k items.
+    '''
+    def __init__(self, capacity=10000):
+        self.capacity = max(1, capacity)
+        self.counts = dict()
+        self.errors = dict()
+        self.buckets = dict()
+        self.sorted_counts = list()
+        self.total = 0
+
+    @classmethod
+    def for_error(cls, epsilon):
+        ''' A counter whose counts are at most epsilon * total too high. '''
+        return cls(int(1 / epsilon + 0.5))
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, item):
+        return item in self.counts
+
+    def _remove_from_bucket(self, item, count):
+        bucket = self.buckets[count]
+        bucket.discard(item)
+        if not bucket:
+            del self.buckets[count]
+            del self.sorted_counts[bisect_left(self.sorted_counts, count)]
+
+    def _add_to_bucket(self, item, count):
+        bucket = self.buckets.get(count)
+        if bucket is None:
+            bucket = self.buckets[count] = set()
+            insort(self.sorted_counts, count)
+        bucket.add(item)
+
+    def update(self, item, weight=1):
+        self.total += weight
+        count = self.counts.get(item)
+        if count is not None:
+            self._remove_from_bucket(item, count)
+        elif len(self.counts) < self.capacity:
+            count = 0
+            self.errors[item] = 0
+        else:
+            count = self.sorted_counts[0]
+            victim = next(iter(self.buckets[count]))
+            self._remove_from_bucket(victim, count)
+            del self.counts[victim]
+            del self.errors[victim]
+            self.errors[item] = count
+        self.counts[item] = count + weight
+        self._add_to_bucket(item, count + weight)
+
+    def update_many(self, frequencies):
+        for item, weight in frequencies.items():
+            self.update(item, weight)
+
+    def get(self, item):
+        ''' (estimated count, maximum overestimate), or (0, max_error()). '''
+        if item in self.counts:
+            return self.counts[item], self.errors[item]
+        return 0, self.max_error()
+
+    def max_error(self):
+        if len(self.counts) < self.capacity:
+            return 0
+        return self.sorted_counts[0] if self.sorted_counts else 0
+
+    def top(self, k):
+        ''' The k items with the largest counts, largest first. '''
+        items = []
+        for count in reversed(self.sorted_counts):
+            # Sort within a bucket so ties come out the same every time.
+            items.extend(sorted(self.buckets[count]))
+            if len(items) >= k:
+                break
+        return items[:k]
+
+    def to_state(self):
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "items": [[item, count, self.errors[item]]
+                      for item, count in self.counts.items()]
+        }
+
+    @classmethod
+    def from_state(cls, state, capacity=None):
+        counter = cls(capacity or state["capacity"])
+        # Largest first, so a smaller capacity keeps the heaviest items.
+        for item, count, error in sorted(
+                state["items"], key=lambda entry: -entry[1]):
+            if len(counter.counts) >= counter.capacity:
+                break
+            counter.counts[item] = count
+            counter.errors[item] = error
+            counter._add_to_bucket(item, count)
+        counter.total = state["total"]
+        return counter
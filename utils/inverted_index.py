@@ -0,0 +1,372 @@
+import os
+import sys
+import math
+import mmap
+import heapq
+from threading import Lock
+
+from tokenize_functions import tokenize
+
+"""
+Inverted index of the crawled pages, built while crawling.
+
+Every page gets a doc id, its line in the urls file. Postings of a term are
+(doc id, term frequency) pairs in doc id order, stored as varints with the
+doc ids delta encoded, so most postings take two or three bytes.
+
+Postings are collected in memory and written out as a sorted partial run
+(run-<n>) whenever they grow past the memory cap. close() merges all runs
+into the final index.run with a k-way merge, plus index.terms, the term
+dictionary. A run record is
+
+    varint term length, term, varint document frequency, varint last doc id,
+    varint postings length, postings
+
+and the final index is a run itself, so a resumed crawl merges it again with
+its new runs.
+
+A page indexed again, e.g. a revisit that found new content, gets a new doc
+id. Its old doc id is appended to the deleted file, and its postings are
+dropped when the runs are merged.
+"""
+
+URLS_FILE = "urls"
+INDEX_RUN = "index.run"
+TERMS_FILE = "index.terms"
+DELETED_FILE = "deleted"
+RUN_PREFIX = "run-"
+
+# Rough memory of a term in the in-memory postings: dict entry, key, buffer.
+TERM_OVERHEAD = 150
+
+
+def encode_varint(value, out):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, offset):
+    ''' (value, offset after it) '''
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def decode_postings(data):
+    ''' [(doc id, term frequency)] of encoded postings. '''
+    postings = []
+    doc_id = offset = 0
+    while offset < len(data):
+        delta, offset = decode_varint(data, offset)
+        frequency, offset = decode_varint(data, offset)
+        doc_id += delta
+        postings.append((doc_id, frequency))
+    return postings
+
+
+def drop_deleted(postings, deleted):
+    ''' (postings, document frequency, last doc id) of encoded postings
+    without the doc ids in deleted. '''
+    kept = bytearray()
+    document_frequency = last_doc = 0
+    for doc_id, frequency in decode_postings(postings):
+        if doc_id in deleted:
+            continue
+        encode_varint(doc_id - last_doc, kept)
+        encode_varint(frequency, kept)
+        document_frequency += 1
+        last_doc = doc_id
+    return kept, document_frequency, last_doc
+
+
+def read_deleted(directory):
+    ''' The doc ids replaced by a later document. '''
+    path = os.path.join(directory, DELETED_FILE)
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as file:
+        return {int(line) for line in file if line.strip()}
+
+
+def read_run(path):
+    ''' Yields (term, document frequency, last doc id, postings) in term
+    order. The run is memory-mapped, not read into memory. '''
+    if not os.path.getsize(path):
+        return
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    offset = 0
+    while offset < len(data):
+        length, offset = decode_varint(data, offset)
+        term = data[offset:offset + length].decode("utf-8")
+        offset += length
+        document_frequency, offset = decode_varint(data, offset)
+        last_doc, offset = decode_varint(data, offset)
+        length, offset = decode_varint(data, offset)
+        yield term, document_frequency, last_doc, data[offset:offset + length]
+        offset += length
+
+
+def write_record(file, term, document_frequency, last_doc, postings):
+    ''' Writes a run record, returns the offset of its postings from the
+    start of the record. '''
+    encoded_term = term.encode("utf-8")
+    header = bytearray()
+    encode_varint(len(encoded_term), header)
+    header += encoded_term
+    encode_varint(document_frequency, header)
+    encode_varint(last_doc, header)
+    encode_varint(len(postings), header)
+    file.write(header)
+    file.write(postings)
+    return len(header)
+
+
+class IndexWriter(object):
+    '''
+    Adds pages to the index in directory. Thread safe. Postings are kept in
+    memory up to about memory_cap bytes, then written as a partial run.
+    '''
+    def __init__(self, directory, restart=False, memory_cap=64 << 20):
+        self.directory = directory
+        self.memory_cap = memory_cap
+        os.makedirs(directory, exist_ok=True)
+        if restart:
+            for name in os.listdir(directory):
+                if (name in (URLS_FILE, INDEX_RUN, TERMS_FILE, DELETED_FILE)
+                        or name.startswith(RUN_PREFIX)):
+                    os.remove(os.path.join(directory, name))
+        self.urls_file = open(
+            os.path.join(directory, URLS_FILE), "a+", encoding="utf-8")
+        self.urls_file.seek(0)
+        # url -> doc id of its latest document
+        self.doc_ids = dict()
+        self.doc_count = 0
+        for line in self.urls_file:
+            self.doc_ids[line.rstrip("\n")] = self.doc_count
+            self.doc_count += 1
+        self.deleted = read_deleted(directory)
+        self.deleted_file = open(
+            os.path.join(directory, DELETED_FILE), "a", encoding="utf-8")
+        self.runs = sorted(
+            name for name in os.listdir(directory) if name.startswith(RUN_PREFIX))
+        # term -> [postings, document frequency, last doc id]
+        self.postings = dict()
+        self.memory = 0
+        self.lock = Lock()
+        self.closed = False
+
+    def add_document(self, url, word_frequencies):
+        ''' Indexes a page, given its word frequencies, in place of any
+        earlier document of the same url. Returns its doc id. '''
+        url = url.replace("\n", " ")
+        with self.lock:
+            doc_id = self.doc_count
+            self.doc_count += 1
+            self.urls_file.write(url + "\n")
+            replaced = self.doc_ids.get(url)
+            if replaced is not None:
+                self.deleted.add(replaced)
+                self.deleted_file.write(f"{replaced}\n")
+                self.deleted_file.flush()
+            self.doc_ids[url] = doc_id
+            for term, frequency in word_frequencies.items():
+                entry = self.postings.get(term)
+                if entry is None:
+                    entry = self.postings[term] = [bytearray(), 0, 0]
+                    self.memory += TERM_OVERHEAD + len(term)
+                    delta = doc_id
+                else:
+                    delta = doc_id - entry[2]
+                postings = entry[0]
+                size = len(postings)
+                encode_varint(delta, postings)
+                encode_varint(frequency, postings)
+                self.memory += len(postings) - size
+                entry[1] += 1
+                entry[2] = doc_id
+            if self.memory >= self.memory_cap:
+                self._flush()
+            return doc_id
+
+    def _flush(self):
+        # Caller holds self.lock.
+        if not self.postings:
+            return
+        self.urls_file.flush()
+        name = f"{RUN_PREFIX}{len(self.runs):05d}"
+        tmp_path = os.path.join(self.directory, f"{name}.tmp")
+        with open(tmp_path, "wb") as file:
+            for term in sorted(self.postings):
+                postings, document_frequency, last_doc = self.postings[term]
+                write_record(file, term, document_frequency, last_doc, postings)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+        self.runs.append(name)
+        self.postings = dict()
+        self.memory = 0
+
+    def close(self):
+        ''' Writes the last run and merges every run into the final index. '''
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._flush()
+            self.urls_file.close()
+            self.deleted_file.close()
+            runs = [os.path.join(self.directory, name) for name in self.runs]
+            final_path = os.path.join(self.directory, INDEX_RUN)
+            if os.path.exists(final_path):
+                # The index of the crawl this one resumed, older than any run.
+                runs.insert(0, final_path)
+            merge_runs(runs, self.directory, self.deleted)
+            for name in self.runs:
+                os.remove(os.path.join(self.directory, name))
+            self.runs = []
+
+
+def merge_runs(paths, directory, deleted=frozenset()):
+    '''
+    K-way merge of the runs at paths, oldest first, into index.run and
+    index.terms in directory, without the postings of the doc ids in
+    deleted. The postings of a term in a later run all have higher doc ids,
+    so they are appended after rebasing their first delta on the last doc
+    id written.
+    '''
+    # Runs are ordered by term, then by age, so postings stay in doc order.
+    merged = heapq.merge(*(
+        _aged_records(path, age) for age, path in enumerate(paths)))
+    run_path = os.path.join(directory, f"{INDEX_RUN}.tmp")
+    terms_path = os.path.join(directory, f"{TERMS_FILE}.tmp")
+    with open(run_path, "wb") as run_file, open(terms_path, "wb") as terms_file:
+        current = None
+        for term, _, document_frequency, last_doc, postings in merged:
+            if deleted:
+                postings, document_frequency, last_doc = drop_deleted(
+                    postings, deleted)
+                if not document_frequency:
+                    continue
+            if term != current:
+                if current is not None:
+                    _write_term(run_file, terms_file, current, *entry)
+                current = term
+                entry = [bytearray(postings), document_frequency, last_doc]
+                continue
+            first_doc, offset = decode_varint(postings, 0)
+            encode_varint(first_doc - entry[2], entry[0])
+            entry[0] += postings[offset:]
+            entry[1] += document_frequency
+            entry[2] = last_doc
+        if current is not None:
+            _write_term(run_file, terms_file, current, *entry)
+    os.replace(run_path, os.path.join(directory, INDEX_RUN))
+    os.replace(terms_path, os.path.join(directory, TERMS_FILE))
+
+
+def _aged_records(path, age):
+    for term, document_frequency, last_doc, postings in read_run(path):
+        yield term, age, document_frequency, last_doc, postings
+
+
+def _write_term(run_file, terms_file, term, postings, document_frequency,
+                last_doc):
+    offset = run_file.tell()
+    offset += write_record(run_file, term, document_frequency, last_doc, postings)
+    # Term dictionary: term, document frequency, postings offset and length.
+    encoded_term = term.encode("utf-8")
+    record = bytearray()
+    encode_varint(len(encoded_term), record)
+    record += encoded_term
+    encode_varint(document_frequency, record)
+    encode_varint(offset, record)
+    encode_varint(len(postings), record)
+    terms_file.write(record)
+
+
+class InvertedIndex(object):
+    ''' Read only view of a merged index, for queries. '''
+    def __init__(self, directory):
+        with open(os.path.join(directory, URLS_FILE), encoding="utf-8") as file:
+            self.urls = [line.rstrip("\n") for line in file]
+        self.deleted = read_deleted(directory)
+        self.terms = dict()
+        with open(os.path.join(directory, TERMS_FILE), "rb") as file:
+            data = file.read()
+        offset = 0
+        while offset < len(data):
+            length, offset = decode_varint(data, offset)
+            term = data[offset:offset + length].decode("utf-8")
+            offset += length
+            document_frequency, offset = decode_varint(data, offset)
+            postings_offset, offset = decode_varint(data, offset)
+            postings_length, offset = decode_varint(data, offset)
+            self.terms[term] = (
+                document_frequency, postings_offset, postings_length)
+        self.file = open(os.path.join(directory, INDEX_RUN), "rb")
+        self.lock = Lock()
+
+    def __len__(self):
+        ''' Documents in the index, without the replaced ones. '''
+        return len(self.urls) - len(self.deleted)
+
+    def document_frequency(self, term):
+        entry = self.terms.get(term)
+        return entry[0] if entry else 0
+
+    def postings(self, term):
+        ''' [(doc id, term frequency)] of term, in doc id order. '''
+        entry = self.terms.get(term)
+        if entry is None:
+            return []
+        _, offset, length = entry
+        with self.lock:
+            self.file.seek(offset)
+            data = self.file.read(length)
+        return decode_postings(data)
+
+    def search(self, query, k=10):
+        '''
+        The k best pages for query, as [(url, score)]. Pages are scored with
+        tf-idf summed over the query terms; a page needs one of them.
+        '''
+        scores = dict()
+        for term in set(tokenize(query)):
+            postings = self.postings(term)
+            if not postings:
+                continue
+            idf = math.log(len(self) / len(postings))
+            for doc_id, frequency in postings:
+                scores[doc_id] = (
+                    scores.get(doc_id, 0) + (1 + math.log(frequency)) * idf)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.urls[doc_id], score) for doc_id, score in best]
+
+    def close(self):
+        self.file.close()
+
+
+_index_writer = None
+
+
+def get_index_writer():
+    return _index_writer
+
+
+def set_index_writer(index_writer):
+    ''' index_writer can be None to turn indexing off. '''
+    global _index_writer
+    _index_writer = index_writer
+
+
+if __name__ == "__main__":
+    # python -m utils.inverted_index <index directory> <query>
+    index = InvertedIndex(sys.argv[1])
+    for url, score in index.search(" ".join(sys.argv[2:])):
+        print(f"{score:8.3f}  {url}")
@@ -0,0 +1,152 @@
+import os
+import sys
+import atexit
+import logging
+from queue import SimpleQueue, Empty
+from threading import Thread, Lock
+
+"""
+Asynchronous logging. The loggers made by utils.get_logger (and the root
+logger set up in scraper.py) only put their records on a queue. One LogWriter
+thread formats them and writes them to the log files and the terminal, in
+batches, flushing each file once per batch instead of once per record.
+"""
+
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_STOP = object()
+
+
+class _BatchedMixin(object):
+    ''' Leaves flushing to the LogWriter, which flushes once per batch. '''
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchedFileHandler(_BatchedMixin, logging.FileHandler):
+    pass
+
+
+class BatchedStreamHandler(_BatchedMixin, logging.StreamHandler):
+    pass
+
+
+class QueueingHandler(logging.Handler):
+    ''' Hands records over to writer, for the handlers in targets. '''
+    def __init__(self, writer, targets):
+        super().__init__()
+        self.writer = writer
+        self.targets = tuple(targets)
+
+    def prepare(self, record):
+        # Merge the arguments into the message now, they may change before
+        # the writer gets to the record. Formatting is left to the writer.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.writer.put(self.targets, self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class LogWriter(Thread):
+    ''' Writes queued records to their handlers, up to batch_size at a time.
+    Before start() and after stop(), records are written on the calling
+    thread instead. '''
+    def __init__(self, batch_size=512):
+        self.batch_size = batch_size
+        self.queue = SimpleQueue()
+        self.lock = Lock()
+        self.handlers = dict()
+        # Guards running and the queueing of records, so no record is
+        # queued after _STOP.
+        self.running_lock = Lock()
+        self.running = False
+        super().__init__(daemon=True)
+        # A forked process (the parse pool) has no writer thread.
+        os.register_at_fork(after_in_child=self._stop_in_child)
+
+    def _stop_in_child(self):
+        self.running_lock = Lock()
+        self.running = False
+
+    def get_handler(self, path=None, format=FORMAT, level=logging.DEBUG):
+        ''' The one handler writing to path (or to stderr if path is None)
+        with this format and level. '''
+        key = (path, format, level)
+        with self.lock:
+            if key not in self.handlers:
+                handler = (
+                    BatchedFileHandler(path) if path
+                    else BatchedStreamHandler(sys.stderr))
+                handler.setLevel(level)
+                handler.setFormatter(logging.Formatter(format))
+                self.handlers[key] = handler
+            return self.handlers[key]
+
+    def start(self):
+        with self.running_lock:
+            self.running = True
+        super().start()
+
+    def put(self, targets, record):
+        with self.running_lock:
+            if self.running:
+                self.queue.put((targets, record))
+                return
+        self._write([(targets, record)])
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            stopped = _STOP in batch
+            self._write([item for item in batch if item is not _STOP])
+            if stopped:
+                break
+
+    def _write(self, batch):
+        written = set()
+        with self.lock:
+            for targets, record in batch:
+                for handler in targets:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+                        written.add(handler)
+            for handler in written:
+                handler.flush_batch()
+
+    def stop(self):
+        ''' Writes out the queued records and stops the thread. '''
+        with self.running_lock:
+            if not self.running:
+                return
+            self.running = False
+            self.queue.put(_STOP)
+        self.join()
+
+
+_writer_lock = Lock()
+_writer = None
+
+
+def get_log_writer():
+    ''' The LogWriter of this process, started on first use. '''
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter()
+            _writer.start()
+            atexit.register(_writer.stop)
+        return _writer
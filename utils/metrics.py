@@ -0,0 +1,241 @@
+import os
+import json
+import time
+from threading import Lock, Thread, Event
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+"""
+Crawler metrics: counters and latency histograms, exposed in the Prometheus
+text format on a local HTTP endpoint (/metrics, or /metrics.json) and/or
+written as a periodic JSON snapshot.
+
+Call sites get their metric objects once, e.g.
+    downloads = get_metrics().histogram("crawler_stage_seconds", stage="download")
+and then use them on the hot path:
+    with downloads.time():
+        ...
+Metrics are off unless enabled in config.ini. While they are off,
+get_metrics() returns a NullRegistry whose metrics do nothing.
+"""
+
+# Upper bounds of the latency buckets, in seconds.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter(object):
+    def __init__(self):
+        self.value = 0
+        self.lock = Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class _Timer(object):
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = Lock()
+
+    def observe(self, value):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self, name, labels):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            samples.append(
+                (f"{name}_bucket", labels + (("le", bound),), cumulative))
+        samples.append((f"{name}_sum", labels, self.sum))
+        samples.append((f"{name}_count", labels, self.count))
+        return samples
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self.lock = Lock()
+        self.metrics = dict()
+        self.collectors = list()
+
+    def _get(self, name, labels, factory):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.metrics:
+                self.metrics[key] = factory()
+            return self.metrics[key]
+
+    def counter(self, name, **labels):
+        return self._get(name, labels, Counter)
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS, **labels):
+        return self._get(name, labels, lambda: Histogram(buckets))
+
+    def register_collector(self, collector):
+        ''' collector() is called on every read and returns a list of
+        (name, {labels}, value), for values such as queue lengths that are
+        cheaper to read on demand than to keep up to date. '''
+        with self.lock:
+            self.collectors.append(collector)
+
+    def samples(self):
+        with self.lock:
+            metrics = list(self.metrics.items())
+            collectors = list(self.collectors)
+        samples = []
+        for (name, labels), metric in sorted(metrics, key=lambda item: item[0]):
+            samples.extend(metric.samples(name, labels))
+        for collector in collectors:
+            for name, labels, value in collector():
+                samples.append((name, tuple(sorted(labels.items())), value))
+        return samples
+
+    def render_prometheus(self):
+        return "".join(
+            f"{name}{_label_text(labels)} {value}\n"
+            for name, labels, value in self.samples())
+
+    def snapshot(self):
+        return {
+            "time": time.time(),
+            "samples": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for name, labels, value in self.samples()]
+        }
+
+
+class _NullMetric(object):
+    ''' Stands in for every metric when metrics are off. '''
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_METRIC = _NullMetric()
+
+
+class NullRegistry(object):
+    def counter(self, name, **labels):
+        return _NULL_METRIC
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS, **labels):
+        return _NULL_METRIC
+
+    def register_collector(self, collector):
+        pass
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = self.server.registry.render_prometheus().encode()
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = json.dumps(self.server.registry.snapshot()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(registry, port, host="127.0.0.1"):
+    ''' Serves registry on http://host:port/metrics from a daemon thread. '''
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class SnapshotWriter(Thread):
+    ''' Writes registry.snapshot() as JSON to path every interval seconds. '''
+    def __init__(self, registry, path, interval):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.stopped = Event()
+        super().__init__(daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.registry.snapshot(), file)
+        os.replace(tmp_path, self.path)
+
+    def stop(self):
+        self.stopped.set()
+        self.write()
+
+
+_metrics = NullRegistry()
+
+
+def get_metrics():
+    return _metrics
+
+
+def set_metrics(registry):
+    global _metrics
+    _metrics = registry
@@ -0,0 +1,144 @@
+import math
+from threading import Lock
+from urllib.parse import urlparse
+
+from utils.traps import url_template
+
+"""
+Frontier priorities. Every url gets a cost when it is added to the frontier,
+and the frontier downloads the cheapest url first. The cost is the weighted
+sum of a few scorers, each looking at the url and at the page it was found
+on (its depth from the seeds and its unique word ratio):
+
+    depth        one per link followed from a seed, so the crawl is breadth
+                 first
+    host         how many urls of the same host were added before, so small
+                 hosts are not starved by one large one
+    novelty      log2 of how many urls of the same template (see
+                 utils/traps.py) were added before, so the first page of a
+                 calendar or a listing comes before its thousandth
+    information  one minus the unique word ratio of the parent page, so links
+                 from pages with more information come first
+
+More scorers can be added to SCORERS and turned on in the [PRIORITY] section
+of config.ini.
+"""
+
+
+class ParentPage(object):
+    __slots__ = ("depth", "information")
+
+    def __init__(self, depth=0, information=1.0):
+        self.depth = depth
+        # Unique word ratio of the page, 1 while it is not known.
+        self.information = information
+
+
+SEED = ParentPage(depth=-1)
+
+
+class DepthScorer(object):
+    def score(self, url, parent):
+        return parent.depth + 1
+
+
+class HostFairnessScorer(object):
+    def __init__(self):
+        self.counts = dict()
+        self.lock = Lock()
+
+    def score(self, url, parent):
+        host = urlparse(url).hostname or ""
+        with self.lock:
+            count = self.counts.get(host, 0)
+            self.counts[host] = count + 1
+        return count
+
+
+class NoveltyScorer(object):
+    def __init__(self):
+        self.counts = dict()
+        self.lock = Lock()
+
+    def score(self, url, parent):
+        template = url_template(url)
+        with self.lock:
+            count = self.counts.get(template, 0)
+            self.counts[template] = count + 1
+        return math.log2(1 + count)
+
+
+class InformationScorer(object):
+    def score(self, url, parent):
+        return 1.0 - parent.information
+
+
+SCORERS = {
+    "depth": DepthScorer,
+    "host": HostFairnessScorer,
+    "novelty": NoveltyScorer,
+    "information": InformationScorer
+}
+
+DEFAULT_WEIGHTS = (
+    "depth:1", "host:0.01", "novelty:0.5", "information:2")
+
+
+class UrlPriority(object):
+    def __init__(self, weights=None):
+        '''
+        :param weights: dict of scorer name (see SCORERS) to its weight.
+            Scorers that are left out, or have weight 0, are not run. With
+            no scorers every url costs 0 and each host is crawled in the
+            order its urls were found.
+        '''
+        self.scorers = [
+            (SCORERS[name](), weight)
+            for name, weight in (weights or dict()).items() if weight]
+        # Unique word ratio of the pages scraped and not yet marked complete.
+        self.information = dict()
+        self.lock = Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        weights = dict()
+        for item in config.priority_weights:
+            name, _, weight = item.partition(":")
+            name = name.strip().lower()
+            if name not in SCORERS:
+                raise ValueError(f"Unknown priority scorer {name!r}")
+            weights[name] = float(weight or 1)
+        return cls(weights)
+
+    def record_page(self, url, information):
+        ''' Called by the scraper with the unique word ratio of url, before
+        its links are added to the frontier. '''
+        with self.lock:
+            self.information[url] = information
+
+    def parent_page(self, url, depth):
+        ''' The ParentPage of the links found on url. '''
+        with self.lock:
+            return ParentPage(depth, self.information.get(url, 1.0))
+
+    def forget(self, url):
+        ''' Called by the frontier once url is complete. '''
+        with self.lock:
+            self.information.pop(url, None)
+
+    def score(self, url, parent=SEED):
+        return sum(
+            weight * scorer.score(url, parent)
+            for scorer, weight in self.scorers)
+
+
+_url_priority = UrlPriority()
+
+
+def get_url_priority():
+    return _url_priority
+
+
+def set_url_priority(url_priority):
+    global _url_priority
+    _url_priority = url_priority
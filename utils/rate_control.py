@@ -0,0 +1,144 @@
+from threading import Lock
+
+from utils.download import NO_RESPONSE_STATUS
+from utils.content_policy import TOO_LARGE_STATUS
+
+"""
+Per host rate control. Every download is recorded with its response time and
+outcome, and each host gets its own delay between downloads and number of
+downloads in flight, adjusted AIMD style:
+
+- a download that failed (no answer, a timeout, 429, 5xx or one of the
+  cache server's own errors, 600-606) multiplies the delay of its host by
+  backoff and halves its concurrency,
+- a download that succeeded takes step seconds off the delay, and after
+  streak successes in a row at the lowest delay, allows one more download in
+  flight.
+
+The delay never goes below min_delay, nor below latency_factor times the
+average response time of the host, so slow hosts are asked less often; and
+never above max_delay. Concurrency stays between 1 and max_concurrency.
+"""
+
+# Errors of the cache server (see README.md). 607 is the crawler's own, for a
+# page it stopped reading.
+CACHE_ERROR_STATUSES = range(600, TOO_LARGE_STATUS)
+
+
+def is_failure(resp):
+    ''' Whether resp is a sign that its host, or the way to it, is
+    overloaded. '''
+    status = resp.status
+    if status == NO_RESPONSE_STATUS or status == 429:
+        return True
+    return 500 <= status <= 599 or status in CACHE_ERROR_STATUSES
+
+
+class HostRate(object):
+    def __init__(self, delay):
+        self.delay = delay
+        self.concurrency = 1
+        # Moving average of the response time, None before the first one.
+        self.latency = None
+        self.streak = 0
+        self.downloads = 0
+        self.failures = 0
+
+
+class RateController(object):
+    def __init__(self, min_delay=0.5, max_delay=30.0, step=0.05, backoff=2.0,
+                 latency_factor=2.0, max_concurrency=1, streak=10,
+                 smoothing=0.2):
+        self.min_delay = min_delay
+        self.max_delay = max(min_delay, max_delay)
+        self.step = step
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+        self.max_concurrency = max(1, max_concurrency)
+        self.streak = streak
+        self.smoothing = smoothing
+        self.hosts = dict()
+        self.lock = Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.rate_min_delay, config.rate_max_delay,
+                   config.rate_step, config.rate_backoff,
+                   config.rate_latency_factor, config.rate_max_concurrency,
+                   config.rate_streak)
+
+    def _host(self, host):
+        # Caller holds self.lock.
+        rate = self.hosts.get(host)
+        if rate is None:
+            rate = self.hosts[host] = HostRate(self.min_delay)
+        return rate
+
+    def delay(self, host):
+        ''' Seconds to wait between two downloads from host. '''
+        with self.lock:
+            rate = self.hosts.get(host)
+            return rate.delay if rate is not None else self.min_delay
+
+    def concurrency(self, host):
+        ''' Downloads from host that may be in flight at once. '''
+        with self.lock:
+            rate = self.hosts.get(host)
+            return rate.concurrency if rate is not None else 1
+
+    def record(self, host, resp, elapsed):
+        ''' Adjusts the rate of host after a download of elapsed seconds
+        that got resp. '''
+        if resp.status == TOO_LARGE_STATUS:
+            # Stopped by the crawler, says nothing about the host.
+            return
+        with self.lock:
+            rate = self._host(host)
+            rate.downloads += 1
+            if rate.latency is None:
+                rate.latency = elapsed
+            else:
+                rate.latency += self.smoothing * (elapsed - rate.latency)
+            lowest = min(self.max_delay, max(
+                self.min_delay, self.latency_factor * rate.latency))
+            if is_failure(resp):
+                rate.failures += 1
+                rate.streak = 0
+                rate.delay = min(
+                    self.max_delay, max(lowest, rate.delay * self.backoff))
+                rate.concurrency = max(1, rate.concurrency // 2)
+                return
+            rate.delay = max(lowest, rate.delay - self.step)
+            rate.streak += 1
+            if rate.delay == lowest and rate.streak >= self.streak:
+                rate.streak = 0
+                rate.concurrency = min(
+                    self.max_concurrency, rate.concurrency + 1)
+
+    def summary(self, top=10):
+        ''' Rates of the hosts, slowest first. '''
+        with self.lock:
+            hosts = sorted(
+                self.hosts.items(), key=lambda item: item[1].delay,
+                reverse=True)
+            return {
+                "hosts": len(hosts),
+                "slowest_hosts": [
+                    {"host": host, "delay": round(rate.delay, 3),
+                     "concurrency": rate.concurrency,
+                     "latency": round(rate.latency or 0, 3),
+                     "downloads": rate.downloads, "failures": rate.failures}
+                    for host, rate in hosts[:top]]
+            }
+
+
+_rate_controller = RateController()
+
+
+def get_rate_controller():
+    return _rate_controller
+
+
+def set_rate_controller(rate_controller):
+    global _rate_controller
+    _rate_controller = rate_controller
@@ -0,0 +1,132 @@
+import os
+import time
+import struct
+from threading import Lock
+
+import cbor
+
+from utils.response import Response
+from utils.content_policy import get_content_policy, too_large_response
+
+"""
+Record and replay of cache server responses. A recording is one append-only
+file of (url, cbor payload) records, exactly as the cache server sent them.
+It can be served again by the stand-in cache server (RecordedSite), or read
+directly by replay_download() without any network at all.
+"""
+
+# url length, payload length
+RECORD_HEADER = struct.Struct("<II")
+
+
+class ResponseRecording(object):
+    ''' Appends records to path and looks them up by url. '''
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.index = dict()
+        if os.path.exists(path):
+            self._load_index()
+        self.file = open(path, "a+b")
+
+    def _load_index(self):
+        with open(self.path, "rb") as file:
+            offset = 0
+            while True:
+                header = file.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                url_length, payload_length = RECORD_HEADER.unpack(header)
+                url = file.read(url_length).decode("utf-8")
+                payload_offset = offset + RECORD_HEADER.size + url_length
+                if file.seek(payload_length, os.SEEK_CUR) > os.path.getsize(self.path):
+                    # Torn last record.
+                    break
+                self.index[url] = (payload_offset, payload_length)
+                offset = payload_offset + payload_length
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def urls(self):
+        return list(self.index)
+
+    def record(self, url, payload):
+        encoded_url = url.encode("utf-8")
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            offset = self.file.tell()
+            self.file.write(RECORD_HEADER.pack(len(encoded_url), len(payload)))
+            self.file.write(encoded_url)
+            self.file.write(payload)
+            self.file.flush()
+            self.index[url] = (
+                offset + RECORD_HEADER.size + len(encoded_url), len(payload))
+
+    def payload_length(self, url):
+        ''' Length of the recorded payload for url, 0 if there is none. '''
+        with self.lock:
+            return self.index[url][1] if url in self.index else 0
+
+    def get(self, url):
+        ''' The recorded cbor payload for url, or None. '''
+        with self.lock:
+            if url not in self.index:
+                return None
+            offset, length = self.index[url]
+            self.file.seek(offset)
+            return self.file.read(length)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+_recordings_lock = Lock()
+_recordings = dict()
+
+
+def get_recording(path):
+    ''' The recording at path, opened once per process. '''
+    with _recordings_lock:
+        if path not in _recordings:
+            _recordings[path] = ResponseRecording(path)
+        return _recordings[path]
+
+
+def missing_payload(url):
+    return cbor.dumps({
+        "url": url, "status": 404, "error": f"{url} is not in the recording."})
+
+
+class RecordedSite(object):
+    ''' Site for utils.stand_in_server that serves a recording. '''
+    def __init__(self, path):
+        self.recording = get_recording(path)
+
+    def seed_urls(self):
+        return self.recording.urls()[:1]
+
+    def get_payload(self, url, if_none_match=None):
+        # Recorded responses are served as they are.
+        payload = self.recording.get(url)
+        return payload if payload is not None else missing_payload(url)
+
+
+def replay_download(url, config, logger=None):
+    ''' Drop-in for utils.download.download that answers from the REPLAY
+    recording, after config.replay_latency seconds. '''
+    if config.replay_latency:
+        time.sleep(config.replay_latency)
+    recording = get_recording(config.replay_file)
+    if recording.payload_length(url) > get_content_policy().max_payload_bytes:
+        return too_large_response(url, logger)
+    payload = recording.get(url)
+    if payload is None:
+        if logger:
+            logger.error(f"{url} is not in the recording {config.replay_file}.")
+        payload = missing_payload(url)
+    return Response.from_payload(payload)
@@ -1,14 +1,83 @@
 import pickle
 
+import cbor
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
 class Response(object):
-    def __init__(self, resp_dict):
+    '''
+    An answer of the cache server. url, status and error are read right
+    away; the page itself is only decoded the first time it is used, so
+    answers dropped on their status are never unpickled.
+
+    The cache server sends the page as a pickled requests.Response. The
+    stand-in server can also send its "headers" and "content" as plain cbor
+    fields (see utils/stand_in_server.py); headers and content are then used
+    as they are, and raw_response is built around them without a copy.
+    '''
+    def __init__(self, resp_dict, size=0):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        # Bytes of the payload this answer came in, 0 if unknown.
+        self.size = size
+        self._pickled = resp_dict.get("response")
+        self._headers = resp_dict.get("headers")
+        self._content = resp_dict.get("content")
+        self._raw_response = None
+        self._decoded = self._pickled is None and self._content is None
+
+    @classmethod
+    def from_payload(cls, payload):
+        ''' The Response of a cbor payload from the cache server. '''
+        return cls(cbor.loads(payload), len(payload))
+
+    @property
+    def has_raw_response(self):
+        ''' Whether a page came with the answer, without decoding it. '''
+        return not self._decoded or self._raw_response is not None
+
+    @property
+    def raw_response(self):
+        ''' The requests.Response of the page, None if there is none. '''
+        if not self._decoded:
+            self._decoded = True
+            if self._content is not None:
+                raw_response = requests.Response()
+                raw_response.url = self.url
+                raw_response.status_code = self.status
+                raw_response.headers = CaseInsensitiveDict(self._headers or {})
+                raw_response._content = self._content
+                self._raw_response = raw_response
+            else:
+                try:
+                    self._raw_response = pickle.loads(self._pickled)
+                except TypeError:
+                    self._raw_response = None
+                # The page is in raw_response now, no need for a second copy.
+                self._pickled = None
+        return self._raw_response
+
+    @raw_response.setter
+    def raw_response(self, raw_response):
+        self._raw_response = raw_response
+        self._decoded = True
+        self._pickled = self._headers = self._content = None
+
+    @property
+    def headers(self):
+        ''' Headers of the page, empty if there is none. '''
+        if self._content is not None:
+            return CaseInsensitiveDict(self._headers or {})
+        raw_response = self.raw_response
+        return raw_response.headers if raw_response is not None else (
+            CaseInsensitiveDict())
+
+    @property
+    def content(self):
+        ''' Body of the page, b"" if there is none. '''
+        if self._content is not None:
+            return self._content
+        raw_response = self.raw_response
+        return raw_response.content if raw_response is not None else b""
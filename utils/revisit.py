@@ -0,0 +1,143 @@
+import time
+from hashlib import blake2b
+from threading import RLock
+
+"""
+Re-crawl state. For every page fetched, the ETag and Last-Modified headers
+of its response, a digest of its raw content, when it was fetched and how
+long to wait before fetching it again.
+
+A page that comes back with the same digest as last time is not parsed
+again. One that changed is parsed again, but not counted as a new page (see
+pop_changed). Downloads of a known page also send If-None-Match /
+If-Modified-Since, but they go to the cache server, not to the site: the
+course's spacetime cache does not pass them on and always answers with the
+full page, so there the digest is the only saving. Only a cache that
+understands them, like the stand-in server (utils/stand_in_server.py),
+answers 304 Not Modified, which skips the page the same way.
+
+The revisit interval adapts to how often the page changes: it halves every
+time the page changed since the last fetch and doubles every time it did
+not, between min_interval and max_interval seconds. The frontier queues a
+completed page again once its interval has passed, while the crawl runs
+and when it is resumed (see Frontier).
+"""
+
+NOT_MODIFIED_STATUS = 304
+
+
+def content_digest(content):
+    return blake2b(content, digest_size=16).hexdigest()
+
+
+class RevisitStore(object):
+    def __init__(self, min_interval=3600.0, max_interval=7 * 86400.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # url -> [etag, last modified, digest, fetched at, interval]
+        self.pages = dict()
+        # Urls fetched again with new content, until the scraper takes them.
+        self.changed = set()
+        self.lock = RLock()
+        self.version = 0
+        self.checkpointed_version = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.recrawl_min_interval, config.recrawl_max_interval)
+
+    def validators(self, url):
+        ''' Conditional request headers for url, empty if it is new. '''
+        with self.lock:
+            page = self.pages.get(url)
+        headers = dict()
+        if page is not None:
+            etag, last_modified = page[0], page[1]
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def record_fetch(self, url, resp):
+        '''
+        Records a download of url. Returns whether the page is new or
+        changed, False if it was not modified since the last fetch.
+        '''
+        if resp.status == NOT_MODIFIED_STATUS:
+            headers, digest = dict(), None
+        else:
+            headers = resp.headers
+            digest = content_digest(resp.content)
+        with self.lock:
+            page = self.pages.get(url)
+            changed = page is None or (
+                digest is not None and digest != page[2])
+            if page is None:
+                page = self.pages[url] = [None, None, None, 0, self.min_interval]
+            elif changed:
+                page[4] = max(self.min_interval, page[4] / 2)
+                self.changed.add(url)
+            else:
+                page[4] = min(self.max_interval, page[4] * 2)
+            if digest is not None:
+                page[0] = headers.get("ETag")
+                page[1] = headers.get("Last-Modified")
+                page[2] = digest
+            page[3] = time.time()
+            self.version += 1
+        return changed
+
+    def pop_changed(self, url):
+        ''' Whether the last fetch of url was a revisit that found new
+        content. Forgets it, so only the first call returns True. '''
+        with self.lock:
+            if url in self.changed:
+                self.changed.remove(url)
+                return True
+            return False
+
+    def is_due(self, url, now=None):
+        ''' Whether url was fetched and its revisit interval has passed. '''
+        due_at = self.due_at(url)
+        return due_at is not None and (now or time.time()) >= due_at
+
+    def due_at(self, url):
+        ''' When url should be fetched again, as a time.time() value, None
+        if it was never fetched. '''
+        with self.lock:
+            page = self.pages.get(url)
+        if page is None:
+            return None
+        return page[3] + page[4]
+
+    def revisit_times(self):
+        ''' (due at, url) for every url fetched. '''
+        with self.lock:
+            return [(page[3] + page[4], url)
+                    for url, page in self.pages.items()]
+
+    def snapshot(self):
+        # A copy for the checkpoint, None if nothing changed.
+        with self.lock:
+            if self.version == self.checkpointed_version:
+                return None
+            self.checkpointed_version = self.version
+            return {url: list(page) for url, page in self.pages.items()}
+
+    def restore(self, state):
+        with self.lock:
+            self.pages = {url: list(page) for url, page in state.items()}
+
+
+_revisit_store = None
+
+
+def get_revisit_store():
+    return _revisit_store
+
+
+def set_revisit_store(revisit_store):
+    ''' revisit_store can be None to turn re-crawling off. '''
+    global _revisit_store
+    _revisit_store = revisit_store
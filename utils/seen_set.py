@@ -0,0 +1,182 @@
+import os
+import mmap
+import struct
+from hashlib import blake2b
+from threading import RLock
+
+# magic, version, digest size, bloom hashes, capacity, count, bloom bytes
+HEADER = struct.Struct("<4sBBH3Q")
+COUNT_OFFSET = 16
+MAGIC = b"SEEN"
+VERSION = 1
+
+
+class DigestSet(object):
+    '''
+    Set of strings stored as fixed-width binary digests in one flat buffer,
+    using open addressing with linear probing. An entry costs digest_size
+    bytes instead of a python string plus its set slot. With the default 8
+    bytes, the chance of any two of a million urls colliding is about 3 in
+    10^8.
+
+    With a path, the buffer is a memory-mapped file that is reopened as is on
+    restart. An optional Bloom filter in front of the table answers most
+    misses without probing.
+    '''
+    def __init__(self, path=None, capacity=1 << 16, digest_size=8,
+                 bloom_bits_per_item=0, max_load=0.7):
+        self.path = path
+        self.max_load = max_load
+        self.lock = RLock()
+        self.mmap = None
+        self.file = None
+        if path and os.path.exists(path):
+            self._open(path)
+        else:
+            capacity = 1 << max(4, (capacity - 1).bit_length())
+            bloom_bytes = (capacity * bloom_bits_per_item + 7) // 8
+            # k = ln 2 * bits per item minimises false positives.
+            bloom_hashes = max(1, round(0.69 * bloom_bits_per_item)) if bloom_bytes else 0
+            self._create(path, capacity, digest_size, bloom_hashes, bloom_bytes)
+
+    def _create(self, path, capacity, digest_size, bloom_hashes, bloom_bytes):
+        size = HEADER.size + capacity * digest_size + bloom_bytes
+        header = HEADER.pack(
+            MAGIC, VERSION, digest_size, bloom_hashes, capacity, 0, bloom_bytes)
+        if path:
+            with open(path, "wb") as file:
+                file.write(header)
+                file.truncate(size)
+            self._open(path)
+        else:
+            self.buffer = bytearray(size)
+            self.buffer[:HEADER.size] = header
+            self._read_header()
+
+    def _open(self, path):
+        self.file = open(path, "r+b")
+        self.mmap = mmap.mmap(self.file.fileno(), 0)
+        self.buffer = self.mmap
+        self._read_header()
+
+    def _read_header(self):
+        (magic, version, self.digest_size, self.bloom_hashes, self.capacity,
+         self.count, self.bloom_bytes) = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a seen set file.")
+        self.mask = self.capacity - 1
+        self.empty = bytes(self.digest_size)
+        self.bloom_offset = HEADER.size + self.capacity * self.digest_size
+        self.bloom_bits = self.bloom_bytes * 8
+
+    @staticmethod
+    def remove(path):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def digest(self, key):
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        digest = blake2b(key, digest_size=self.digest_size).digest()
+        # All zeroes marks an empty slot.
+        return digest if digest != self.empty else b"\x01" + digest[1:]
+
+    def _bloom_positions(self, digest):
+        h1 = int.from_bytes(digest[:4], "little")
+        h2 = int.from_bytes(digest[-4:], "little") | 1
+        for i in range(self.bloom_hashes):
+            yield (h1 + i * h2) % self.bloom_bits
+
+    def _bloom_might_contain(self, digest):
+        buffer, offset = self.buffer, self.bloom_offset
+        for position in self._bloom_positions(digest):
+            if not buffer[offset + (position >> 3)] >> (position & 7) & 1:
+                return False
+        return True
+
+    def _bloom_add(self, digest):
+        buffer, offset = self.buffer, self.bloom_offset
+        for position in self._bloom_positions(digest):
+            buffer[offset + (position >> 3)] |= 1 << (position & 7)
+
+    def _probe(self, digest):
+        ''' Returns (found, offset of the matching or first empty slot). '''
+        buffer, size = self.buffer, self.digest_size
+        index = int.from_bytes(digest[:8], "little") & self.mask
+        while True:
+            offset = HEADER.size + index * size
+            slot = buffer[offset:offset + size]
+            if slot == digest:
+                return True, offset
+            if slot == self.empty:
+                return False, offset
+            index = (index + 1) & self.mask
+
+    def __contains__(self, key):
+        digest = self.digest(key)
+        with self.lock:
+            if self.bloom_bits and not self._bloom_might_contain(digest):
+                return False
+            return self._probe(digest)[0]
+
+    def __len__(self):
+        return self.count
+
+    def add(self, key):
+        ''' Adds key, returns False if it was already in the set. '''
+        return self.add_digest(self.digest(key))
+
+    def add_digest(self, digest):
+        with self.lock:
+            found, offset = self._probe(digest)
+            if found:
+                return False
+            self.buffer[offset:offset + self.digest_size] = digest
+            if self.bloom_bits:
+                self._bloom_add(digest)
+            self.count += 1
+            struct.pack_into("<Q", self.buffer, COUNT_OFFSET, self.count)
+            if self.count > self.capacity * self.max_load:
+                self._grow()
+            return True
+
+    def digests(self):
+        size = self.digest_size
+        for index in range(self.capacity):
+            offset = HEADER.size + index * size
+            slot = bytes(self.buffer[offset:offset + size])
+            if slot != self.empty:
+                yield slot
+
+    def _grow(self):
+        bloom_bits_per_item = self.bloom_bits // self.capacity
+        new_path = f"{self.path}.grow" if self.path else None
+        DigestSet.remove(new_path)
+        bigger = DigestSet(
+            new_path, self.capacity * 2, self.digest_size,
+            bloom_bits_per_item, self.max_load)
+        for digest in self.digests():
+            bigger.add_digest(digest)
+        if self.path:
+            bigger.close()
+            self.close()
+            os.replace(new_path, self.path)
+            self._open(self.path)
+        else:
+            self.buffer = bigger.buffer
+            self._read_header()
+
+    def nbytes(self):
+        return len(self.buffer)
+
+    def flush(self):
+        if self.mmap is not None:
+            self.mmap.flush()
+
+    def close(self):
+        if self.mmap is not None:
+            self.mmap.flush()
+            self.mmap.close()
+            self.file.close()
+            self.mmap = None
+            self.file = None
@@ -0,0 +1,32 @@
+from hashlib import blake2b
+from urllib.parse import urlparse
+
+"""
+Which shard of a multi-node crawl owns a url (see crawler/distributed.py):
+the hosts are split between the shards by a hash of the host. Checks that
+keep per host or per template state, like the trap budgets, run on the shard
+that owns the url, once the link got there.
+"""
+
+
+def shard_of(url, shards):
+    ''' The index of the shard that owns the host of url. '''
+    host = (urlparse(url).hostname or "").encode("utf-8")
+    return int.from_bytes(blake2b(host, digest_size=8).digest(), "big") % shards
+
+
+# (index of this shard, number of shards), None for a single node crawl.
+_local_shard = None
+
+
+def set_local_shard(index, shards):
+    global _local_shard
+    _local_shard = (index, shards)
+
+
+def is_local(url):
+    ''' Whether url belongs to this crawler, always for a single node. '''
+    if _local_shard is None:
+        return True
+    index, shards = _local_shard
+    return shard_of(url, shards) == index
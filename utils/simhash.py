@@ -0,0 +1,117 @@
+from hashlib import blake2b
+from threading import Lock
+from collections import Counter
+
+FINGERPRINT_BITS = 64
+
+
+def _feature_hash(feature):
+    return int.from_bytes(
+        blake2b(feature.encode(), digest_size=8).digest(), "big")
+
+
+def shingles(tokens, size=3):
+    if len(tokens) < size:
+        return [" ".join(tokens)]
+    return [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+def simhash(tokens, shingle_size=3):
+    '''
+    64-bit SimHash fingerprint of a page. Every distinct shingle (run of
+    shingle_size tokens) votes on each bit with its frequency, so pages that
+    share most of their text end up a few bits apart. Shingles keep common
+    words from making unrelated pages look alike.
+    :param tokens: the list of tokens of the page.
+    :return: the fingerprint as an int.
+    '''
+    votes = [0] * FINGERPRINT_BITS
+    for token, weight in Counter(shingles(tokens, shingle_size)).items():
+        feature = _feature_hash(token)
+        for bit in range(FINGERPRINT_BITS):
+            if feature >> bit & 1:
+                votes[bit] += weight
+            else:
+                votes[bit] -= weight
+    fingerprint = 0
+    for bit, vote in enumerate(votes):
+        if vote > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def similarity(a, b):
+    return 1 - hamming_distance(a, b) / FINGERPRINT_BITS
+
+
+class SimHashIndex(object):
+    '''
+    Finds fingerprints within max_distance bits of a query in sublinear time.
+    The fingerprint is cut into max_distance + 1 bands; two fingerprints that
+    differ in at most max_distance bits agree on at least one whole band
+    (pigeonhole), so only fingerprints sharing a band are compared.
+    '''
+    def __init__(self, max_distance=6):
+        self.max_distance = max_distance
+        num_bands = max_distance + 1
+        width = FINGERPRINT_BITS // num_bands
+        self.bands = []
+        for band in range(num_bands):
+            start = band * width
+            end = FINGERPRINT_BITS if band == num_bands - 1 else start + width
+            self.bands.append((start, (1 << (end - start)) - 1))
+        self.tables = [dict() for _ in self.bands]
+        self.count = 0
+        self.lock = Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        ''' None if near duplicate detection is turned off (similarity 0). '''
+        if config.near_duplicate_similarity <= 0:
+            return None
+        return cls(int((1 - config.near_duplicate_similarity) * FINGERPRINT_BITS))
+
+    def __len__(self):
+        return self.count
+
+    def _keys(self, fingerprint):
+        return [fingerprint >> start & mask for start, mask in self.bands]
+
+    def find(self, fingerprint):
+        ''' Returns a stored fingerprint within max_distance, or None. '''
+        for table, key in zip(self.tables, self._keys(fingerprint)):
+            for candidate in table.get(key, ()):
+                if hamming_distance(fingerprint, candidate) <= self.max_distance:
+                    return candidate
+        return None
+
+    def add(self, fingerprint):
+        for table, key in zip(self.tables, self._keys(fingerprint)):
+            table.setdefault(key, []).append(fingerprint)
+        self.count += 1
+
+    def check_and_add(self, fingerprint):
+        ''' Atomically looks up a near duplicate, adding fingerprint if there
+        is none. Returns the near duplicate, or None for a new page. '''
+        with self.lock:
+            duplicate = self.find(fingerprint)
+            if duplicate is None:
+                self.add(fingerprint)
+            return duplicate
+
+
+_near_duplicate_index = SimHashIndex()
+
+
+def get_near_duplicate_index():
+    return _near_duplicate_index
+
+
+def set_near_duplicate_index(index):
+    ''' index can be None to turn near duplicate detection off. '''
+    global _near_duplicate_index
+    _near_duplicate_index = index
@@ -0,0 +1,184 @@
+import time
+import pickle
+import random
+from hashlib import blake2b
+from threading import Thread
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from argparse import ArgumentParser
+
+import cbor
+import requests
+from requests.structures import CaseInsensitiveDict
+
+"""
+A local stand-in for the spacetime cache server, for running and benchmarking
+the crawler offline. It answers GET /?q=<url>&u=<useragent> with the same cbor
+encoded dict as the real cache: url, status and the pickled
+requests.Response of the page. Pages come from a site object with a
+get_payload(url, if_none_match=None) -> cbor bytes method, e.g. SyntheticSite, or RecordedSite in
+utils/replay.py to serve a recording.
+
+SyntheticSite can also send its pages in the "raw" wire format, with the
+headers and content as plain cbor fields instead of a pickle, which
+utils.response.Response reads without unpickling anything.
+"""
+
+DEFAULT_HOSTS = (
+    "www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu",
+    "www.stat.uci.edu")
+
+
+WIRE_FORMATS = ("pickle", "raw")
+
+
+def encode_response(url, status, headers, body, wire="pickle"):
+    ''' The cbor payload the cache server sends for one page. '''
+    if wire == "raw":
+        return cbor.dumps({
+            "url": url, "status": status, "headers": dict(headers),
+            "content": body})
+    raw_response = requests.Response()
+    raw_response.status_code = status
+    raw_response.url = url
+    raw_response.headers = CaseInsensitiveDict(headers)
+    raw_response.encoding = "utf-8"
+    raw_response._content = body
+    return cbor.dumps({
+        "url": url, "status": status, "response": pickle.dumps(raw_response)})
+
+
+class SyntheticSite(object):
+    '''
+    A deterministic fake web. https://<host>/page/<n> exists for every host
+    in hosts and n < pages_per_host; its text and links are derived from a
+    hash of the url, so every run sees the same pages. Anything else is 404.
+    '''
+    def __init__(self, hosts=DEFAULT_HOSTS, pages_per_host=500,
+                 links_per_page=20, words_per_page=400, vocabulary_size=5000,
+                 wire="pickle"):
+        assert wire in WIRE_FORMATS, f"Unknown wire format {wire}"
+        self.hosts = tuple(hosts)
+        self.wire = wire
+        self.pages_per_host = pages_per_host
+        self.links_per_page = links_per_page
+        self.words_per_page = words_per_page
+        rng = random.Random(0)
+        self.vocabulary = [
+            "".join(rng.choice("bcdfghjklmnprstvz") + rng.choice("aeiou")
+                    for _ in range(rng.randint(2, 4)))
+            for _ in range(vocabulary_size)]
+
+    def seed_urls(self):
+        return [f"https://{host}/page/0" for host in self.hosts]
+
+    def get(self, url):
+        parsed = urlparse(url)
+        parts = parsed.path.strip("/").split("/")
+        if (parsed.hostname not in self.hosts or len(parts) != 2
+                or parts[0] != "page" or not parts[1].isdigit()
+                or int(parts[1]) >= self.pages_per_host):
+            return 404, {"Content-Type": "text/html"}, b"<html>Not found</html>"
+        rng = random.Random(blake2b(url.encode(), digest_size=8).digest())
+        # Zipf-like word choice so some words are far more common.
+        words = " ".join(
+            self.vocabulary[min(int(rng.paretovariate(1.0)) - 1,
+                                len(self.vocabulary) - 1)]
+            if rng.random() < 0.5 else rng.choice(self.vocabulary)
+            for _ in range(self.words_per_page))
+        links = "".join(
+            f'<li><a href="https://{rng.choice(self.hosts)}/page/'
+            f'{rng.randrange(self.pages_per_host)}">link</a></li>'
+            for _ in range(self.links_per_page))
+        body = (
+            f"<!DOCTYPE html><html><head><title>{url}</title></head><body>"
+            f"<ul>{links}</ul><p>{words}</p></body></html>").encode()
+        etag = f'"{blake2b(body, digest_size=8).hexdigest()}"'
+        return 200, {"Content-Type": "text/html; charset=utf-8",
+                     "ETag": etag}, body
+
+    def get_payload(self, url, if_none_match=None):
+        status, headers, body = self.get(url)
+        if if_none_match and if_none_match == headers.get("ETag"):
+            # The page has not changed: 304, without a response.
+            return cbor.dumps({"url": url, "status": 304})
+        return encode_response(url, status, headers, body, self.wire)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep their connection alive, and no Nagle so
+    # the headers and body of a response are not held back on that
+    # connection waiting for an ack.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        url = params.get("q", [""])[0]
+        self.server.delay(url)
+        payload = self.server.site.get_payload(
+            url, self.headers.get("If-None-Match"))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/cbor")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.requests += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInCacheServer(ThreadingHTTPServer):
+    '''
+    Serves site on address. Every request waits latency seconds, or
+    host_latency[host] for the host of the requested url, to mimic the round
+    trip through the cache to the origin server.
+    '''
+    daemon_threads = True
+
+    def __init__(self, address, site, latency=0.0, host_latency=None):
+        super().__init__(address, _Handler)
+        self.site = site
+        self.latency = latency
+        self.host_latency = host_latency or dict()
+        self.requests = 0
+
+    def delay(self, url):
+        latency = self.host_latency.get(urlparse(url).hostname, self.latency)
+        if latency:
+            time.sleep(latency)
+
+    @property
+    def cache_server(self):
+        ''' (host, port), as config.cache_server expects. '''
+        return self.server_address[:2]
+
+
+def start_in_background(site, port=0, latency=0.0, host_latency=None):
+    ''' Starts a server on a daemon thread; port 0 picks a free port. '''
+    server = StandInCacheServer(("127.0.0.1", port), site, latency, host_latency)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--pages_per_host", type=int, default=500)
+    parser.add_argument("--replay", type=str, default=None,
+                        help="serve this recording instead of a synthetic site")
+    parser.add_argument("--wire", choices=WIRE_FORMATS, default="pickle",
+                        help="how the synthetic site sends its pages")
+    args = parser.parse_args()
+    if args.replay:
+        from utils.replay import RecordedSite
+        site = RecordedSite(args.replay)
+    else:
+        site = SyntheticSite(
+            pages_per_host=args.pages_per_host, wire=args.wire)
+    server = StandInCacheServer(("127.0.0.1", args.port), site, args.latency)
+    print(f"Serving {type(site).__name__} on {server.cache_server}, "
+          f"seeds: {','.join(site.seed_urls())}")
+    server.serve_forever()
@@ -0,0 +1,183 @@
+import re
+from threading import Lock
+from urllib.parse import urlparse
+
+from utils.seen_set import DigestSet
+
+"""
+Crawler trap detection. Every url is reduced to a template: its host, the
+shape of each path segment (numbers replaced by {n}, long hex ids by {hex})
+and the sorted set of its query keys, so /event/2020-09-01?page=3 and
+/event/2021-01-17?page=12 share the template /event/{n}-{n}-{n}?page.
+
+Urls are rejected outright when their path repeats a segment too often or is
+too deep, or when they carry a query key that only produces variants of the
+same page (share links, wiki revisions and actions, reply forms, sorting).
+
+Every template then gets a budget of fetched pages. Each page fetched for it
+reports its yield, the number of new links plus new words it contributed,
+and only productive fetches grow the budget, so a listing whose pages keep
+yielding is never capped. A template that spent its budget, or that has been
+sampled enough and whose average yield has collapsed, gets no more urls.
+"""
+
+DEFAULT_TRAP_QUERY_KEYS = (
+    "share", "action", "do", "replytocom", "oldid", "diff", "rev",
+    "redirect_to", "sort", "order")
+
+_NUMBER = re.compile(r"\d+")
+_HEX_ID = re.compile(r"[0-9a-f]{12,}")
+
+
+def segment_shape(segment):
+    segment = segment.lower()
+    if _HEX_ID.fullmatch(segment) and not segment.isdigit():
+        return "{hex}"
+    return _NUMBER.sub("{n}", segment)
+
+
+def url_template(url):
+    ''' The template of url, e.g. "wiki.ics.uci.edu/doku.php/{n}?do&rev". '''
+    parsed = urlparse(url)
+    path = "/".join(segment_shape(segment) for segment in parsed.path.split("/"))
+    keys = sorted({
+        _NUMBER.sub("{n}", pair.split("=", 1)[0].lower())
+        for pair in parsed.query.split("&") if pair})
+    return f"{parsed.hostname or ''}{path}?{'&'.join(keys)}"
+
+
+class TemplateStats(object):
+    __slots__ = ("budget", "fetched", "productive", "total_yield",
+                 "average_yield", "dropped")
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.fetched = 0
+        self.productive = 0
+        self.total_yield = 0
+        # Exponentially weighted, so a template that used to be productive
+        # is dropped soon after it stops being so.
+        self.average_yield = None
+        self.dropped = False
+
+
+class TrapDetector(object):
+    def __init__(self, budget=50, budget_growth=2, min_yield=5.0,
+                 min_samples=10, max_repeats=2, max_depth=12,
+                 trap_query_keys=DEFAULT_TRAP_QUERY_KEYS, smoothing=0.2):
+        # budget 0 turns off the learned templates, only the structural
+        # checks are left.
+        self.budget = budget
+        self.budget_growth = budget_growth
+        self.min_yield = min_yield
+        self.min_samples = min_samples
+        self.max_repeats = max_repeats
+        self.max_depth = max_depth
+        self.trap_query_keys = frozenset(
+            key.strip().lower() for key in trap_query_keys)
+        self.smoothing = smoothing
+        self.templates = dict()
+        self.vocabulary = DigestSet()
+        self.lock = Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(budget=config.trap_budget,
+                   min_yield=config.trap_min_yield,
+                   min_samples=config.trap_min_samples,
+                   max_repeats=config.trap_max_repeats,
+                   max_depth=config.trap_max_depth,
+                   trap_query_keys=config.trap_query_keys)
+
+    def structural_trap(self, url):
+        ''' The reason url is a trap by its shape alone, or None. '''
+        parsed = urlparse(url)
+        segments = [segment for segment in parsed.path.lower().split("/")
+                    if segment]
+        if len(segments) > self.max_depth:
+            return "depth"
+        counts = dict()
+        for segment in segments:
+            counts[segment] = counts.get(segment, 0) + 1
+            if counts[segment] > self.max_repeats:
+                return "repeated_segment"
+        for pair in parsed.query.split("&"):
+            if pair.split("=", 1)[0].lower() in self.trap_query_keys:
+                return "query_key"
+        return None
+
+    def admit(self, url):
+        ''' Returns None if url may be added to the frontier, or the reason it
+        is a trap. Only the pages fetched are charged to the template's budget
+        (see record_yield), so the links found on a page before any of them
+        was fetched are all admitted. '''
+        reason = self.structural_trap(url)
+        if reason is not None or not self.budget:
+            return reason
+        template = url_template(url)
+        with self.lock:
+            stats = self.templates.get(template)
+            if stats is None:
+                stats = self.templates[template] = TemplateStats(self.budget)
+            if stats.dropped:
+                return "low_yield"
+            if stats.fetched >= stats.budget:
+                return "budget"
+        return None
+
+    def new_words(self, words):
+        ''' How many of words have not been seen on any page before. '''
+        return sum(self.vocabulary.add(word) for word in words)
+
+    def record_yield(self, url, new_links, new_words=0):
+        ''' Records what fetching url contributed to the crawl, and charges
+        it to its template's budget. '''
+        if not self.budget:
+            return
+        value = new_links + new_words
+        with self.lock:
+            stats = self.templates.get(url_template(url))
+            if stats is None:
+                # A seed, or a url from before a restart.
+                stats = self.templates[url_template(url)] = TemplateStats(
+                    self.budget)
+            stats.fetched += 1
+            stats.total_yield += value
+            if stats.average_yield is None:
+                stats.average_yield = float(value)
+            else:
+                stats.average_yield += self.smoothing * (
+                    value - stats.average_yield)
+            if value >= self.min_yield:
+                stats.productive += 1
+                stats.budget += self.budget_growth
+            elif (stats.fetched >= self.min_samples
+                    and stats.average_yield < self.min_yield):
+                stats.dropped = True
+
+    def dropped_templates(self):
+        with self.lock:
+            return sorted(
+                (template for template, stats in self.templates.items()
+                 if stats.dropped),
+                key=lambda template: -self.templates[template].fetched)
+
+    def summary(self, top=20):
+        dropped = self.dropped_templates()
+        return {
+            "templates": len(self.templates),
+            "dropped_templates": len(dropped),
+            "top_dropped_templates": dropped[:top]
+        }
+
+
+_trap_detector = TrapDetector()
+
+
+def get_trap_detector():
+    return _trap_detector
+
+
+def set_trap_detector(trap_detector):
+    global _trap_detector
+    _trap_detector = trap_detector
@@ -0,0 +1,120 @@
+from hashlib import sha256
+from functools import lru_cache
+from urllib.parse import urlparse
+
+from utils.canonical import canonicalize
+
+DEFAULT_ALLOWED_DOMAINS = (
+    "ics.uci.edu", "cs.uci.edu", "informatics.uci.edu", "stat.uci.edu")
+DEFAULT_DENIED_DOMAINS = ("cecs.uci.edu", "eecs.uci.edu")
+DEFAULT_EXTENSIONS = (
+    "css", "js", "bmp", "gif", "jpg", "jpeg", "ico",
+    "png", "tif", "tiff", "mid", "mp2", "mp3", "mp4",
+    "wav", "avi", "mov", "mpeg", "ram", "m4v", "mkv", "ogg", "ogv", "pdf",
+    "ps", "eps", "tex", "ppt", "pptx", "doc", "docx", "xls", "xlsx", "names",
+    "data", "dat", "exe", "bz2", "tar", "msi", "bin", "7z", "psd", "dmg", "iso",
+    "epub", "dll", "cnf", "tgz", "sha1",
+    "thmx", "mso", "arff", "rtf", "jar", "csv",
+    "rm", "smil", "wmv", "swf", "wma", "zip", "rar", "gz", "ics", "ppsx")
+# Query keys containing any of these are skipped, e.g. ?ical=1 downloads.
+DEFAULT_DENIED_QUERY_KEYS = ("ical",)
+
+ALLOW = "allow"
+DENY = "deny"
+_VERDICT = object()
+
+
+class DomainTrie(object):
+    ''' Matches hosts against domain rules label by label, from the top level
+    domain down. The most specific matching rule wins, so "ics.uci.edu" covers
+    "vision.ics.uci.edu" but not "physics.uci.edu". '''
+    def __init__(self):
+        self.root = dict()
+
+    def add(self, domain, verdict):
+        node = self.root
+        for label in reversed(domain.strip().lower().strip(".").split(".")):
+            node = node.setdefault(label, dict())
+        node[_VERDICT] = verdict
+
+    def match(self, host):
+        node = self.root
+        verdict = None
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            verdict = node.get(_VERDICT, verdict)
+        return verdict
+
+
+class UrlFilter(object):
+    ''' Static crawl rules, built once at startup. Verdicts are cached per
+    canonical url, so the frontier and the scraper pay for each url once. '''
+    def __init__(self, allowed_domains=DEFAULT_ALLOWED_DOMAINS,
+                 denied_domains=DEFAULT_DENIED_DOMAINS,
+                 extensions=DEFAULT_EXTENSIONS,
+                 denied_query_keys=DEFAULT_DENIED_QUERY_KEYS,
+                 cache_size=1 << 16):
+        self.domains = DomainTrie()
+        for domain in allowed_domains:
+            self.domains.add(domain, ALLOW)
+        for domain in denied_domains:
+            self.domains.add(domain, DENY)
+        self.extensions = frozenset(ext.strip().lower() for ext in extensions)
+        self.denied_query_keys = tuple(
+            key.strip().lower() for key in denied_query_keys)
+        # Identifies the rules, so verdicts stored with a url (see
+        # crawler/persistence.py) are only trusted while they stay the same.
+        self.fingerprint = sha256(repr((
+            sorted(domain.strip().lower() for domain in allowed_domains),
+            sorted(domain.strip().lower() for domain in denied_domains),
+            sorted(self.extensions), sorted(self.denied_query_keys),
+        )).encode("utf-8")).hexdigest()
+        self._cached_check = lru_cache(maxsize=cache_size)(self._check)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.allowed_domains, config.denied_domains,
+                   config.denied_extensions, config.denied_query_keys,
+                   config.filter_cache_size)
+
+    def is_allowed(self, url):
+        return self._cached_check(canonicalize(url))
+
+    def cache_info(self):
+        return self._cached_check.cache_info()
+
+    def _check(self, url):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            return False
+
+        # url must be in one of the allowed domains
+        host = parsed.hostname
+        if host is None or self.domains.match(host) != ALLOW:
+            return False
+
+        # Skip denied query keys
+        if parsed.query and self.denied_query_keys:
+            for pair in parsed.query.lower().split("&"):
+                key = pair.split("=", 1)[0]
+                if any(denied in key for denied in self.denied_query_keys):
+                    return False
+
+        # Skip files that are not webpages
+        path = parsed.path
+        dot = path.rfind(".")
+        return dot == -1 or path[dot + 1:].lower() not in self.extensions
+
+
+_url_filter = UrlFilter()
+
+
+def get_url_filter():
+    return _url_filter
+
+
+def set_url_filter(url_filter):
+    global _url_filter
+    _url_filter = url_filter